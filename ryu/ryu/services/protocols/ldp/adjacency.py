@@ -0,0 +1,171 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Hello adjacency table.
+
+Adjacencies are keyed by (interface, LSR-ID, label space id). A received
+hello with the parameters of its adjacency only updates last_seen. Hold
+time expiry is found by one heap ordered by deadline: sweep() pops the
+due entries and pushes back the ones which were refreshed in the
+meantime.
+"""
+
+import heapq
+import itertools
+import logging
+import time
+
+LOG = logging.getLogger('ldp.adjacency')
+
+# Hold time values of the Common Hello Parameters TLV (RFC 5036 3.5.2)
+LDP_HOLD_TIME_DEFAULT_LINK = 15
+LDP_HOLD_TIME_DEFAULT_TARGETED = 45
+LDP_HOLD_TIME_INFINITE = 0xffff
+
+
+def negotiate_hold_time(local, remote, targeted=False):
+    """Returns the hold time of an adjacency, 0 means the default."""
+    default = LDP_HOLD_TIME_DEFAULT_TARGETED if targeted \
+        else LDP_HOLD_TIME_DEFAULT_LINK
+    return min(local or default, remote or default)
+
+
+class Adjacency(object):
+    __slots__ = ('interface', 'lsr_id', 'label_space_id', 'trans_addr',
+                 'hold_time', 'last_seen', 'hello_params')
+
+    def __init__(self, interface, lsr_id, label_space_id, trans_addr,
+                 hold_time, last_seen, hello_params=None):
+        self.interface = interface
+        self.lsr_id = lsr_id
+        self.label_space_id = label_space_id
+        self.trans_addr = trans_addr
+        self.hold_time = hold_time
+        self.last_seen = last_seen
+        # raw TLVs of the last hello, see hello.hello_params()
+        self.hello_params = hello_params
+
+    @property
+    def key(self):
+        return (self.interface, self.lsr_id, self.label_space_id)
+
+    @property
+    def deadline(self):
+        if self.hold_time == LDP_HOLD_TIME_INFINITE:
+            return None
+        return self.last_seen + self.hold_time
+
+    def __str__(self):
+        return '%s<%s:%s, hold_time=%s>' % (
+            self.__class__.__name__, self.lsr_id,
+            self.label_space_id, self.hold_time)
+
+
+class AdjacencyTable(object):
+    """Hello adjacencies with heap based hold timer expiry.
+
+    expired_handler is called with each Adjacency removed by sweep().
+    """
+
+    def __init__(self, expired_handler, clock=time.time):
+        self._expired_handler = expired_handler
+        self._clock = clock
+        self._adjacencies = {}
+        self._lsr_count = {}
+        self._heap = []
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._adjacencies)
+
+    def __iter__(self):
+        return iter(list(self._adjacencies.values()))
+
+    def get(self, key):
+        return self._adjacencies.get(key)
+
+    def has_lsr(self, lsr_id):
+        return lsr_id in self._lsr_count
+
+    def refresh(self, key):
+        """Marks the adjacency as seen now. Returns it, or None if it is
+        not known.
+        """
+        adj = self._adjacencies.get(key)
+        if adj is not None:
+            adj.last_seen = self._clock()
+        return adj
+
+    def add(self, interface, lsr_id, label_space_id, trans_addr,
+            hold_time, hello_params=None):
+        adj = Adjacency(interface, lsr_id, label_space_id, trans_addr,
+                        hold_time, self._clock(), hello_params)
+        old = self._adjacencies.get(adj.key)
+        self._adjacencies[adj.key] = adj
+        if old is None:
+            self._lsr_count[lsr_id] = self._lsr_count.get(lsr_id, 0) + 1
+        self._push(adj)
+        return adj
+
+    def remove(self, key):
+        """Removes the adjacency without calling expired_handler. Its
+        heap entry is dropped by the next sweep().
+        """
+        adj = self._adjacencies.pop(key, None)
+        if adj is not None:
+            self._release_lsr(adj.lsr_id)
+        return adj
+
+    def next_deadline(self):
+        if not self._heap:
+            return None
+        return self._heap[0][0]
+
+    def sweep(self, now=None):
+        """Expires the adjacencies whose hold time has passed."""
+        if now is None:
+            now = self._clock()
+        expired = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _deadline, _seq, adj = heapq.heappop(heap)
+            if self._adjacencies.get(adj.key) is not adj:
+                # removed or replaced since it was pushed
+                continue
+            deadline = adj.deadline
+            if deadline is not None and deadline > now:
+                # refreshed by a hello, look at it again later
+                self._push(adj)
+                continue
+            del self._adjacencies[adj.key]
+            self._release_lsr(adj.lsr_id)
+            expired.append(adj)
+        for adj in expired:
+            LOG.info('adjacency expired: %s', adj)
+            self._expired_handler(adj)
+        return expired
+
+    def _push(self, adj):
+        deadline = adj.deadline
+        if deadline is not None:
+            heapq.heappush(self._heap, (deadline, next(self._seq), adj))
+
+    def _release_lsr(self, lsr_id):
+        count = self._lsr_count[lsr_id] - 1
+        if count:
+            self._lsr_count[lsr_id] = count
+        else:
+            del self._lsr_count[lsr_id]
@@ -0,0 +1,602 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+asyncio backend of the LDP speaker, see backend.py.
+
+A session is a SessionProtocol on a transport of the loop, discovery is
+a datagram endpoint and timers are loop.call_later() handles. Only
+callbacks are used, no coroutines, so any loop with the asyncio event
+loop API works: asyncio, uvloop, which new_event_loop() prefers if it
+is installed, and trollius on python 2.
+
+A transport hands Peer one read per data_received(), so a session
+cannot hold the loop for long and cooperate() does nothing. The decode
+pool waits for its workers on green threads and is not supported here.
+"""
+
+import collections
+import functools
+import logging
+import socket
+import traceback
+
+try:
+    import asyncio
+except ImportError:
+    import trollius as asyncio
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+from ryu.services.protocols.ldp.discovery import discovery_socket
+from ryu.services.protocols.ldp.session import ConnectBackoff
+from ryu.services.protocols.ldp.session import DEFAULT_ACCEPT_HOLD_TIME
+from ryu.services.protocols.ldp.session import DEFAULT_CONN_TIMEOUT
+from ryu.services.protocols.ldp.session import DEFAULT_LISTEN_BACKLOG
+from ryu.services.protocols.ldp.session import DEFAULT_MAX_CONNECTING
+from ryu.services.protocols.ldp.session import SessionSetupStats
+from ryu.services.protocols.ldp.writer import MAX_PENDING_FACTOR
+from ryu.services.protocols.ldp.writer import WriterOverflow
+
+LOG = logging.getLogger('ldp.aio')
+
+
+def new_event_loop(use_uvloop=True):
+    """Returns a new event loop, of uvloop if it is installed."""
+    if use_uvloop and uvloop is not None:
+        return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
+class AsyncioTimer(object):
+    def __init__(self, loop, handler_):
+        assert callable(handler_)
+        self._loop = loop
+        self._handler = handler_
+        self._handle = None
+
+    def start(self, interval):
+        """interval is in seconds"""
+        self.cancel()
+        self._handle = self._loop.call_later(interval, self._timer)
+
+    def cancel(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def is_running(self):
+        return self._handle is not None
+
+    def _timer(self):
+        self._handle = None
+        self._handler()
+
+
+class AsyncioLoopingCall(object):
+    """LoopingCall on loop.call_later()."""
+
+    def __init__(self, loop, funct, *args, **kwargs):
+        self._loop = loop
+        self._funct = funct
+        self._args = args
+        self._kwargs = kwargs
+        self._running = False
+        self._interval = 0
+        self._handle = None
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def interval(self):
+        return self._interval
+
+    def __call__(self):
+        self._handle = None
+        if self._running:
+            # Schedule next iteration of the call.
+            self._handle = self._loop.call_later(self._interval, self)
+        self._funct(*self._args, **self._kwargs)
+
+    def start(self, interval, now=True):
+        """Start running pre-set function every interval seconds.
+        """
+        if interval < 0:
+            raise ValueError('interval must be >= 0')
+
+        if self._running:
+            self.stop()
+
+        self._running = True
+        self._interval = interval
+        if now:
+            self._handle = self._loop.call_soon(self)
+        else:
+            self._handle = self._loop.call_later(self._interval, self)
+
+    def stop(self):
+        """Stop running scheduled function.
+        """
+        self._running = False
+        self._cancel()
+
+    def reset(self):
+        """Skip the next iteration and reset timer.
+        """
+        self._cancel()
+        self._handle = self._loop.call_later(self._interval, self)
+
+    def _cancel(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+
+class SessionWriter(object):
+    """PeerWriter interface on the transport of a SessionProtocol.
+
+    The transport buffers what it could not send yet and pauses the
+    protocol at the high watermark. Data written with priority cannot
+    overtake that buffer, it is only never refused. The transport keeps
+    no enqueue times, so no send queue wait is recorded.
+    """
+
+    def __init__(self, protocol, high_watermark, low_watermark,
+                 max_pending=None, error_handler=None, wait_histogram=None):
+        assert low_watermark <= high_watermark
+        self._loop = protocol.loop
+        self._transport = protocol.transport
+        self._transport.set_write_buffer_limits(high=high_watermark,
+                                                low=low_watermark)
+        protocol.writer = self
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.max_pending = max_pending or \
+            high_watermark * MAX_PENDING_FACTOR
+        # the transport reports errors to the protocol, which ends the
+        # session with connection_lost()
+        self._error_handler = error_handler
+        self._writable_callbacks = []
+        self._stopped = False
+        self._closing = False
+        self.writable = True
+        self.bytes_sent = 0
+        self.pause_count = 0
+
+    def __len__(self):
+        return 0
+
+    @property
+    def bytes_pending(self):
+        return self._transport.get_write_buffer_size()
+
+    def start(self):
+        pass
+
+    def stop(self):
+        if self._stopped:
+            return
+        self._stopped = True
+        self._transport.abort()
+        # nothing will be written any more, release waiting producers
+        self._set_writable()
+
+    def close(self):
+        """Sends what was written and then closes the session."""
+        self._closing = True
+        self._transport.close()
+
+    def write(self, data, priority=False):
+        """Writes data, returns self.writable."""
+        if self._stopped or self._closing:
+            return False
+        size = len(data)
+        if not priority and self.bytes_pending + size > self.max_pending:
+            raise WriterOverflow('%d bytes pending' % self.bytes_pending)
+        self._transport.write(data)
+        self.bytes_sent += size
+        return self.writable
+
+    def wait_writable(self, timeout=None):
+        """Returns self.writable, there is nothing to block on a
+        loop. Use call_when_writable().
+        """
+        return self.writable or self._stopped
+
+    def call_when_writable(self, callback, *args):
+        if self.writable or self._stopped:
+            self._loop.call_soon(callback, *args)
+        else:
+            self._writable_callbacks.append((callback, args))
+
+    def pause(self):
+        if self.writable:
+            self.writable = False
+            self.pause_count += 1
+
+    def resume(self):
+        self._set_writable()
+
+    def _set_writable(self):
+        self.writable = True
+        callbacks = self._writable_callbacks
+        self._writable_callbacks = []
+        for callback, args in callbacks:
+            self._loop.call_soon(callback, *args)
+
+    def stats(self):
+        return {'queue_depth': len(self),
+                'bytes_pending': self.bytes_pending,
+                'bytes_sent': self.bytes_sent,
+                'time_blocked': 0.0,
+                'writable': self.writable,
+                'pause_count': self.pause_count}
+
+
+class SessionProtocol(asyncio.Protocol):
+    """Connection of a session, session is a Peer: it is given the
+    protocol in connection_made(protocol, is_active) and then gets
+    data_received() and connection_lost().
+    """
+
+    def __init__(self, loop, session=None, is_active=False, acceptor=None):
+        self.loop = loop
+        self.session = None
+        self.transport = None
+        self.writer = None
+        self.hold_timer = None
+        self._pending_session = session
+        self._is_active = is_active
+        self._acceptor = acceptor
+        self._lost_reason = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        if self._pending_session is not None:
+            self.attach(self._pending_session, self._is_active)
+        else:
+            self._acceptor.accepted(self)
+
+    def attach(self, session, is_active):
+        self._pending_session = None
+        self.session = session
+        session.connection_made(self, is_active)
+
+    def data_received(self, data):
+        if self.session is None:
+            return
+        try:
+            self.session.data_received(data)
+        except Exception as e:
+            LOG.debug(traceback.format_exc())
+            self._lost_reason = 'Connection to peer lost, reason: %s.' % e
+            self.transport.abort()
+
+    def eof_received(self):
+        # half closed sessions are not used, close the transport
+        return False
+
+    def connection_lost(self, exc):
+        if self.session is None:
+            return
+        reason = self._lost_reason
+        if reason is None and exc is not None:
+            reason = 'Connection to peer lost: %s.' % exc
+        if reason is None:
+            reason = 'Peer closed connection'
+        session = self.session
+        self.session = None
+        session.connection_lost(reason)
+
+    def pause_writing(self):
+        if self.writer is not None:
+            self.writer.pause()
+
+    def resume_writing(self):
+        if self.writer is not None:
+            self.writer.resume()
+
+
+def _log_failure(what):
+    def _done(task):
+        if not task.cancelled() and task.exception() is not None:
+            LOG.error('%s failed: %s', what, task.exception())
+    return _done
+
+
+class AsyncioSessionAcceptor(object):
+    """SessionAcceptor on loop.create_server(), register() takes the
+    session instead of a conn_handle.
+    """
+
+    def __init__(self, loop, bind_address, stats=None,
+                 backlog=DEFAULT_LISTEN_BACKLOG,
+                 hold_time=DEFAULT_ACCEPT_HOLD_TIME):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(bind_address)
+        self._loop = loop
+        self._socket = sock
+        self._backlog = backlog
+        self._hold_time = hold_time
+        self._handlers = {}  # key source address
+        self._pending = {}  # key source address, not yet registered
+        self._server = None
+        self._task = None
+        self.stats = stats or SessionSetupStats()
+
+    @property
+    def address(self):
+        return self._socket.getsockname()
+
+    def register(self, addr, session):
+        self._handlers[addr] = session
+        protocol = self._pending.pop(addr, None)
+        if protocol is not None:
+            protocol.hold_timer.cancel()
+            self._hand_over(protocol, session)
+
+    def unregister(self, addr):
+        self._handlers.pop(addr, None)
+
+    def start(self):
+        if self._task is None:
+            self._socket.listen(self._backlog)
+            self._socket.setblocking(False)
+            self._task = self._loop.create_task(self._loop.create_server(
+                self._new_protocol, sock=self._socket))
+            self._task.add_done_callback(self._started)
+
+    def _started(self, task):
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            LOG.error('session server failed: %s', task.exception())
+            return
+        self._server = task.result()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        elif self._task is not None:
+            self._task.cancel()
+        self._socket.close()
+        for protocol in self._pending.values():
+            protocol.hold_timer.cancel()
+            protocol.transport.close()
+        self._pending.clear()
+
+    def _new_protocol(self):
+        return SessionProtocol(self._loop, acceptor=self)
+
+    def accepted(self, protocol):
+        addr = protocol.transport.get_extra_info('peername')[0]
+        session = self._handlers.get(addr)
+        if session is not None:
+            self._hand_over(protocol, session)
+            return
+        old = self._pending.pop(addr, None)
+        if old is not None:
+            old.hold_timer.cancel()
+            self._reject(addr, old)
+        protocol.transport.pause_reading()
+        self._pending[addr] = protocol
+        protocol.hold_timer = self._loop.call_later(
+            self._hold_time, self._expire, addr, protocol)
+
+    def _hand_over(self, protocol, session):
+        self.stats.accepts += 1
+        protocol.attach(session, False)
+        protocol.transport.resume_reading()
+
+    def _expire(self, addr, protocol):
+        if self._pending.get(addr) is protocol:
+            del self._pending[addr]
+            self._reject(addr, protocol)
+
+    def _reject(self, addr, protocol):
+        # no hello adjacency with addr, the peer retries
+        LOG.debug('rejected session from %s', addr)
+        self.stats.rejects += 1
+        protocol.transport.close()
+
+
+class _Connect(object):
+    __slots__ = ('peer_addr', 'session', 'is_wanted', 'backoff')
+
+    def __init__(self, peer_addr, session, is_wanted, backoff):
+        self.peer_addr = peer_addr
+        self.session = session
+        self.is_wanted = is_wanted
+        self.backoff = backoff
+
+
+class AsyncioSessionConnector(object):
+    """SessionConnector on loop.create_connection(), connect() takes
+    the session instead of a conn_handle.
+    """
+
+    def __init__(self, loop, bind_ip, stats=None,
+                 max_connecting=DEFAULT_MAX_CONNECTING,
+                 timeout=DEFAULT_CONN_TIMEOUT,
+                 backoff_factory=ConnectBackoff):
+        self._loop = loop
+        self._bind_ip = bind_ip
+        self._timeout = timeout
+        self._backoff_factory = backoff_factory
+        self._max_connecting = max_connecting
+        self._connecting = 0
+        self._queue = collections.deque()
+        self.stats = stats or SessionSetupStats()
+
+    def connect(self, peer_addr, session, is_wanted, delay=0):
+        """Connects to peer_addr, after delay seconds, until it succeeds
+        or is_wanted() returns False, then starts the session with
+        is_active True.
+        """
+        attempt = _Connect(peer_addr, session, is_wanted,
+                           self._backoff_factory())
+        if delay:
+            self._loop.call_later(delay, self._retry, attempt)
+            return
+        self._queue.append(attempt)
+        self._next()
+
+    def _next(self):
+        while self._connecting < self._max_connecting and self._queue:
+            attempt = self._queue.popleft()
+            if attempt.is_wanted():
+                self._try_connect(attempt)
+
+    def _try_connect(self, attempt):
+        self._connecting += 1
+        self.stats.connects += 1
+        host, port = attempt.peer_addr
+        protocol = SessionProtocol(self._loop, attempt.session, True)
+        task = self._loop.create_task(self._loop.create_connection(
+            lambda: protocol, host, port, local_addr=(self._bind_ip, 0)))
+        timer = self._loop.call_later(self._timeout, task.cancel)
+        task.add_done_callback(
+            functools.partial(self._connected, attempt, timer))
+
+    def _connected(self, attempt, timer, task):
+        timer.cancel()
+        self._connecting -= 1
+        if task.cancelled() or task.exception() is not None:
+            self.stats.connect_failures += 1
+            err = 'timed out' if task.cancelled() else task.exception()
+            if attempt.is_wanted():
+                delay = attempt.backoff.next_delay()
+                LOG.debug('connect to %s failed: %s, retry in %.1fs',
+                          attempt.peer_addr, err, delay)
+                self._loop.call_later(delay, self._retry, attempt)
+        # a connected protocol started the session
+        self._next()
+
+    def _retry(self, attempt):
+        self._queue.append(attempt)
+        self._next()
+
+
+class _DiscoveryProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self._server = server
+
+    def connection_made(self, transport):
+        self._server.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            self._server.handler(data, addr)
+        except Exception:
+            LOG.exception('failed to handle hello from %s', addr)
+
+    def error_received(self, exc):
+        LOG.debug('discovery socket error: %s', exc)
+
+
+class AsyncioDiscoverServer(object):
+    """DiscoverServer on a datagram endpoint of the loop."""
+
+    def __init__(self, loop, iface):
+        self._loop = loop
+        self.socket = discovery_socket(iface)
+        self.socket.setblocking(False)
+        self.transport = None
+        self.handler = None
+
+    def start(self, handler):
+        self.handler = handler
+        task = self._loop.create_task(self._loop.create_datagram_endpoint(
+            lambda: _DiscoveryProtocol(self), sock=self.socket))
+        task.add_done_callback(_log_failure('discovery endpoint'))
+
+    def stop(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+        else:
+            self.socket.close()
+
+    def sendto(self, data, addr):
+        if self.transport is None:
+            # the endpoint is not up yet, a hello is one datagram
+            try:
+                self.socket.sendto(data, addr)
+            except socket.error as e:
+                LOG.debug('hello not sent: %s', e)
+            return
+        self.transport.sendto(data, addr)
+
+
+class AsyncioBackend(object):
+    name = 'asyncio'
+
+    def __init__(self, loop=None):
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self.loop = loop
+
+    def create_looping_call(self, funct, *args, **kwargs):
+        return AsyncioLoopingCall(self.loop, funct, *args, **kwargs)
+
+    def create_timer(self, handler):
+        return AsyncioTimer(self.loop, handler)
+
+    def spawn(self, func, *args, **kwargs):
+        if kwargs:
+            func = functools.partial(func, **kwargs)
+        return self.loop.call_soon(func, *args)
+
+    def kill(self, handle):
+        handle.cancel()
+
+    def cooperate(self):
+        pass
+
+    def create_writer(self, protocol, high_watermark, low_watermark,
+                      error_handler=None, wait_histogram=None):
+        return SessionWriter(protocol, high_watermark, low_watermark,
+                             error_handler=error_handler,
+                             wait_histogram=wait_histogram)
+
+    def session_handle(self, peer):
+        return peer
+
+    def start_session(self, sock, peer, is_active):
+        """Runs the session of peer on a connected socket."""
+        sock.setblocking(False)
+        task = self.loop.create_task(self.loop.create_connection(
+            lambda: SessionProtocol(self.loop, peer, is_active),
+            sock=sock))
+        task.add_done_callback(_log_failure('session'))
+
+    def create_acceptor(self, bind_address, stats=None):
+        return AsyncioSessionAcceptor(self.loop, bind_address, stats)
+
+    def create_connector(self, bind_ip, stats=None):
+        return AsyncioSessionConnector(self.loop, bind_ip, stats)
+
+    def create_discover_server(self, iface_conf):
+        return AsyncioDiscoverServer(self.loop, iface_conf.ip_address)
+
+    def stop(self):
+        pass
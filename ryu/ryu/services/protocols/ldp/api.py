@@ -28,4 +28,19 @@ def ldp_config(app, interface, config):
     config_request.sync = True
     return app.send_request(config_request)
 
+def ldp_subscribe(app, msg_types):
+    """deliver EventLDPMessageBatch of the given LDP message types
+    to app.
+    """
+    manager = app_manager.lookup_service_brick(ldp_event.LDP_MANAGER_NAME)
+    manager.subscribe_app(app.name, msg_types)
+
+
+def ldp_register_callback(msg_types, callback):
+    """call callback(peer, msg) for each received message of
+    the given types in the receiving thread.
+    """
+    manager = app_manager.lookup_service_brick(ldp_event.LDP_MANAGER_NAME)
+    manager.dispatcher.register_callback(msg_types, callback)
+
 app_manager.require_app('ryu.services.protocols.ldp.manager', api_style=True)
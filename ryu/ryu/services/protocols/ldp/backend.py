@@ -0,0 +1,108 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+IO backends of the LDP speaker.
+
+Peer, LDPInterface and DistributionEngine get their timers, sockets and
+scheduling from the io_backend of their app, so the same state machines
+run on any of these:
+
+    create_looping_call(funct, *args)   LoopingCall interface
+    create_timer(handler)               Timer interface
+    spawn(func, *args), kill(thread)    runs func soon in its own turn,
+                                        func must not block unless the
+                                        backend has green threads
+    cooperate()                         lets other sessions run if the
+                                        backend can switch here
+    create_writer(conn, high_watermark, low_watermark, error_handler,
+                  wait_histogram)       PeerWriter interface on a
+                                        session connection
+    session_handle(peer)                what the acceptor and the
+                                        connector hand connections to
+    start_session(sock, peer, is_active)
+                                        runs a session on a connected
+                                        socket
+    create_acceptor(bind_address, stats)
+    create_connector(bind_ip, stats)
+    create_discover_server(iface_conf)
+    stop()
+
+EventletBackend runs on the green threads of ryu.lib.hub and is used by
+LDPManager. Its timers run on ldp_util.get_clock(), which tests and
+simulations may set to a VirtualClock. aio.AsyncioBackend runs on an
+asyncio event loop.
+"""
+
+from ryu.lib import hub
+from ryu.services.protocols.ldp.discovery import DiscoverServer
+from ryu.services.protocols.ldp.discovery import DiscoveryEngine
+from ryu.services.protocols.ldp.ldp_util import EventletIOFactory
+from ryu.services.protocols.ldp.ldp_util import Timer
+from ryu.services.protocols.ldp.session import SessionAcceptor
+from ryu.services.protocols.ldp.session import SessionConnector
+from ryu.services.protocols.ldp.writer import PeerWriter
+
+
+class EventletBackend(object):
+    name = 'eventlet'
+
+    def __init__(self):
+        self._discovery = None
+
+    def create_looping_call(self, funct, *args, **kwargs):
+        return EventletIOFactory.create_looping_call(funct, *args, **kwargs)
+
+    def create_timer(self, handler):
+        return Timer(handler)
+
+    def spawn(self, func, *args, **kwargs):
+        return hub.spawn(func, *args, **kwargs)
+
+    def kill(self, thread):
+        hub.kill(thread)
+
+    def cooperate(self):
+        hub.sleep(0)
+
+    def create_writer(self, sock, high_watermark, low_watermark,
+                      error_handler=None, wait_histogram=None):
+        return PeerWriter(sock, high_watermark, low_watermark,
+                          error_handler=error_handler,
+                          wait_histogram=wait_histogram)
+
+    def session_handle(self, peer):
+        return peer.conn_handle
+
+    def start_session(self, sock, peer, is_active):
+        self.spawn(peer.conn_handle, sock, is_active)
+
+    def create_acceptor(self, bind_address, stats=None):
+        return SessionAcceptor(bind_address, stats)
+
+    def create_connector(self, bind_ip, stats=None):
+        return SessionConnector(bind_ip, stats)
+
+    def create_discover_server(self, iface_conf):
+        if not DiscoveryEngine.is_supported():
+            return DiscoverServer(iface_conf.ip_address)
+        if self._discovery is None:
+            self._discovery = DiscoveryEngine()
+        return self._discovery.add_interface(iface_conf)
+
+    def stop(self):
+        if self._discovery is not None:
+            self._discovery.stop()
+            self._discovery = None
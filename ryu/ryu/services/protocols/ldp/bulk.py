@@ -0,0 +1,345 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Bulk codec of Label Mapping and Address messages.
+
+Bindings are passed as parallel arrays (array.array or NumPy arrays) of
+IPv4 prefixes as integers in host order, prefix lengths and labels.
+The encoders write the messages into one preallocated bytearray and
+return it with the end offset of each message, frame_pdus() then packs
+the messages into PDUs. The decoders walk a buffer of messages and
+append the fields to arrays; no object is created per binding.
+
+With NumPy the Label Mapping encoder fills every header field of all
+messages with one vectorized store per field. Without it the messages
+are packed with two struct.pack_into() calls each.
+"""
+
+import bisect
+import struct
+import sys
+from array import array
+
+from ryu.services.protocols.ldp.framing import LDP_DEFAULT_MAX_PDU_LEN
+from ryu.services.protocols.ldp.framing import LDP_PDU_HEADER_LEN
+from ryu.services.protocols.ldp.framing import LDP_PDU_LEN_OFFSET
+from ryu.services.protocols.ldp.message_view import ADDRESS_FAMILY_IPV4
+from ryu.services.protocols.ldp.message_view import FEC_PREFIX
+from ryu.services.protocols.ldp.message_view import LDP_MSG_HEADER_LEN
+from ryu.services.protocols.ldp.message_view import LDP_MSG_HEADER_PACK_STR
+from ryu.services.protocols.ldp.message_view import LDP_MSG_LEN_OFFSET
+from ryu.services.protocols.ldp.message_view import TLV_ADDRESS_LIST
+from ryu.services.protocols.ldp.message_view import TLV_FEC
+from ryu.services.protocols.ldp.message_view import TLV_GENERIC_LABEL
+from ryu.services.protocols.ldp.message_view import BadTlvLength
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# below this the per field stores of NumPy cost more than they save
+NUMPY_MIN_COUNT = 64
+LDP_MSG_ADDRESS = 0x0300
+LDP_MSG_ADDRESS_WITHDRAW = 0x0301
+LDP_MSG_LABEL_MAPPING = 0x0400
+
+# message header, FEC TLV header, prefix element header, generic label
+# TLV; the prefix follows the element header
+LABEL_MAPPING_FIXED_LEN = 24
+# message header, address list TLV header, address family
+ADDRESS_FIXED_LEN = 14
+# addresses of one Address message within the default max PDU length
+MAX_ADDRESSES = (LDP_DEFAULT_MAX_PDU_LEN - LDP_PDU_HEADER_LEN -
+                 ADDRESS_FIXED_LEN) // 4
+
+# up to the prefix, which is packed as 4 bytes and then partly
+# overwritten by the label TLV
+_MAPPING_HEAD = struct.Struct('!HHIHHBHBI')
+_LABEL_TLV = struct.Struct('!HHI')
+_FEC_ELEMENT = struct.Struct('!BHB')
+_MSG_HEADER = struct.Struct(LDP_MSG_HEADER_PACK_STR)
+_TLV_HEADER = struct.Struct('!HH')
+_U32 = struct.Struct('!I')
+
+_BIG_ENDIAN = sys.byteorder == 'big'
+
+
+def _prefix_bytes(prefix_len):
+    return (prefix_len + 7) >> 3
+
+
+def _u32_array(values=()):
+    return array('I', values)
+
+
+def encode_label_mappings(prefixes, prefix_lens, labels, msg_id=1):
+    """Returns (buf, ends), one Label Mapping message per binding in a
+    bytearray and the end offset of each message. The messages get
+    consecutive message ids starting with msg_id.
+    """
+    count = len(labels)
+    if not (len(prefixes) == len(prefix_lens) == count):
+        raise ValueError('arrays of different length')
+    if numpy is not None and count >= NUMPY_MIN_COUNT:
+        return _encode_label_mappings_numpy(prefixes, prefix_lens, labels,
+                                            msg_id)
+    total = LABEL_MAPPING_FIXED_LEN * count
+    for prefix_len in prefix_lens:
+        total += _prefix_bytes(prefix_len)
+    buf = bytearray(total)
+    ends = _u32_array()
+    pack_head = _MAPPING_HEAD.pack_into
+    pack_label = _LABEL_TLV.pack_into
+    offset = 0
+    for i in range(count):
+        prefix_len = prefix_lens[i]
+        nbytes = (prefix_len + 7) >> 3
+        size = LABEL_MAPPING_FIXED_LEN + nbytes
+        pack_head(buf, offset, LDP_MSG_LABEL_MAPPING,
+                  size - LDP_MSG_LEN_OFFSET, msg_id + i, TLV_FEC, 4 + nbytes,
+                  FEC_PREFIX, ADDRESS_FAMILY_IPV4, prefix_len, prefixes[i])
+        pack_label(buf, offset + 16 + nbytes, TLV_GENERIC_LABEL, 4,
+                   labels[i])
+        offset += size
+        ends.append(offset)
+    return buf, ends
+
+
+def _put_u16(out, offsets, values):
+    out[offsets] = (values >> 8) & 0xff
+    out[offsets + 1] = values & 0xff
+
+
+def _put_u32(out, offsets, values):
+    for i in range(4):
+        out[offsets + i] = (values >> (24 - 8 * i)) & 0xff
+
+
+def _encode_label_mappings_numpy(prefixes, prefix_lens, labels, msg_id):
+    prefixes = numpy.asarray(prefixes, dtype=numpy.uint32)
+    prefix_lens = numpy.asarray(prefix_lens, dtype=numpy.uint32)
+    labels = numpy.asarray(labels, dtype=numpy.uint32)
+    nbytes = (prefix_lens + 7) >> 3
+    sizes = nbytes + LABEL_MAPPING_FIXED_LEN
+    ends = numpy.cumsum(sizes, dtype=numpy.uint32)
+    starts = ends - sizes
+    buf = bytearray(int(ends[-1]) if len(ends) else 0)
+    out = numpy.frombuffer(buf, dtype=numpy.uint8)
+    _put_u16(out, starts, numpy.uint32(LDP_MSG_LABEL_MAPPING))
+    _put_u16(out, starts + 2, sizes - LDP_MSG_LEN_OFFSET)
+    _put_u32(out, starts + 4,
+             numpy.arange(msg_id, msg_id + len(sizes), dtype=numpy.uint32))
+    _put_u16(out, starts + 8, numpy.uint32(TLV_FEC))
+    _put_u16(out, starts + 10, nbytes + 4)
+    out[starts + 12] = FEC_PREFIX
+    _put_u16(out, starts + 13, numpy.uint32(ADDRESS_FAMILY_IPV4))
+    out[starts + 15] = prefix_lens
+    for i in range(4):
+        mask = nbytes > i
+        out[starts[mask] + 16 + i] = (prefixes[mask] >> (24 - 8 * i)) & 0xff
+    label_starts = starts + 16 + nbytes
+    _put_u16(out, label_starts, numpy.uint32(TLV_GENERIC_LABEL))
+    _put_u16(out, label_starts + 2, numpy.uint32(4))
+    _put_u32(out, label_starts + 4, labels)
+    return buf, ends
+
+
+def encode_addresses(addrs, msg_id=1, max_addresses=MAX_ADDRESSES):
+    """Returns (buf, ends), Address messages announcing the IPv4
+    addresses, at most max_addresses per message.
+    """
+    if numpy is not None:
+        data = numpy.asarray(addrs, dtype='>u4').tobytes()
+    else:
+        swapped = _u32_array(addrs)
+        if not _BIG_ENDIAN:
+            swapped.byteswap()
+        data = swapped.tobytes() if hasattr(swapped, 'tobytes') \
+            else swapped.tostring()
+    count = len(data) // 4
+    messages = (count + max_addresses - 1) // max_addresses
+    buf = bytearray(ADDRESS_FIXED_LEN * messages + len(data))
+    ends = _u32_array()
+    offset = 0
+    for i in range(messages):
+        chunk = data[i * max_addresses * 4:(i + 1) * max_addresses * 4]
+        size = ADDRESS_FIXED_LEN + len(chunk)
+        _MSG_HEADER.pack_into(buf, offset, LDP_MSG_ADDRESS,
+                              size - LDP_MSG_LEN_OFFSET, msg_id + i)
+        _TLV_HEADER.pack_into(buf, offset + LDP_MSG_HEADER_LEN,
+                              TLV_ADDRESS_LIST, len(chunk) + 2)
+        struct.pack_into('!H', buf, offset + 12, ADDRESS_FAMILY_IPV4)
+        buf[offset + ADDRESS_FIXED_LEN:offset + size] = chunk
+        offset += size
+        ends.append(offset)
+    return buf, ends
+
+
+def frame_pdus(buf, ends, header, max_pdu_len=LDP_DEFAULT_MAX_PDU_LEN):
+    """Returns the messages of buf packed into as few PDUs as
+    max_pdu_len allows, as one bytearray. header is the PDU header to
+    use, its length field is patched per PDU.
+    """
+    max_body = max_pdu_len - LDP_PDU_HEADER_LEN
+    view = memoryview(buf)
+    out = bytearray()
+    start = 0
+    index = 0
+    count = len(ends)
+    while index < count:
+        last = bisect.bisect_right(ends, start + max_body, index) - 1
+        if last < index:
+            # a message longer than max_pdu_len is sent on its own
+            last = index
+        end = int(ends[last])
+        pdu_start = len(out)
+        out += header
+        struct.pack_into('!H', out, pdu_start + 2,
+                         LDP_PDU_HEADER_LEN - LDP_PDU_LEN_OFFSET +
+                         end - start)
+        out += view[start:end]
+        start = end
+        index = last + 1
+    return out
+
+
+def _walk(buf, offset, end):
+    if end is None:
+        end = len(buf)
+    unpack = _MSG_HEADER.unpack_from
+    while offset + LDP_MSG_HEADER_LEN <= end:
+        msg_type, length, msg_id = unpack(buf, offset)
+        msg_end = offset + LDP_MSG_LEN_OFFSET + length
+        yield msg_type & 0x7fff, offset, msg_end
+        offset = msg_end
+
+
+def _tlvs(buf, offset, end):
+    unpack = _TLV_HEADER.unpack_from
+    offset += LDP_MSG_HEADER_LEN
+    while offset + 4 <= end:
+        tlv_type, length = unpack(buf, offset)
+        yield tlv_type & 0x3fff, offset + 4, length
+        offset += 4 + length
+
+
+def decode_mapping_into(buf, offset, end, prefixes, prefix_lens, labels):
+    """Appends the bindings of the Label Mapping message from offset to
+    end to the arrays. Returns False, appending nothing, if it is not a
+    Label Mapping of IPv4 prefix FECs; parse_message() then checks and
+    decodes it. Raises BadTlvLength if a TLV runs past the message.
+    """
+    msg_type = _MSG_HEADER.unpack_from(buf, offset)[0] & 0x7fff
+    if msg_type != LDP_MSG_LABEL_MAPPING:
+        return False
+    unpack_u32 = _U32.unpack_from
+    fec = label = None
+    for tlv_type, tlv_offset, length in _tlvs(buf, offset, end):
+        if tlv_offset + length > end:
+            raise BadTlvLength('TLV 0x%04x of length %d past the end of '
+                               'the message' % (tlv_type, length))
+        if tlv_type == TLV_FEC and fec is None:
+            fec = (tlv_offset, length)
+        elif tlv_type == TLV_GENERIC_LABEL and label is None:
+            if length < 4:
+                raise BadTlvLength('label TLV of length %d' % length)
+            label = unpack_u32(buf, tlv_offset)[0] & 0xfffff
+    if fec is None or label is None:
+        return False
+    element, fec_end = fec[0], fec[0] + fec[1]
+    count = len(labels)
+    while element + 4 <= fec_end:
+        element_type, family, prefix_len = _FEC_ELEMENT.unpack_from(
+            buf, element)
+        if element_type != FEC_PREFIX or \
+                family != ADDRESS_FAMILY_IPV4 or prefix_len > 32:
+            break
+        nbytes = (prefix_len + 7) >> 3
+        if element + 4 + nbytes > fec_end:
+            break
+        if nbytes == 4:
+            prefix = unpack_u32(buf, element + 4)[0]
+        else:
+            prefix = 0
+            for byte in bytearray(buf[element + 4:element + 4 + nbytes]):
+                prefix = (prefix << 8) | byte
+            prefix <<= 32 - 8 * nbytes
+        prefixes.append(prefix)
+        prefix_lens.append(prefix_len)
+        labels.append(label)
+        element += 4 + nbytes
+    if element != fec_end:
+        # e.g. a wildcard or IPv6 element, leave the message to the
+        # caller
+        del prefixes[count:]
+        del prefix_lens[count:]
+        del labels[count:]
+        return False
+    return True
+
+
+def decode_label_mappings(buf, offset=0, end=None):
+    """Decodes the Label Mapping messages of a buffer of messages, e.g.
+    a PDU from offset LDP_PDU_HEADER_LEN.
+    Returns (prefixes, prefix_lens, labels, others): the binding of each
+    prefix FEC element in arrays and the offsets of all other messages.
+    """
+    prefixes = _u32_array()
+    prefix_lens = array('B')
+    labels = _u32_array()
+    others = _u32_array()
+    for msg_type, msg_offset, msg_end in _walk(buf, offset, end):
+        if not decode_mapping_into(buf, msg_offset, msg_end, prefixes,
+                                   prefix_lens, labels):
+            others.append(msg_offset)
+    return prefixes, prefix_lens, labels, others
+
+
+def decode_addresses(buf, offset=0, end=None):
+    """Decodes the Address and Address Withdraw messages of a buffer of
+    messages. Returns (addresses, withdrawn, others), two arrays of IPv4
+    addresses as integers in host order and the offsets of all other
+    messages.
+    """
+    added = _u32_array()
+    withdrawn = _u32_array()
+    others = _u32_array()
+    for msg_type, msg_offset, msg_end in _walk(buf, offset, end):
+        if msg_type == LDP_MSG_ADDRESS:
+            addrs = added
+        elif msg_type == LDP_MSG_ADDRESS_WITHDRAW:
+            addrs = withdrawn
+        else:
+            others.append(msg_offset)
+            continue
+        for tlv_type, tlv_offset, length in _tlvs(buf, msg_offset, msg_end):
+            if tlv_type == TLV_ADDRESS_LIST:
+                family = struct.unpack_from('!H', buf, tlv_offset)[0]
+                if family != ADDRESS_FAMILY_IPV4:
+                    break
+                data = array('I')
+                raw = bytes(bytearray(buf[tlv_offset + 2:
+                                          tlv_offset + length]))
+                if hasattr(data, 'frombytes'):
+                    data.frombytes(raw)
+                else:
+                    data.fromstring(raw)
+                if not _BIG_ENDIAN:
+                    data.byteswap()
+                addrs.extend(data)
+                break
+    return added, withdrawn, others
@@ -0,0 +1,148 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Decoding of large receives in worker processes.
+
+When one receive of an operational session holds at least
+offload_min_bytes of complete PDUs, e.g. the initial label dump of a
+peer, Peer hands the PDUs to a DecodePool instead of decoding them on
+the hub. A worker returns the messages as records in receive order:
+
+    (RECORD_BINDINGS, msg_count, prefixes, prefix_lens, labels)
+        a run of Label Mappings as arrays, see bulk.py
+    (RECORD_MESSAGES, offsets)
+        a run of other messages, the offsets into the data of the
+        messages, which the hub decodes as MessageViews
+
+The peer's receive loop waits for the result, so the messages of a
+session are handled in order while other peers keep running.
+"""
+
+import multiprocessing
+import struct
+import time
+from array import array
+
+from ryu.lib import hub
+from ryu.services.protocols.ldp.bulk import decode_mapping_into
+from ryu.services.protocols.ldp.framing import LDP_PDU_HEADER_LEN
+from ryu.services.protocols.ldp.framing import LDP_PDU_LEN_OFFSET
+from ryu.services.protocols.ldp.message_view import LDP_MSG_HEADER_LEN
+from ryu.services.protocols.ldp.message_view import LDP_MSG_LEN_OFFSET
+from ryu.services.protocols.ldp.message_view import BadMessageLength
+
+# One receive holds at most the receive buffer of the framer, 64 KiB
+# unless a PDU did not fit.
+DEFAULT_OFFLOAD_MIN_BYTES = 32 * 1024
+# The pool's result thread must not touch green primitives, the hub
+# polls for the result instead.
+RESULT_POLL_INTERVAL = 0.001
+
+RECORD_BINDINGS = 0
+RECORD_MESSAGES = 1
+
+
+def decode_pdus(data):
+    """Returns the records of the complete PDUs in data."""
+    records = []
+    prefixes = prefix_lens = labels = offsets = None
+    msg_count = 0
+    end = len(data)
+    pdu_offset = 0
+    while pdu_offset + LDP_PDU_HEADER_LEN <= end:
+        (pdu_len, ) = struct.unpack_from('!H', data, pdu_offset + 2)
+        pdu_end = pdu_offset + LDP_PDU_LEN_OFFSET + pdu_len
+        offset = pdu_offset + LDP_PDU_HEADER_LEN
+        while offset < pdu_end:
+            if offset + LDP_MSG_HEADER_LEN > pdu_end:
+                raise BadMessageLength('message header past the end of '
+                                       'the PDU')
+            (length, ) = struct.unpack_from('!H', data, offset + 2)
+            msg_end = offset + LDP_MSG_LEN_OFFSET + length
+            if msg_end > pdu_end or \
+                    length < LDP_MSG_HEADER_LEN - LDP_MSG_LEN_OFFSET:
+                raise BadMessageLength('message of length %d past the '
+                                       'end of the PDU' % length)
+            if labels is None:
+                prefixes, prefix_lens, labels = \
+                    array('I'), array('B'), array('I')
+            if decode_mapping_into(data, offset, msg_end, prefixes,
+                                   prefix_lens, labels):
+                if offsets is not None:
+                    records.append((RECORD_MESSAGES, offsets))
+                    offsets = None
+                msg_count += 1
+            else:
+                if msg_count:
+                    records.append((RECORD_BINDINGS, msg_count, prefixes,
+                                    prefix_lens, labels))
+                    prefixes = prefix_lens = labels = None
+                    msg_count = 0
+                if offsets is None:
+                    offsets = array('I')
+                offsets.append(offset)
+            offset = msg_end
+        pdu_offset = pdu_end
+    if msg_count:
+        records.append((RECORD_BINDINGS, msg_count, prefixes, prefix_lens,
+                        labels))
+    if offsets is not None:
+        records.append((RECORD_MESSAGES, offsets))
+    return records
+
+
+class DecodePool(object):
+    def __init__(self, processes,
+                 offload_min_bytes=DEFAULT_OFFLOAD_MIN_BYTES):
+        self.processes = processes
+        self.offload_min_bytes = offload_min_bytes
+        self._pool = None
+        self.jobs = 0
+        self.bytes_decoded = 0
+        self.time_waiting = 0.0
+
+    def start(self):
+        # fork early, before the workers would inherit many threads
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.processes)
+
+    def stop(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    def should_offload(self, nbytes):
+        return self._pool is not None and nbytes >= self.offload_min_bytes
+
+    def decode(self, data):
+        """Returns decode_pdus(data) computed by a worker. Only the
+        calling green thread waits for it.
+        """
+        start = time.time()
+        result = self._pool.apply_async(decode_pdus, (data, ))
+        while not result.ready():
+            hub.sleep(RESULT_POLL_INTERVAL)
+        self.jobs += 1
+        self.bytes_decoded += len(data)
+        self.time_waiting += time.time() - start
+        return result.get()
+
+    def stats(self):
+        return {'processes': self.processes,
+                'offload_min_bytes': self.offload_min_bytes,
+                'jobs': self.jobs,
+                'bytes_decoded': self.bytes_decoded,
+                'time_waiting': self.time_waiting}
@@ -0,0 +1,221 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Sockets of basic discovery.
+
+A discovery server has start(handler), which calls handler(data, addr)
+for every hello received, sendto(data, addr) and stop().
+"""
+
+import logging
+import socket
+import struct
+
+from eventlet import semaphore
+from ryu.lib import hub
+
+LOG = logging.getLogger('ldp.discovery')
+
+ALL_ROUTER = '224.0.0.2'
+LDP_DISCOVERY_PORT = 646
+# Linux value, older pythons do not define socket.IP_PKTINFO
+IP_PKTINFO = getattr(socket, 'IP_PKTINFO', 8)
+# struct in_pktinfo {ifindex, spec_dst, addr}
+IN_PKTINFO_PACK_STR = '=i4s4s'
+# struct ip_mreqn {multiaddr, address, ifindex}
+IP_MREQN_PACK_STR = '=4s4si'
+
+
+def discovery_socket(iface):
+    """Returns a socket receiving the hellos on the interface with
+    the address iface, which hellos are sent from.
+    """
+    sock = socket.socket(socket.AF_INET,
+        socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET,
+         socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_IP,
+        socket.IP_MULTICAST_LOOP, 0)
+    if hasattr(socket, "SO_REUSEPORT"):
+        sock.setsockopt(socket.SOL_SOCKET,
+            socket.SO_REUSEPORT, 1)
+    sock.setsockopt(socket.IPPROTO_IP,
+        socket.IP_ADD_MEMBERSHIP,
+        socket.inet_aton(ALL_ROUTER) + socket.inet_aton(iface))
+    sock.setsockopt(socket.SOL_IP,
+         socket.IP_MULTICAST_IF,
+         socket.inet_aton(iface))
+    sock.bind((ALL_ROUTER, LDP_DISCOVERY_PORT))
+    return sock
+
+
+def engine_socket():
+    """Returns the socket of DiscoveryEngine, not yet in the group on
+    any interface.
+    """
+    sock = socket.socket(socket.AF_INET,
+        socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET,
+         socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_IP,
+        socket.IP_MULTICAST_LOOP, 0)
+    sock.setsockopt(socket.SOL_IP, IP_PKTINFO, 1)
+    sock.bind((ALL_ROUTER, LDP_DISCOVERY_PORT))
+    return sock
+
+
+class DiscoverServer(object):
+
+    def __init__(self, iface):
+        self.write_lock = semaphore.Semaphore()
+        self.socket = discovery_socket(iface)
+        self._thread = None
+
+    def start(self, handler):
+        self._thread = hub.spawn(self._recv_loop, handler)
+
+    def stop(self):
+        if self._thread is not None:
+            hub.kill(self._thread)
+            self._thread = None
+        self.socket.close()
+
+    def sendto(self, *args):
+        self.write_lock.acquire()
+        try:
+            self.socket.sendto(*args)
+        finally:
+            self.write_lock.release()
+
+    def _recv_loop(self, handler):
+        while True:
+            data, addr = self.socket.recvfrom(8192)
+            self._datagram_received(handler, data, addr)
+
+    def _datagram_received(self, handler, data, addr):
+        try:
+            handler(data, addr)
+        except Exception:
+            LOG.exception('failed to handle hello from %s', addr)
+
+
+class DiscoveryEngine(object):
+    """Discovery for all interfaces over one socket.
+
+    The socket joins the group on every interface and IP_PKTINFO tells
+    which interface a hello came in on, so each hello is received once
+    and handed to the endpoint of that interface. Hellos are sent with
+    the outgoing interface chosen per datagram.
+    """
+
+    @staticmethod
+    def is_supported():
+        return (hasattr(socket.socket, 'recvmsg') and
+                hasattr(socket, 'if_nametoindex'))
+
+    def __init__(self, sock=None):
+        self.write_lock = semaphore.Semaphore()
+        if sock is None:
+            sock = engine_socket()
+        self.socket = sock
+        self._endpoints = {}  # key ifindex
+        self._cmsg_size = socket.CMSG_SPACE(
+            struct.calcsize(IN_PKTINFO_PACK_STR))
+        self._thread = None
+
+    def add_interface(self, iface_conf):
+        ifindex = socket.if_nametoindex(iface_conf.device_name)
+        self.socket.setsockopt(socket.IPPROTO_IP,
+            socket.IP_ADD_MEMBERSHIP,
+            struct.pack(IP_MREQN_PACK_STR, socket.inet_aton(ALL_ROUTER),
+                        socket.inet_aton(iface_conf.ip_address), ifindex))
+        endpoint = DiscoveryEndpoint(self, ifindex, iface_conf.ip_address)
+        self._endpoints[ifindex] = endpoint
+        return endpoint
+
+    def start(self):
+        if self._thread is None:
+            self._thread = hub.spawn(self._recv_loop)
+
+    def stop(self):
+        if self._thread is not None:
+            hub.kill(self._thread)
+            self._thread = None
+        self.socket.close()
+
+    def sendto(self, endpoint, data, addr):
+        pktinfo = struct.pack(IN_PKTINFO_PACK_STR, endpoint.ifindex,
+                              socket.inet_aton(endpoint.ip_address),
+                              b'\x00' * 4)
+        self.write_lock.acquire()
+        try:
+            self.socket.sendmsg([data],
+                [(socket.IPPROTO_IP, IP_PKTINFO, pktinfo)], 0, addr)
+        finally:
+            self.write_lock.release()
+
+    def _recv_loop(self):
+        while True:
+            try:
+                data, ancdata, flags, addr = self.socket.recvmsg(
+                    8192, self._cmsg_size)
+            except socket.error as e:
+                # e.g. an ICMP error of an earlier hello, the hellos of
+                # the other interfaces keep coming
+                LOG.warning('failed to receive a hello: %s', e)
+                continue
+            self._datagram_received(data, ancdata, addr)
+
+    def _datagram_received(self, data, ancdata, addr):
+        endpoint = self._endpoints.get(self._ifindex(ancdata))
+        if endpoint is None or endpoint.handler is None:
+            return
+        try:
+            endpoint.handler(data, addr)
+        except Exception:
+            LOG.exception('failed to handle hello from %s', addr)
+
+    @staticmethod
+    def _ifindex(ancdata):
+        for level, cmsg_type, cmsg_data in ancdata:
+            if level == socket.IPPROTO_IP and cmsg_type == IP_PKTINFO:
+                ifindex, spec_dst, addr = struct.unpack_from(
+                    IN_PKTINFO_PACK_STR, cmsg_data)
+                return ifindex
+        return None
+
+
+class DiscoveryEndpoint(object):
+    """Per interface view of DiscoveryEngine with the DiscoverServer
+    interface used by LDPInterface.
+    """
+
+    def __init__(self, engine, ifindex, ip_address):
+        self.engine = engine
+        self.ifindex = ifindex
+        self.ip_address = ip_address
+        self.handler = None
+
+    def start(self, handler):
+        self.handler = handler
+        self.engine.start()
+
+    def stop(self):
+        # the engine is shared by the interfaces and stays running
+        self.handler = None
+
+    def sendto(self, data, addr):
+        self.engine.sendto(self, data, addr)
@@ -0,0 +1,158 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Delivery of received LDP messages to other applications.
+
+Applications subscribe to the message types they want. The messages a
+Peer parsed from one receive are delivered to each application as one
+EventLDPMessageBatch holding only the subscribed types. Callbacks run
+in the receiving thread without going through an event queue.
+Messages are MessageViews, see message_view.py.
+
+Label Mappings decoded in bulk, see decode_pool.py, are delivered as
+arrays to bindings callbacks instead. A bindings callback names the
+Label Mapping callback it replaces. Peer decodes in bulk only while no
+application is subscribed to Label Mappings and every Label Mapping
+callback is replaced by a bindings callback.
+"""
+
+import logging
+
+from ryu.base import app_manager
+from ryu.services.protocols.ldp import event as ldp_event
+from ryu.services.protocols.ldp.bulk import LDP_MSG_LABEL_MAPPING
+
+LOG = logging.getLogger('ldp.dispatch')
+
+
+class MessageDispatcher(object):
+    def __init__(self, app):
+        self._app = app
+        self._subscribers = {}  # key msg type, value set of app names
+        self._callbacks = {}  # key msg type, value list of callables
+        # (callback, replaced Label Mapping callback)
+        self._bindings_callbacks = []
+        self.msg_counts = {}  # key msg type
+        self.batch_count = 0
+
+    def subscribe(self, app_name, msg_types):
+        for msg_type in msg_types:
+            self._subscribers.setdefault(msg_type, set()).add(app_name)
+
+    def unsubscribe(self, app_name, msg_types=None):
+        if msg_types is None:
+            msg_types = list(self._subscribers.keys())
+        for msg_type in msg_types:
+            names = self._subscribers.get(msg_type)
+            if names is None:
+                continue
+            names.discard(app_name)
+            if not names:
+                del self._subscribers[msg_type]
+
+    def subscriptions(self):
+        """Returns the subscribed message types by app name."""
+        subscriptions = {}
+        for msg_type, names in self._subscribers.items():
+            for name in names:
+                subscriptions.setdefault(name, []).append(msg_type)
+        return subscriptions
+
+    def register_callback(self, msg_types, callback):
+        """callback(peer, msg) is called in the receiving thread, it
+        must not block.
+        """
+        for msg_type in msg_types:
+            self._callbacks.setdefault(msg_type, []).append(callback)
+
+    def unregister_callback(self, msg_types, callback):
+        for msg_type in msg_types:
+            callbacks = self._callbacks.get(msg_type, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self._callbacks.pop(msg_type, None)
+
+    def register_bindings_callback(self, callback, replaces=None):
+        """callback(peer, prefixes, prefix_lens, labels) is called in
+        the receiving thread with Label Mappings decoded in bulk.
+        replaces is the Label Mapping callback of the same application,
+        which does not get the Label Mappings decoded in bulk.
+        """
+        self._bindings_callbacks.append((callback, replaces))
+
+    def unregister_bindings_callback(self, callback):
+        self._bindings_callbacks = [
+            entry for entry in self._bindings_callbacks
+            if entry[0] != callback]
+
+    def accepts_bindings(self):
+        """True if Label Mappings may be delivered in bulk, that is no
+        application needs them as messages.
+        """
+        if not self._bindings_callbacks or \
+                LDP_MSG_LABEL_MAPPING in self._subscribers:
+            return False
+        replaced = [entry[1] for entry in self._bindings_callbacks]
+        for callback in self._callbacks.get(LDP_MSG_LABEL_MAPPING, ()):
+            if callback not in replaced:
+                return False
+        return True
+
+    def dispatch_bindings(self, peer, msg_count, prefixes, prefix_lens,
+                          labels):
+        counts = self.msg_counts
+        counts[LDP_MSG_LABEL_MAPPING] = \
+            counts.get(LDP_MSG_LABEL_MAPPING, 0) + msg_count
+        for callback, replaced in self._bindings_callbacks:
+            try:
+                callback(peer, prefixes, prefix_lens, labels)
+            except Exception:
+                LOG.exception('LDP bindings callback failed')
+
+    def dispatch(self, peer, msgs):
+        batches = {}
+        counts = self.msg_counts
+        for msg in msgs:
+            msg_type = msg.type
+            counts[msg_type] = counts.get(msg_type, 0) + 1
+            for callback in self._callbacks.get(msg_type, ()):
+                try:
+                    callback(peer, msg)
+                except Exception:
+                    LOG.exception('LDP message callback failed')
+            for name in self._subscribers.get(msg_type, ()):
+                batches.setdefault(name, []).append(msg)
+        for name, batch in batches.items():
+            self.batch_count += 1
+            ev = ldp_event.EventLDPMessageBatch(peer.name, peer, batch)
+            self._app.send_event(name, ev)
+
+    def queue_depths(self):
+        depths = {}
+        names = set()
+        for subscribers in self._subscribers.values():
+            names.update(subscribers)
+        for name in names:
+            brick = app_manager.lookup_service_brick(name)
+            if brick is not None:
+                depths[name] = brick.events.qsize()
+        return depths
+
+    def stats(self):
+        return {'messages': dict(self.msg_counts),
+                'batches': self.batch_count,
+                'queue_depths': self.queue_depths()}
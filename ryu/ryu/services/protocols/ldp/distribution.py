@@ -0,0 +1,269 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Downstream unsolicited distribution of the local label bindings.
+
+The bindings advertised to every peer are kept in a
+LabelInformationBase. Changes of the local FEC table only mark the FEC
+dirty, a flush then sends each operational peer the difference between
+the local table and what it was already told. The messages of one flush
+are encoded by the bulk codec straight into PDUs, and withdraws of many
+FECs share one Label Withdraw message.
+
+A peer whose session became operational is sent its addresses and then
+all bindings in chunks of sync_chunk_size FECs, one chunk per turn of
+the io backend. Nothing more is queued to a peer that is not writable;
+the sync and the changes for the peer wait until its queue drained. A
+send that fails closes the session of that peer, the others go on.
+"""
+
+import logging
+from array import array
+
+from ryu.services.protocols.ldp import bulk
+from ryu.services.protocols.ldp import ldp_util
+from ryu.services.protocols.ldp.bulk import ADDRESS_FAMILY_IPV4
+from ryu.services.protocols.ldp.info_base import LabelInformationBase
+from ryu.services.protocols.ldp.info_base import fec_from_key
+
+from ryu.lib.packet import ldp
+
+LOG = logging.getLogger('ldp.distribution')
+
+DEFAULT_FLUSH_DELAY = 0.05
+DEFAULT_SYNC_CHUNK = 500
+# FEC elements of one Label Withdraw, 8 bytes each for a /32
+MAX_WITHDRAW_FECS = 400
+
+
+class _Sync(object):
+    __slots__ = ('fecs', 'offset')
+
+    def __init__(self, fecs):
+        self.fecs = fecs
+        self.offset = 0
+
+
+class DistributionEngine(object):
+    def __init__(self, app, flush_delay=DEFAULT_FLUSH_DELAY,
+                 sync_chunk_size=DEFAULT_SYNC_CHUNK):
+        self._app = app
+        self._io = app.io_backend
+        self.flush_delay = flush_delay
+        self.sync_chunk_size = sync_chunk_size
+        self._bindings = {}  # key encoded FEC, value local label
+        self.addresses = []
+        self._advertised = LabelInformationBase()
+        self._peers = {}  # key LSR-ID, operational peers
+        self._syncing = {}  # key LSR-ID, value _Sync
+        self._deferred = {}  # key LSR-ID, value FECs held back
+        self._dirty = set()
+        self._flush_timer = self._io.create_timer(self.flush)
+        self._flush_scheduled = False
+        self.mapping_count = 0
+        self.withdraw_count = 0
+
+    def __len__(self):
+        return len(self._bindings)
+
+    @property
+    def router_id(self):
+        return self._app.config.router_id
+
+    def bind(self, fec, label):
+        """Sets the local label of the encoded FEC."""
+        if self._bindings.get(fec) == label:
+            return
+        self._bindings[fec] = label
+        self._mark_dirty(fec)
+
+    def unbind(self, fec):
+        if self._bindings.pop(fec, None) is not None:
+            self._mark_dirty(fec)
+
+    def label(self, fec):
+        return self._bindings.get(fec)
+
+    def local_bindings(self):
+        """Returns a list of (fec, label) of the local table."""
+        return list(self._bindings.items())
+
+    def add_address(self, addr):
+        if addr in self.addresses:
+            return
+        self.addresses.append(addr)
+        for peer in self._peers.values():
+            self._send_addresses(peer, [addr])
+
+    def _mark_dirty(self, fec):
+        # without peers the next full sync sends the table as it is
+        if not self._peers:
+            return
+        self._dirty.add(fec)
+        if self._flush_scheduled:
+            return
+        self._flush_scheduled = True
+        self._flush_timer.start(self.flush_delay)
+
+    def flush(self):
+        """Sends the pending changes of the local FEC table."""
+        self._flush_scheduled = False
+        fecs = self._dirty
+        self._dirty = set()
+        if not fecs:
+            return
+        for lsr_id, peer in list(self._peers.items()):
+            if lsr_id in self._deferred or not peer.writable:
+                self._defer(peer, fecs)
+            else:
+                self._send(peer, fecs)
+
+    def _defer(self, peer, fecs):
+        lsr_id = peer.peer_router_id
+        deferred = self._deferred.get(lsr_id)
+        if deferred is not None:
+            deferred.update(fecs)
+            return
+        self._deferred[lsr_id] = set(fecs)
+        peer.call_when_writable(self._send_deferred, peer)
+
+    def _send_deferred(self, peer):
+        lsr_id = peer.peer_router_id
+        if self._peers.get(lsr_id) is not peer:
+            return
+        if not peer.writable:
+            peer.call_when_writable(self._send_deferred, peer)
+            return
+        self._send(peer, self._deferred.pop(lsr_id, ()))
+
+    def peer_up(self, peer):
+        """Starts the full sync of a peer that became operational."""
+        lsr_id = peer.peer_router_id
+        if lsr_id in self._peers:
+            return
+        self._peers[lsr_id] = peer
+        if self.addresses:
+            self._send_addresses(peer, self.addresses)
+        # FECs changed while syncing are sent by flush, every chunk is
+        # compared with the table as it is then.
+        sync = _Sync(list(self._bindings.keys()))
+        self._syncing[lsr_id] = sync
+        self._io.spawn(self._sync, peer, sync)
+
+    def peer_down(self, lsr_id):
+        self._peers.pop(lsr_id, None)
+        # a pending turn of the sync finds it gone
+        self._syncing.pop(lsr_id, None)
+        self._deferred.pop(lsr_id, None)
+        self._advertised.purge_peer(lsr_id)
+
+    def advertised(self, lsr_id):
+        """Yields (prefix, prefix_len, label) advertised to the peer."""
+        return self._advertised.bindings(lsr_id)
+
+    def _sync(self, peer, sync):
+        # sends one chunk and schedules the next turn
+        lsr_id = peer.peer_router_id
+        if self._syncing.get(lsr_id) is not sync:
+            return
+        if not peer.writable:
+            peer.call_when_writable(self._sync, peer, sync)
+            return
+        start = sync.offset
+        sync.offset += self.sync_chunk_size
+        if not self._send(peer, sync.fecs[start:sync.offset]):
+            return
+        if sync.offset < len(sync.fecs):
+            self._io.spawn(self._sync, peer, sync)
+            return
+        LOG.info('%s: synced %d FECs', peer.name, len(sync.fecs))
+        del self._syncing[lsr_id]
+
+    def _send(self, peer, fecs):
+        # What the peer was told is unknown after a failed send, so its
+        # session is closed and the next one starts with a full sync.
+        # The other peers are not held up by it.
+        try:
+            self._send_delta(peer, fecs)
+        except Exception:
+            LOG.exception('%s: sending label bindings failed', peer.name)
+            self.peer_down(peer.peer_router_id)
+            peer.stop()
+            return False
+        return True
+
+    def _send_delta(self, peer, fecs):
+        lsr_id = peer.peer_router_id
+        advertised = self._advertised
+        prefixes = array('I')
+        prefix_lens = array('B')
+        labels = array('I')
+        withdraws = []
+        for fec in fecs:
+            label = self._bindings.get(fec)
+            if label == advertised.lookup_key(lsr_id, fec):
+                continue
+            if label is None:
+                advertised.withdraw_key(lsr_id, fec)
+                withdraws.append(fec)
+                continue
+            advertised.add_key(lsr_id, fec, label)
+            # see fec_key()
+            prefixes.append(fec >> 6)
+            prefix_lens.append(fec & 0x3f)
+            labels.append(label)
+        if labels:
+            buf, ends = bulk.encode_label_mappings(
+                prefixes, prefix_lens, labels,
+                peer.next_msg_ids(len(labels)))
+            peer.send_bulk(buf, ends)
+            self.mapping_count += len(labels)
+        for start in range(0, len(withdraws), MAX_WITHDRAW_FECS):
+            peer.send_msg(self._withdraw_msg(
+                withdraws[start:start + MAX_WITHDRAW_FECS]))
+        self.withdraw_count += len(withdraws)
+        if withdraws:
+            peer.flush()
+
+    @staticmethod
+    def _fec_tlv(fecs):
+        elements = []
+        for fec in fecs:
+            prefix, prefix_len = fec_from_key(fec)
+            elements.append(ldp.PrefixFecElement(
+                address_type=ADDRESS_FAMILY_IPV4, element_len=prefix_len,
+                prefix=prefix))
+        return ldp.Fec(fec_elements=elements)
+
+    def _withdraw_msg(self, fecs):
+        # without a label TLV all labels of the FECs are withdrawn
+        return ldp.LDPLabelWithdraw(router_id=self.router_id, msg_id=0,
+                                    tlvs=[self._fec_tlv(fecs)])
+
+    @staticmethod
+    def _send_addresses(peer, addrs):
+        addrs = array('I', [ldp_util.from_inet_ptoi(a) for a in addrs])
+        count = (len(addrs) + bulk.MAX_ADDRESSES - 1) // bulk.MAX_ADDRESSES
+        buf, ends = bulk.encode_addresses(addrs, peer.next_msg_ids(count))
+        peer.send_bulk(buf, ends)
+
+    def stats(self):
+        return {'bindings': len(self._bindings),
+                'peers': len(self._peers),
+                'syncing': len(self._syncing),
+                'pending': len(self._dirty),
+                'mappings_sent': self.mapping_count,
+                'withdraws_sent': self.withdraw_count}
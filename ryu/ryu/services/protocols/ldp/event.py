@@ -28,7 +28,10 @@ LDP_MANAGER_NAME = 'LDPManager'
 class LDPConfig(object):
     def __init__(self, router_id='0.0.0.0', label_space_id=0,
         ldp_port=646, hold_time=15, keep_alive=180,
-        start_delay=0):
+        start_delay=0, max_pdu_len=0, pdu_coalesce_delay=0.01,
+        send_high_watermark=1024 * 1024, send_low_watermark=256 * 1024,
+        msg_budget=100, decode_processes=0,
+        decode_offload_min_bytes=32 * 1024, shard_workers=0):
         assert router_id is not None
         super(LDPConfig, self).__init__()
         self.router_id = router_id
@@ -37,6 +40,21 @@ class LDPConfig(object):
         self.keep_alive = keep_alive
         self.ldp_port = ldp_port
         self.start_delay = start_delay
+        self.max_pdu_len = max_pdu_len
+        # seconds queued messages may wait to share a PDU
+        self.pdu_coalesce_delay = pdu_coalesce_delay
+        # bytes queued to a peer at which bulk senders pause and resume
+        self.send_high_watermark = send_high_watermark
+        self.send_low_watermark = send_low_watermark
+        # messages of one peer processed before other peers run
+        self.msg_budget = msg_budget
+        # worker processes decoding large receives, 0 decodes inline
+        self.decode_processes = decode_processes
+        # bytes of complete PDUs in one receive from which they are
+        # decoded by a worker, at most the receive buffer size
+        self.decode_offload_min_bytes = decode_offload_min_bytes
+        # worker processes running the sessions, 0 runs them here
+        self.shard_workers = shard_workers
 
     def __eq__(self, other):
         return (self.router_id == other.router_id and
@@ -44,7 +62,16 @@ class LDPConfig(object):
                 self.hold_time == other.hold_time and
                 self.keep_alive == other.keep_alive and
                 self.ldp_port == other.ldp_port and
-                self.start_delay == other.start_delay)
+                self.start_delay == other.start_delay and
+                self.max_pdu_len == other.max_pdu_len and
+                self.pdu_coalesce_delay == other.pdu_coalesce_delay and
+                self.send_high_watermark == other.send_high_watermark and
+                self.send_low_watermark == other.send_low_watermark and
+                self.msg_budget == other.msg_budget and
+                self.decode_processes == other.decode_processes and
+                self.decode_offload_min_bytes ==
+                other.decode_offload_min_bytes and
+                self.shard_workers == other.shard_workers)
 
     def __hash__(self):
         hash((self.router_id, self.label_space_id,
@@ -99,20 +126,23 @@ class EventLDPStateChanged(event.EventBase):
         self.old_state = old_state
         self.new_state = new_state
 
-class EventLDPMessageReceived(event.EventBase):
+class EventLDPMessageBatch(event.EventBase):
     """
-    Event LDP Message Received
+    Event LDP Messages Received, the messages of the subscribed types
+    which were received from a peer at once.
     """
-    def __init__(self, instance_name, msg):
-        super(EventLDPMessageReceived, self).__init__()
+    def __init__(self, instance_name, peer, msgs):
+        super(EventLDPMessageBatch, self).__init__()
         self.instance_name = instance_name
-        self.msg = msg
+        self.peer = peer
+        self.msgs = msgs
 
 class EventHelloReceived(event.EventBase):
-    def __init__(self, router_id, packet):
+    def __init__(self, interface, packet, hello):
         super(EventHelloReceived, self).__init__()
-        self.router_id = router_id
+        self.interface = interface
         self.packet = packet
+        self.hello = hello
 
 class EventLDPSendMessage(event.EventBase):
     def __init__(self, peer_lsr_id, msg):
@@ -0,0 +1,304 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Longest prefix match index of IPv4 prefix FECs.
+
+A path compressed binary (Patricia) trie. Nodes are indexes into flat
+arrays, so a node costs about 21 bytes and a lookup walks at most one
+node per distinct prefix length on the path.
+"""
+
+import socket
+import struct
+from array import array
+
+_NONE = -1
+_NO_VALUE = object()
+
+
+def _addr_to_int(addr):
+    return struct.unpack('!I', socket.inet_aton(addr))[0]
+
+
+def _int_to_addr(value):
+    return socket.inet_ntoa(struct.pack('!I', value))
+
+
+def _mask(prefix_len):
+    return (0xffffffff << (32 - prefix_len)) & 0xffffffff
+
+
+def _common_len(a, b, limit):
+    diff = a ^ b
+    common = 32 - diff.bit_length() if diff else 32
+    return min(common, limit)
+
+
+class FecIndex(object):
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._prefix = array('I')
+        self._len = array('B')
+        self._left = array('i')
+        self._right = array('i')
+        self._value = []
+        self._free = []
+        self._root = _NONE
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def _new_node(self, prefix, prefix_len, value):
+        if self._free:
+            node = self._free.pop()
+            self._prefix[node] = prefix
+            self._len[node] = prefix_len
+            self._left[node] = _NONE
+            self._right[node] = _NONE
+            self._value[node] = value
+        else:
+            node = len(self._value)
+            self._prefix.append(prefix)
+            self._len.append(prefix_len)
+            self._left.append(_NONE)
+            self._right.append(_NONE)
+            self._value.append(value)
+        return node
+
+    def _free_node(self, node):
+        self._value[node] = _NO_VALUE
+        self._free.append(node)
+
+    def _child(self, node, bit):
+        return self._right[node] if bit else self._left[node]
+
+    def _set_child(self, node, bit, child):
+        if bit:
+            self._right[node] = child
+        else:
+            self._left[node] = child
+
+    def _replace_link(self, parent, bit, child):
+        if parent == _NONE:
+            self._root = child
+        else:
+            self._set_child(parent, bit, child)
+
+    def insert(self, prefix, prefix_len, value=True):
+        """Adds or replaces the value of the FEC prefix/prefix_len."""
+        return self.insert_int(_addr_to_int(prefix), prefix_len, value)
+
+    def insert_int(self, prefix, prefix_len, value=True):
+        prefix &= _mask(prefix_len)
+        parent = _NONE
+        parent_bit = 0
+        node = self._root
+        while node != _NONE:
+            node_len = self._len[node]
+            common = _common_len(prefix, self._prefix[node],
+                                 min(prefix_len, node_len))
+            if common < node_len:
+                break
+            if node_len == prefix_len:
+                added = self._value[node] is _NO_VALUE
+                self._value[node] = value
+                self._count += added
+                return added
+            parent = node
+            parent_bit = (prefix >> (31 - node_len)) & 1
+            node = self._child(node, parent_bit)
+
+        new = self._new_node(prefix, prefix_len, value)
+        self._count += 1
+        if node == _NONE:
+            self._replace_link(parent, parent_bit, new)
+            return True
+        node_prefix = self._prefix[node]
+        if common == prefix_len:
+            # new one is an ancestor of node
+            self._set_child(new, (node_prefix >> (31 - prefix_len)) & 1,
+                            node)
+            self._replace_link(parent, parent_bit, new)
+        else:
+            glue = self._new_node(prefix & _mask(common), common,
+                                  _NO_VALUE)
+            bit = (prefix >> (31 - common)) & 1
+            self._set_child(glue, bit, new)
+            self._set_child(glue, bit ^ 1, node)
+            self._replace_link(parent, parent_bit, glue)
+        return True
+
+    def delete(self, prefix, prefix_len):
+        """Removes the FEC, returns its value or None."""
+        return self.delete_int(_addr_to_int(prefix), prefix_len)
+
+    def delete_int(self, prefix, prefix_len):
+        prefix &= _mask(prefix_len)
+        path = []  # (node, bit taken from node)
+        node = self._root
+        while node != _NONE:
+            node_len = self._len[node]
+            if node_len > prefix_len or \
+                    self._prefix[node] != prefix & _mask(node_len):
+                return None
+            if node_len == prefix_len:
+                break
+            bit = (prefix >> (31 - node_len)) & 1
+            path.append((node, bit))
+            node = self._child(node, bit)
+        if node == _NONE or self._value[node] is _NO_VALUE:
+            return None
+        value = self._value[node]
+        self._value[node] = _NO_VALUE
+        self._count -= 1
+        self._compact(node, path)
+        return value
+
+    def _compact(self, node, path):
+        # drop valueless nodes with less than two children
+        while node != _NONE and self._value[node] is _NO_VALUE:
+            left = self._left[node]
+            right = self._right[node]
+            if left != _NONE and right != _NONE:
+                return
+            child = left if left != _NONE else right
+            if path:
+                parent, bit = path.pop()
+            else:
+                parent, bit = _NONE, 0
+            self._replace_link(parent, bit, child)
+            self._free_node(node)
+            if child != _NONE:
+                return
+            node = parent
+
+    def add_ref(self, prefix, prefix_len):
+        """Counts one more binding of the FEC, adding the FEC with a
+        count of 1 if it is not in the index. Returns the count.
+        """
+        return self.add_ref_int(_addr_to_int(prefix), prefix_len)
+
+    def add_ref_int(self, prefix, prefix_len):
+        prefix &= _mask(prefix_len)
+        node = self._exact_node(prefix, prefix_len)
+        if node == _NONE or self._value[node] is _NO_VALUE:
+            self.insert_int(prefix, prefix_len, 1)
+            return 1
+        self._value[node] += 1
+        return self._value[node]
+
+    def release(self, prefix, prefix_len):
+        """Counts one binding of the FEC less and removes the FEC when
+        none is left. Returns the remaining count.
+        """
+        return self.release_int(_addr_to_int(prefix), prefix_len)
+
+    def release_int(self, prefix, prefix_len):
+        prefix &= _mask(prefix_len)
+        node = self._exact_node(prefix, prefix_len)
+        if node == _NONE or self._value[node] is _NO_VALUE:
+            return 0
+        count = self._value[node] - 1
+        if count > 0:
+            self._value[node] = count
+        else:
+            self.delete_int(prefix, prefix_len)
+        return count
+
+    def _exact_node(self, prefix, prefix_len):
+        node = self._root
+        while node != _NONE:
+            node_len = self._len[node]
+            if node_len > prefix_len or \
+                    self._prefix[node] != prefix & _mask(node_len):
+                return _NONE
+            if node_len == prefix_len:
+                return node
+            node = self._child(node, (prefix >> (31 - node_len)) & 1)
+        return _NONE
+
+    def lookup(self, addr):
+        """Returns (prefix, prefix_len, value) of the longest prefix
+        containing addr, or None.
+        """
+        node = self._lookup_node(_addr_to_int(addr), 32)
+        if node == _NONE:
+            return None
+        return (_int_to_addr(self._prefix[node]), self._len[node],
+                self._value[node])
+
+    def lookup_int(self, addr, max_len=32):
+        """Returns (prefix, prefix_len, value) with integer prefix."""
+        node = self._lookup_node(addr, max_len)
+        if node == _NONE:
+            return None
+        return self._prefix[node], self._len[node], self._value[node]
+
+    def _lookup_node(self, addr, max_len):
+        prefixes = self._prefix
+        lens = self._len
+        values = self._value
+        left = self._left
+        right = self._right
+        best = _NONE
+        node = self._root
+        while node != _NONE:
+            node_len = lens[node]
+            if node_len > max_len:
+                break
+            if (addr ^ prefixes[node]) >> (32 - node_len):
+                break
+            if values[node] is not _NO_VALUE:
+                best = node
+            if node_len == 32:
+                break
+            if (addr >> (31 - node_len)) & 1:
+                node = right[node]
+            else:
+                node = left[node]
+        return best
+
+    def get(self, prefix, prefix_len):
+        """Returns the value of the exact FEC or None."""
+        prefix_int = _addr_to_int(prefix)
+        found = self.lookup_int(prefix_int, prefix_len)
+        if found is None or found[1] != prefix_len:
+            return None
+        return found[2]
+
+    def build(self, fecs):
+        """Replaces the contents with fecs, an iterable of
+        (prefix, prefix_len, value) with integer prefixes.
+        """
+        self.clear()
+        for prefix, prefix_len, value in sorted(fecs,
+                                                key=lambda f: f[:2]):
+            self.insert_int(prefix, prefix_len, value)
+
+    def items(self):
+        """Yields (prefix, prefix_len, value) in address order."""
+        stack = [self._root] if self._root != _NONE else []
+        while stack:
+            node = stack.pop()
+            if self._value[node] is not _NO_VALUE:
+                yield (_int_to_addr(self._prefix[node]), self._len[node],
+                       self._value[node])
+            for child in (self._right[node], self._left[node]):
+                if child != _NONE:
+                    stack.append(child)
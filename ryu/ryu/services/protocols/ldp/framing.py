@@ -0,0 +1,212 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+LDP PDU framing over a stream socket.
+
+The framer keeps received bytes in one growable bytearray and hands out
+memoryview slices of complete PDUs, so no bytes are copied between the
+socket and the message parser. On the send side PDUCoalescer chains
+queued messages behind a single PDU header.
+"""
+
+import socket
+import struct
+
+# PDU header: version, PDU length, LSR-ID, label space id (RFC 5036 3.1)
+LDP_PDU_HEADER_PACK_STR = '!HH4sH'
+LDP_PDU_HEADER_LEN = struct.calcsize(LDP_PDU_HEADER_PACK_STR)
+# version and PDU length fields are not counted in the PDU length
+LDP_PDU_LEN_OFFSET = 4
+LDP_MAX_PDU_LEN = 0xffff + LDP_PDU_LEN_OFFSET
+# Max PDU Length of 255 or less means the default (RFC 5036 3.5.3)
+LDP_DEFAULT_MAX_PDU_LEN = 4096
+LDP_VERSION = 1
+
+DEFAULT_RECV_BUFF_SIZE = 64 * 1024
+
+
+class FramingError(Exception):
+    """Raised when the stream does not carry a valid PDU header."""
+
+
+def parse_pdu_header(buff, offset=0):
+    """Returns (version, pdu_len, router_id, label_space_id) of the PDU
+    header at offset without copying buff.
+    """
+    return struct.unpack_from(LDP_PDU_HEADER_PACK_STR, buff, offset)
+
+
+def negotiate_max_pdu_len(local, remote):
+    """Returns the max PDU length to use from the proposed values."""
+    if local <= 255:
+        local = LDP_DEFAULT_MAX_PDU_LEN
+    if remote <= 255:
+        remote = LDP_DEFAULT_MAX_PDU_LEN
+    return min(local, remote)
+
+
+class PDUFramer(object):
+    """Splits a byte stream into LDP PDUs.
+
+    Data is read directly into the free tail of the buffer with
+    recv_into(). pdus() yields memoryview slices which are only valid
+    until the next call of recv_into() or feed().
+    """
+
+    def __init__(self, buff_size=DEFAULT_RECV_BUFF_SIZE):
+        self._buff = bytearray(buff_size)
+        self._view = memoryview(self._buff)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def capacity(self):
+        return len(self._buff)
+
+    def recv_into(self, sock):
+        """Reads as much as fits into the buffer from sock.
+        Returns the number of received bytes, 0 means the peer closed.
+        """
+        self._reserve(LDP_PDU_HEADER_LEN)
+        nbytes = sock.recv_into(self._view[self._end:])
+        self._end += nbytes
+        return nbytes
+
+    def feed(self, data):
+        """Appends data which has been received by other means."""
+        size = len(data)
+        self._reserve(size)
+        self._view[self._end:self._end + size] = data
+        self._end += size
+
+    def pdus(self):
+        """Yields each complete PDU as a memoryview."""
+        buff = self._buff
+        while self._end - self._start >= LDP_PDU_HEADER_LEN:
+            (pdu_len, ) = struct.unpack_from('!H', buff,
+                                             self._start + 2)
+            total_len = pdu_len + LDP_PDU_LEN_OFFSET
+            if total_len < LDP_PDU_HEADER_LEN:
+                raise FramingError('invalid PDU length %d' % pdu_len)
+            if self._end - self._start < total_len:
+                # Make sure the rest of this PDU fits into the buffer.
+                self._reserve(total_len - (self._end - self._start))
+                break
+            start = self._start
+            self._start += total_len
+            yield self._view[start:self._start]
+        if self._start == self._end:
+            self._start = self._end = 0
+
+    def complete_len(self):
+        """Returns the number of buffered bytes of complete PDUs."""
+        buff = self._buff
+        offset = self._start
+        while self._end - offset >= LDP_PDU_HEADER_LEN:
+            (pdu_len, ) = struct.unpack_from('!H', buff, offset + 2)
+            total_len = pdu_len + LDP_PDU_LEN_OFFSET
+            if total_len < LDP_PDU_HEADER_LEN or \
+                    self._end - offset < total_len:
+                break
+            offset += total_len
+        return offset - self._start
+
+    def pop_pdus(self):
+        """Removes the complete PDUs from the buffer and returns a copy
+        of them as one bytes object.
+        """
+        size = self.complete_len()
+        data = self._view[self._start:self._start + size].tobytes()
+        self._start += size
+        if self._start == self._end:
+            self._start = self._end = 0
+        return data
+
+    def _reserve(self, size):
+        if len(self._buff) - self._end >= size:
+            return
+        pending = self._end - self._start
+        if len(self._buff) - pending >= size and self._start > 0:
+            # Move pending bytes to the front. The buffer is not resized,
+            # so views handed out earlier do not block this.
+            self._buff[:pending] = self._buff[self._start:self._end]
+        else:
+            new_size = len(self._buff)
+            while new_size - pending < size:
+                new_size *= 2
+            buff = bytearray(new_size)
+            buff[:pending] = self._buff[self._start:self._end]
+            self._buff = buff
+            self._view = memoryview(buff)
+        self._start = 0
+        self._end = pending
+
+
+class PDUCoalescer(object):
+    """Packs serialized messages into as few PDUs as possible.
+
+    add() takes a message serialized without PDU header and returns
+    the PDUs which became complete because the message did not fit into
+    the pending one. flush() returns the pending PDU, if any.
+    Messages are copied into the PDU buffer as they are added and the
+    PDU length is patched into the header when it is flushed.
+    """
+
+    def __init__(self, router_id, label_space_id=0,
+                 max_pdu_len=LDP_DEFAULT_MAX_PDU_LEN):
+        self._header = struct.pack(LDP_PDU_HEADER_PACK_STR, LDP_VERSION, 0,
+                                   socket.inet_aton(router_id),
+                                   label_space_id)
+        self.max_pdu_len = max_pdu_len
+        self._buff = bytearray(self._header)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def header(self):
+        """The PDU header with the length field zero."""
+        return self._header
+
+    @property
+    def pending_bytes(self):
+        if not self._count:
+            return 0
+        return len(self._buff)
+
+    def add(self, data):
+        pdus = []
+        if self._count and len(self._buff) + len(data) > self.max_pdu_len:
+            pdus.append(self.flush())
+        self._buff += data
+        self._count += 1
+        if len(self._buff) >= self.max_pdu_len:
+            # A message longer than max_pdu_len is sent on its own.
+            pdus.append(self.flush())
+        return pdus
+
+    def flush(self):
+        if not self._count:
+            return None
+        pdu = self._buff
+        struct.pack_into('!H', pdu, 2, len(pdu) - LDP_PDU_LEN_OFFSET)
+        self._buff = bytearray(self._header)
+        self._count = 0
+        return pdu
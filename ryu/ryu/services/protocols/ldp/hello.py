@@ -0,0 +1,123 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Hello decoding with a cache of decoded hellos.
+
+A hello of a known adjacency only refreshes its hold timer, and
+hello_adjacency_id() finds the adjacency from the PDU header without
+decoding the message. The adjacency keeps the raw parameters of the
+hello it was set up from, a hello whose parameters differ is decoded
+like the hellos of new adjacencies. Since a neighbour sends the same
+hello bytes every time, decoded hellos are memoized by their raw bytes
+in a bounded LRU.
+"""
+
+import socket
+from collections import OrderedDict
+
+from ryu.services.protocols.ldp.framing import LDP_PDU_HEADER_LEN
+from ryu.services.protocols.ldp.framing import parse_pdu_header
+from ryu.services.protocols.ldp.message_view import LDP_MSG_HEADER_LEN
+from ryu.services.protocols.ldp.message_view import parse_pdu
+from ryu.services.protocols.ldp.message_view import \
+    TLV_COMMON_HELLO_PARAMETERS
+from ryu.services.protocols.ldp.message_view import \
+    TLV_IPV4_TRANSPORT_ADDRESS
+
+DEFAULT_HELLO_CACHE_SIZE = 1024
+# the TLVs of a hello follow the message type, length and id
+_HELLO_PARAMS_OFFSET = LDP_PDU_HEADER_LEN + LDP_MSG_HEADER_LEN
+
+
+class HelloInfo(object):
+    """The fields of a hello which discovery needs."""
+    __slots__ = ('lsr_id', 'label_space_id', 'hold_time', 't_bit',
+                 'trans_addr')
+
+    def __init__(self, lsr_id, label_space_id, hold_time, t_bit,
+                 trans_addr):
+        self.lsr_id = lsr_id
+        self.label_space_id = label_space_id
+        self.hold_time = hold_time
+        self.t_bit = t_bit
+        self.trans_addr = trans_addr
+
+    def __str__(self):
+        return '%s<%s:%s, hold_time=%s, trans_addr=%s>' % (
+            self.__class__.__name__, self.lsr_id, self.label_space_id,
+            self.hold_time, self.trans_addr)
+
+
+def hello_adjacency_id(packet):
+    """Returns (lsr_id, label_space_id) of a hello from its PDU header
+    only.
+    """
+    version, pdu_len, lsr_id, label_space_id = parse_pdu_header(packet)
+    return socket.inet_ntoa(lsr_id), label_space_id
+
+
+def hello_params(packet):
+    """Returns the raw TLVs of a hello, which hold its parameters. They
+    are the same in every hello of a neighbour until it changes them,
+    unlike the message id.
+    """
+    return bytes(packet[_HELLO_PARAMS_OFFSET:])
+
+
+def decode_hello(packet, src_addr=None):
+    """Decodes a hello PDU. Without a Transport Address TLV the source
+    address of the hello is the transport address (RFC 5036 2.5.2).
+    """
+    version, pdu_len, lsr_id, label_space_id = parse_pdu_header(packet)
+    msg = parse_pdu(packet)[0]
+    params = msg.tlv(TLV_COMMON_HELLO_PARAMETERS)
+    trans_addr = msg.tlv(TLV_IPV4_TRANSPORT_ADDRESS)
+    if trans_addr is not None:
+        trans_addr = trans_addr.addr
+    else:
+        trans_addr = src_addr
+    return HelloInfo(socket.inet_ntoa(lsr_id), label_space_id,
+                     params.hold_time, params.t_bit, trans_addr)
+
+
+class HelloCache(object):
+    """Bounded LRU of decoded hellos keyed by their raw bytes."""
+
+    def __init__(self, size=DEFAULT_HELLO_CACHE_SIZE):
+        self._size = size
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._cache)
+
+    def get(self, packet, src_addr=None):
+        """Returns the HelloInfo of packet, decoding it on a miss."""
+        hello = self._cache.pop(packet, None)
+        if hello is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            hello = decode_hello(packet, src_addr)
+            if len(self._cache) >= self._size:
+                self._cache.popitem(last=False)
+        self._cache[packet] = hello
+        return hello
+
+    def stats(self):
+        return {'size': len(self._cache), 'hits': self.hits,
+                'misses': self.misses}
@@ -0,0 +1,308 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Label Information Base.
+
+Bindings of FEC to (peer, label) are kept in one open addressing hash
+table built from flat arrays, without a Python object per binding.
+A FEC is encoded as an integer (prefix << 6 | prefix length) and a peer
+as a small index, so a binding costs one slot of
+
+  key (8 bytes) + label (4) + prev (4) + next (4) = 20 bytes.
+
+The table is grown to keep at most 70% of the slots in use, so steady
+state memory is 20 to 57 bytes per binding. 1M bindings fit in 2M slots,
+that is 40 MiB, and bench_info_base.py checks the table against a budget
+of 42 MiB for 1M bindings over 50 peers. Growing holds the old arrays
+until the new ones are filled, so the peak while growing to 2M slots is
+60 MiB of slots, checked against 62 MiB. A table created with the
+capacity for its bindings never grows.
+peak_memory_usage() reports the peak. prev and next chain the slots of
+each peer, which makes purging the bindings of a peer O(bindings of
+the peer).
+"""
+
+import socket
+import struct
+from array import array
+
+# 'L' is 8 bytes on LP64, python 3 also has 'Q'
+_KEY_TYPECODE = 'L' if array('L').itemsize >= 8 else 'Q'
+_EMPTY = 0
+_DELETED = (1 << 63) - 1
+_HASH_MUL = 0x9E3779B97F4A7C15
+_HASH_MASK = (1 << 64) - 1
+_MAX_LOAD = 0.7
+_MIN_CAPACITY = 1024
+_PEER_BITS = 16
+_NONE = -1
+
+
+def fec_key(prefix, prefix_len):
+    """Encodes an IPv4 prefix FEC to an integer."""
+    (addr, ) = struct.unpack('!I', socket.inet_aton(prefix))
+    return (addr << 6) | prefix_len
+
+
+def fec_from_key(key):
+    """Returns (prefix, prefix_len) of an encoded FEC."""
+    return (socket.inet_ntoa(struct.pack('!I', key >> 6)), key & 0x3f)
+
+
+class LabelInformationBase(object):
+    def __init__(self, capacity=_MIN_CAPACITY):
+        self._peer_index = {}  # key LSR-ID
+        self._peer_ids = []
+        self._peer_heads = array('i')
+        self._peer_counts = array('i')
+        self._free_peer_indexes = []
+        self._count = 0
+        self._peak_memory = 0
+        self._alloc(capacity)
+
+    def __len__(self):
+        return self._count
+
+    def _alloc(self, capacity):
+        size = _MIN_CAPACITY
+        while size < capacity:
+            size <<= 1
+        self._capacity = size
+        self._mask = size - 1
+        self._shift = 64 - size.bit_length() + 1
+        self._used = 0
+        self._keys = array(_KEY_TYPECODE, [_EMPTY]) * size
+        self._labels = array('I', [0]) * size
+        self._prev = array('i', [_NONE]) * size
+        self._next = array('i', [_NONE]) * size
+
+    def memory_usage(self):
+        """Bytes held by the binding arrays."""
+        return sum(a.itemsize * len(a) for a in
+                   (self._keys, self._labels, self._prev, self._next,
+                    self._peer_heads, self._peer_counts))
+
+    def peak_memory_usage(self):
+        """Most bytes held by the binding arrays at any time, which is
+        while the table grows.
+        """
+        return max(self._peak_memory, self.memory_usage())
+
+    def peers(self):
+        return [lsr_id for lsr_id in self._peer_ids if lsr_id is not None]
+
+    def peer_count(self, lsr_id):
+        index = self._peer_index.get(lsr_id)
+        if index is None:
+            return 0
+        return self._peer_counts[index]
+
+    def _peer(self, lsr_id, create=False):
+        index = self._peer_index.get(lsr_id)
+        if index is None and create:
+            if self._free_peer_indexes:
+                index = self._free_peer_indexes.pop()
+                self._peer_ids[index] = lsr_id
+            else:
+                index = len(self._peer_ids)
+                if index >= 1 << _PEER_BITS:
+                    raise ValueError('too many peers')
+                self._peer_ids.append(lsr_id)
+                self._peer_heads.append(_NONE)
+                self._peer_counts.append(0)
+            self._peer_index[lsr_id] = index
+        return index
+
+    def _slot(self, key):
+        return ((key * _HASH_MUL) & _HASH_MASK) >> self._shift
+
+    def _find(self, key):
+        keys = self._keys
+        mask = self._mask
+        slot = self._slot(key)
+        while True:
+            k = keys[slot]
+            if k == key:
+                return slot
+            if k == _EMPTY:
+                return _NONE
+            slot = (slot + 1) & mask
+
+    def add(self, lsr_id, prefix, prefix_len, label):
+        """Adds or replaces the binding of the FEC from the peer."""
+        return self.add_key(lsr_id, fec_key(prefix, prefix_len), label)
+
+    def add_key(self, lsr_id, fec, label):
+        peer = self._peer(lsr_id, create=True)
+        key = ((fec << _PEER_BITS) | peer) + 1
+        keys = self._keys
+        mask = self._mask
+        slot = self._slot(key)
+        free = _NONE
+        while True:
+            k = keys[slot]
+            if k == key:
+                self._labels[slot] = label
+                return False
+            if k == _EMPTY:
+                break
+            if k == _DELETED and free == _NONE:
+                free = slot
+            slot = (slot + 1) & mask
+        if free == _NONE:
+            free = slot
+            self._used += 1
+        keys[free] = key
+        self._labels[free] = label
+        self._link(peer, free)
+        self._count += 1
+        if self._used > self._capacity * _MAX_LOAD:
+            self._rehash()
+        return True
+
+    def lookup(self, lsr_id, prefix, prefix_len):
+        """Returns the label the peer bound to the FEC or None."""
+        return self.lookup_key(lsr_id, fec_key(prefix, prefix_len))
+
+    def lookup_key(self, lsr_id, fec):
+        peer = self._peer_index.get(lsr_id)
+        if peer is None:
+            return None
+        slot = self._find(((fec << _PEER_BITS) | peer) + 1)
+        if slot == _NONE:
+            return None
+        return self._labels[slot]
+
+    def lookup_fec(self, prefix, prefix_len):
+        """Returns [(lsr_id, label)] of all peers bound to the FEC."""
+        fec = fec_key(prefix, prefix_len)
+        bindings = []
+        for lsr_id, peer in self._peer_index.items():
+            slot = self._find(((fec << _PEER_BITS) | peer) + 1)
+            if slot != _NONE:
+                bindings.append((lsr_id, self._labels[slot]))
+        return bindings
+
+    def withdraw(self, lsr_id, prefix, prefix_len):
+        """Removes the binding, returns its label or None."""
+        return self.withdraw_key(lsr_id, fec_key(prefix, prefix_len))
+
+    def withdraw_key(self, lsr_id, fec):
+        peer = self._peer_index.get(lsr_id)
+        if peer is None:
+            return None
+        slot = self._find(((fec << _PEER_BITS) | peer) + 1)
+        if slot == _NONE:
+            return None
+        label = self._labels[slot]
+        self._unlink(peer, slot)
+        self._keys[slot] = _DELETED
+        self._count -= 1
+        return label
+
+    def purge_peer(self, lsr_id):
+        """Removes every binding of the peer, e.g. when its session went
+        down. Returns the number of removed bindings.
+        """
+        peer = self._peer_index.pop(lsr_id, None)
+        if peer is None:
+            return 0
+        keys = self._keys
+        nexts = self._next
+        slot = self._peer_heads[peer]
+        while slot != _NONE:
+            keys[slot] = _DELETED
+            slot = nexts[slot]
+        count = self._peer_counts[peer]
+        self._count -= count
+        self._peer_heads[peer] = _NONE
+        self._peer_counts[peer] = 0
+        self._peer_ids[peer] = None
+        self._free_peer_indexes.append(peer)
+        return count
+
+    def bindings(self, lsr_id):
+        """Yields (prefix, prefix_len, label) of the peer."""
+        for fec, label in self.binding_keys(lsr_id):
+            prefix, prefix_len = fec_from_key(fec)
+            yield prefix, prefix_len, label
+
+    def binding_keys(self, lsr_id):
+        """Yields (fec, label) of the peer with encoded FECs."""
+        peer = self._peer_index.get(lsr_id)
+        if peer is None:
+            return
+        slot = self._peer_heads[peer]
+        while slot != _NONE:
+            next_slot = self._next[slot]
+            yield (self._keys[slot] - 1) >> _PEER_BITS, self._labels[slot]
+            slot = next_slot
+
+    def _link(self, peer, slot):
+        head = self._peer_heads[peer]
+        self._prev[slot] = _NONE
+        self._next[slot] = head
+        if head != _NONE:
+            self._prev[head] = slot
+        self._peer_heads[peer] = slot
+        self._peer_counts[peer] += 1
+
+    def _unlink(self, peer, slot):
+        prev_slot = self._prev[slot]
+        next_slot = self._next[slot]
+        if prev_slot != _NONE:
+            self._next[prev_slot] = next_slot
+        else:
+            self._peer_heads[peer] = next_slot
+        if next_slot != _NONE:
+            self._prev[next_slot] = prev_slot
+        self._peer_counts[peer] -= 1
+
+    def _rehash(self):
+        capacity = self._capacity
+        if self._count > capacity * _MAX_LOAD / 2:
+            capacity <<= 1
+        keys, labels = self._keys, self._labels
+        prevs, nexts = self._prev, self._next
+        old_usage = sum(a.itemsize * len(a)
+                        for a in (keys, labels, prevs, nexts))
+        self._alloc(capacity)
+        self._peak_memory = max(self._peak_memory,
+                                old_usage + self.memory_usage())
+        new_keys, new_labels = self._keys, self._labels
+        heads = self._peer_heads
+        mask = self._mask
+        for peer in self._peer_index.values():
+            # from the tail back through the old prev links, so the per
+            # peer order is kept without copying the chain
+            tail = _NONE
+            old_slot = heads[peer]
+            while old_slot != _NONE:
+                tail = old_slot
+                old_slot = nexts[old_slot]
+            heads[peer] = _NONE
+            self._peer_counts[peer] = 0
+            old_slot = tail
+            while old_slot != _NONE:
+                key = keys[old_slot]
+                slot = self._slot(key)
+                while new_keys[slot] != _EMPTY:
+                    slot = (slot + 1) & mask
+                new_keys[slot] = key
+                new_labels[slot] = labels[old_slot]
+                self._link(peer, slot)
+                self._used += 1
+                old_slot = prevs[old_slot]
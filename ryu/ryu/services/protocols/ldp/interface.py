@@ -17,11 +17,16 @@ from ryu.lib.packet.ldp import LDPHello
 from ryu.lib.packet.ldp import CommonHelloParameter
 from ryu.lib.packet.ldp import IPv4TransportAddress
 from ryu.services.protocols.ldp.event import EventHelloReceived
-from ryu.services.protocols.ldp.ldp_util import EventletIOFactory
+from ryu.services.protocols.ldp.hello import hello_adjacency_id
+from ryu.services.protocols.ldp.hello import hello_params
+from ryu.services.protocols.ldp.template import get_template
 
 #TODO: separete common static value
 ALL_ROUTERS = '224.0.0.2'
 LDP_DISCOVERY_PORT = 646
+# Every hello carries this message id, so a neighbour receives the same
+# bytes each time and its hello cache hits.
+HELLO_MSG_ID = 0
 
 class LDPInterface(object):
 
@@ -30,8 +35,13 @@ class LDPInterface(object):
         self.app = app
         self.state = None
         self.config = config
-        self.hello_msg = self._generate_hello_msg(config)
-        self._hello_timer = EventletIOFactory.create_looping_call(self.send_hello)
+        self._hello = get_template(
+            ('hello', config.router_id, config.hold_time),
+            lambda: self._generate_hello_msg(config),
+            include_header=True).render(HELLO_MSG_ID)
+        # send_hello is looked up per call, so the profiler can wrap it
+        self._hello_timer = app.io_backend.create_looping_call(
+            lambda: self.send_hello())
 
     def _generate_hello_msg(self, config):
         router_id = config.router_id
@@ -47,10 +57,23 @@ class LDPInterface(object):
         self.discovery_server.start(self._recv_handler)
         self._hello_timer.start(self.config.hold_time/3)
 
+    def stop(self):
+        self._hello_timer.stop()
+        self.discovery_server.stop()
+
     def _recv_handler(self, packet, addr):
-        ev = EventHelloReceived(self, packet)
+        lsr_id, label_space_id = hello_adjacency_id(packet)
+        key = (self, lsr_id, label_space_id)
+        adj = self.app.adjacencies.get(key)
+        if adj is not None and adj.hello_params == hello_params(packet):
+            # known adjacency with unchanged parameters, neither decoded
+            # nor through the event queue
+            self.app.adjacencies.refresh(key)
+            return
+        hello = self.app.hello_cache.get(packet, addr[0])
+        ev = EventHelloReceived(self, packet, hello)
         self.app.send_event(self.app.name, ev)
 
     def send_hello(self):
-        self.discovery_server.sendto(self.hello_msg.serialize(),
-                (ALL_ROUTERS, LDP_DISCOVERY_PORT))
+        self.discovery_server.sendto(self._hello,
+                                     (ALL_ROUTERS, LDP_DISCOVERY_PORT))
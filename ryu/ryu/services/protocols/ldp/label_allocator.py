@@ -0,0 +1,162 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Local label space allocator.
+
+The 20 bit label space is one bitmap (128 KiB). Labels above the
+allocation cursor have never been handed out, freed labels are pushed
+on a free stack, so allocate() and free() are O(1) without a Python
+object per label.
+"""
+
+from array import array
+
+MPLS_LABEL_MAX = (1 << 20) - 1
+# 0-15 are reserved (RFC 3032 2.1)
+MPLS_RESERVED_LABELS = ((0, 15), )
+
+
+class LabelSpaceExhausted(Exception):
+    """No free label (block) is left."""
+
+
+class LabelAllocator(object):
+    def __init__(self, reserved=MPLS_RESERVED_LABELS,
+                 max_label=MPLS_LABEL_MAX):
+        self._max_label = max_label
+        self._bitmap = bytearray((max_label >> 3) + 1)
+        self._free_stack = array('I')
+        self._reserved = 0
+        self._allocated = 0
+        for first, last in reserved:
+            self._reserved += self._count_free(first, last - first + 1)
+            self._set_range(first, last - first + 1)
+        self._cursor = 0
+
+    def __len__(self):
+        return self._allocated
+
+    def __contains__(self, label):
+        return self._is_set(label)
+
+    def _is_set(self, label):
+        return self._bitmap[label >> 3] & (1 << (label & 7))
+
+    def _set(self, label):
+        self._bitmap[label >> 3] |= 1 << (label & 7)
+
+    def _clear(self, label):
+        self._bitmap[label >> 3] &= ~(1 << (label & 7)) & 0xff
+
+    def allocate(self):
+        """Returns a free label."""
+        stack = self._free_stack
+        while stack:
+            label = stack.pop()
+            # a block allocation may have taken it in the meantime
+            if not self._is_set(label):
+                self._set(label)
+                self._allocated += 1
+                return label
+        while self._cursor <= self._max_label:
+            label = self._cursor
+            self._cursor += 1
+            if not self._is_set(label):
+                self._set(label)
+                self._allocated += 1
+                return label
+        raise LabelSpaceExhausted()
+
+    def free(self, label):
+        if not 0 <= label <= self._max_label or not self._is_set(label):
+            raise ValueError('label %s is not allocated' % label)
+        self._clear(label)
+        self._allocated -= 1
+        if label < self._cursor:
+            self._free_stack.append(label)
+
+    def allocate_block(self, count):
+        """Returns the first label of count contiguous free labels."""
+        if count < 1:
+            raise ValueError('block of %s labels' % count)
+        first = self._find_run(count)
+        if first is None:
+            raise LabelSpaceExhausted()
+        self._set_range(first, count)
+        self._allocated += count
+        if first <= self._cursor < first + count:
+            self._cursor = first + count
+        return first
+
+    def free_block(self, first, count):
+        for label in range(first, first + count):
+            self.free(label)
+
+    def _find_run(self, count):
+        if self._cursor + count - 1 <= self._max_label and \
+                self._count_free(self._cursor, count) == count:
+            return self._cursor
+        # byte aligned search for a large enough free run
+        nbytes = (count + 7) >> 3
+        first_byte = self._bitmap.find(b'\x00' * nbytes)
+        if first_byte < 0:
+            return None
+        first = first_byte << 3
+        # extend backwards to use a partially free byte before the run
+        while first > 0 and not self._is_set(first - 1) and \
+                (first - 1) >> 3 == first_byte - 1:
+            first -= 1
+        if first + count - 1 > self._max_label:
+            return None
+        return first
+
+    def _count_free(self, first, count):
+        bitmap = self._bitmap
+        free = 0
+        label = first
+        last = first + count
+        while label < last:
+            if not label & 7 and label + 8 <= last and \
+                    not bitmap[label >> 3]:
+                free += 8
+                label += 8
+                continue
+            if not self._is_set(label):
+                free += 1
+            label += 1
+        return free
+
+    def _set_range(self, first, count):
+        bitmap = self._bitmap
+        last = first + count
+        label = first
+        while label < last and label & 7:
+            self._set(label)
+            label += 1
+        full = (last - label) >> 3
+        if full:
+            bitmap[label >> 3:(label >> 3) + full] = b'\xff' * full
+            label += full << 3
+        while label < last:
+            self._set(label)
+            label += 1
+
+    def stats(self):
+        total = self._max_label + 1 - self._reserved
+        return {'allocated': self._allocated,
+                'free': total - self._allocated,
+                'reserved': self._reserved,
+                'high_watermark': self._cursor}
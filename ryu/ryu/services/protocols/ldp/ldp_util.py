@@ -13,8 +13,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import heapq
+import itertools
+import math
 import socket
+import struct
 import logging
+import time
 from ryu.lib import hub
 
 LOG = logging.getLogger('ldp_util')
@@ -25,53 +30,166 @@ def from_inet_ptoi(bgp_id):
     four_byte_id = None
     try:
         packed_byte = socket.inet_pton(socket.AF_INET, bgp_id)
-        four_byte_id = long(packed_byte.encode('hex'), 16)
+        four_byte_id = struct.unpack('!I', packed_byte)[0]
     except ValueError:
         LOG.debug('Invalid bgp id given for conversion to integer value %s' %
                   bgp_id)
 
     return four_byte_id
 
+class WallClock(object):
+    """Real time, callbacks run in their own green thread."""
+    realtime = True
+
+    def time(self):
+        return time.time()
+
+    def call_later(self, delay, callback, *args):
+        """Calls callback(*args) after delay seconds. Returns a handle
+        with cancel(), which does not stop a callback already running.
+        """
+        return hub.spawn_after(delay, callback, *args)
+
+
+class _VirtualCall(object):
+    __slots__ = ('when', 'callback', 'args', 'clock')
+
+    def __init__(self, when, callback, args, clock):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.clock = clock
+
+    def cancel(self):
+        if self.clock is not None:
+            self.clock._pending -= 1
+            self.clock = None
+
+
+class VirtualClock(object):
+    """Virtual time which only moves by advance().
+
+    Callbacks run in the thread calling advance(), in the order of
+    their due time and, for the same due time, of call_later(). Runs
+    are deterministic and hours of timers take as long as their
+    callbacks.
+    """
+    realtime = False
+
+    def __init__(self, start=0.0):
+        self._now = start
+        self._heap = []
+        self._seq = itertools.count()
+        self._pending = 0
+        self.fired = 0
+
+    def __len__(self):
+        return self._pending
+
+    def time(self):
+        return self._now
+
+    def call_later(self, delay, callback, *args):
+        call = _VirtualCall(self._now + max(delay, 0), callback, args, self)
+        heapq.heappush(self._heap, (call.when, next(self._seq), call))
+        self._pending += 1
+        return call
+
+    def next_due(self):
+        """Returns the due time of the next callback, None if there is
+        none.
+        """
+        heap = self._heap
+        while heap and heap[0][2].clock is None:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def advance(self, seconds):
+        """Moves the time forward, running the callbacks due until
+        then. Returns the number of callbacks run.
+        """
+        return self.run_until(self._now + seconds)
+
+    def run_until(self, when):
+        fired = 0
+        heap = self._heap
+        while heap and heap[0][0] <= when:
+            call = heapq.heappop(heap)[2]
+            if call.clock is None:
+                continue
+            call.clock = None
+            self._pending -= 1
+            self._now = max(self._now, call.when)
+            fired += 1
+            try:
+                call.callback(*call.args)
+            except Exception:
+                LOG.exception('timer callback failed')
+        self._now = max(self._now, when)
+        self.fired += fired
+        return fired
+
+    def step(self):
+        """Moves the time to the next due callback and runs all due
+        then. Returns the number of callbacks run.
+        """
+        when = self.next_due()
+        if when is None:
+            return 0
+        return self.run_until(when)
+
+
+_clock = WallClock()
+
+
+def get_clock():
+    """Returns the clock of the LDP timers."""
+    return _clock
+
+
+def set_clock(clock=None):
+    """Sets the clock of the timers created from now on, e.g. a
+    VirtualClock for a test or a simulation, None for WallClock.
+    Timers created before keep their clock.
+    """
+    global _clock, _timer_wheel
+    _clock = clock if clock is not None else WallClock()
+    if _timer_wheel is not None:
+        _timer_wheel.stop()
+        _timer_wheel = None
+
+
 class Timer(object):
-    def __init__(self, handler_):
+    def __init__(self, handler_, clock=None):
         assert callable(handler_)
 
         super(Timer, self).__init__()
         self._handler = handler_
-        self._event = hub.Event()
-        self._thread = None
+        self._clock = clock if clock is not None else get_clock()
+        self._call = None
 
     def start(self, interval):
         """interval is in seconds"""
-        if self._thread:
+        if self._call:
             self.cancel()
-        self._event.clear()
-        self._thread = hub.spawn(self._timer, interval)
+        self._call = self._clock.call_later(interval, self._handler)
 
     def cancel(self):
-        if self._thread is None:
+        if self._call is None:
             return
-        self._event.set()
-        hub.joinall([self._thread])
-        self._thread = None
+        # a handler already running is not cancelled
+        self._call.cancel()
+        self._call = None
 
     def is_running(self):
-        return self._thread is not None
-
-    def _timer(self, interval):
-        # Avoid cancellation during execution of self._callable()
-        cancel = self._event.wait(interval)
-        if cancel:
-            return
-
-        self._handler()
+        return self._call is not None
 
 class TimerEventSender(Timer):
     # timeout handler is called by timer thread context.
     # So in order to actual execution context to application's event thread,
     # post the event to the application
-    def __init__(self, app, ev_cls):
-        super(TimerEventSender, self).__init__(self._timeout)
+    def __init__(self, app, ev_cls, clock=None):
+        super(TimerEventSender, self).__init__(self._timeout, clock)
         self._app = app
         self._ev_cls = ev_cls
 
@@ -88,7 +206,7 @@ class EventletIOFactory(object):
     @staticmethod
     def create_looping_call(funct, *args, **kwargs):
         LOG.debug('create_looping_call called')
-        return LoopingCall(funct, *args, **kwargs)
+        return WheelLoopingCall(funct, *args, **kwargs)
 
 
 # TODO: improve Timer service and move it into framework
@@ -96,6 +214,9 @@ class LoopingCall(object):
     """Call a function repeatedly.
     """
     def __init__(self, funct, *args, **kwargs):
+        self._clock = kwargs.pop('clock', None)
+        if self._clock is None:
+            self._clock = get_clock()
         self._funct = funct
         self._args = args
         self._kwargs = kwargs
@@ -114,7 +235,7 @@ class LoopingCall(object):
     def __call__(self):
         if self._running:
             # Schedule next iteration of the call.
-            self._self_thread = hub.spawn_after(self._interval, self)
+            self._self_thread = self._clock.call_later(self._interval, self)
         self._funct(*self._args, **self._kwargs)
 
     def start(self, interval, now=True):
@@ -129,9 +250,9 @@ class LoopingCall(object):
         self._running = True
         self._interval = interval
         if now:
-            self._self_thread = hub.spawn_after(0, self)
+            self._self_thread = self._clock.call_later(0, self)
         else:
-            self._self_thread = hub.spawn_after(self._interval, self)
+            self._self_thread = self._clock.call_later(self._interval, self)
 
     def stop(self):
         """Stop running scheduled function.
@@ -149,4 +270,244 @@ class LoopingCall(object):
             self._self_thread.cancel()
             self._self_thread = None
         # Schedule a new call
-        self._self_thread = hub.spawn_after(self._interval, self)
+        self._self_thread = self._clock.call_later(self._interval, self)
+
+
+DEFAULT_TIMER_TICK = 0.1
+DEFAULT_WHEEL_BITS = (8, 6, 6, 6)
+
+
+class _WheelEntry(object):
+    __slots__ = ('expires', 'callback', 'slot')
+
+    def __init__(self, expires, callback):
+        self.expires = expires
+        self.callback = callback
+        self.slot = None
+
+
+class TimerWheel(object):
+    """Hierarchical timing wheel.
+
+    Timers are kept in per-level slot sets, so schedule and cancel are
+    O(1) and all timers are fired from one thread which advances the
+    wheel every tick. Callbacks run in that thread and must not block.
+    On a VirtualClock the wheel advances in callbacks of the clock
+    instead.
+    """
+
+    def __init__(self, tick=DEFAULT_TIMER_TICK, bits=DEFAULT_WHEEL_BITS,
+                 clock=None):
+        self._clock = clock if clock is not None else get_clock()
+        self._tick = tick
+        self._bits = bits
+        self._shifts = []
+        shift = 0
+        for b in bits:
+            self._shifts.append(shift)
+            shift += b
+        self._max_ticks = (1 << shift) - 1
+        self._wheels = [[set() for _ in range(1 << b)] for b in bits]
+        self._base = self._clock.time()
+        self._current = 0
+        self._count = 0
+        self._wakeup = hub.Event()
+        self._thread = None
+        self._started = False
+        self._tick_call = None
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def tick(self):
+        return self._tick
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        if self._clock.realtime:
+            self._thread = hub.spawn(self._run)
+        elif self._count:
+            self._arm()
+
+    def stop(self):
+        self._started = False
+        if self._thread is not None:
+            hub.kill(self._thread)
+            self._thread = None
+        if self._tick_call is not None:
+            self._tick_call.cancel()
+            self._tick_call = None
+
+    def schedule(self, delay, callback):
+        """Calls callback after delay seconds. Returns a handle for
+        cancel().
+        """
+        ticks = int(math.ceil(delay / float(self._tick)))
+        now = self._now_tick()
+        if self._count == 0:
+            # nothing is scheduled, so the idle wheel can jump to now
+            self._current = max(self._current, now)
+        elif now > self._current:
+            # the wheel lags behind, count from the real time
+            ticks += now - self._current
+        entry = _WheelEntry(self._current + max(ticks, 1), callback)
+        self._insert(entry)
+        self._count += 1
+        if self._count == 1:
+            if self._clock.realtime:
+                self._wakeup.set()
+            elif self._started and self._tick_call is None:
+                self._arm()
+        return entry
+
+    def cancel(self, entry):
+        if entry.slot is None:
+            return
+        entry.slot.discard(entry)
+        entry.slot = None
+        self._count -= 1
+
+    def process(self, now=None):
+        """Advances the wheel up to now and fires expired timers."""
+        self._advance(self._now_tick(now))
+
+    def _advance(self, target):
+        while self._current < target:
+            self._current += 1
+            self._cascade()
+            slot = self._wheels[0][self._current & ((1 << self._bits[0]) - 1)]
+            while slot:
+                entry = slot.pop()
+                entry.slot = None
+                self._count -= 1
+                try:
+                    entry.callback()
+                except Exception:
+                    LOG.exception('timer callback failed')
+
+    def _now_tick(self, now=None):
+        if now is None:
+            now = self._clock.time()
+        return int((now - self._base) / self._tick)
+
+    def _insert(self, entry):
+        diff = min(entry.expires - self._current, self._max_ticks)
+        for level, bits in enumerate(self._bits):
+            shift = self._shifts[level]
+            if diff < (1 << (shift + bits)) or level == len(self._bits) - 1:
+                index = ((self._current + diff) >> shift) & ((1 << bits) - 1)
+                slot = self._wheels[level][index]
+                break
+        slot.add(entry)
+        entry.slot = slot
+
+    def _cascade(self):
+        for level in range(1, len(self._bits)):
+            shift = self._shifts[level]
+            if self._current & ((1 << shift) - 1):
+                return
+            index = (self._current >> shift) & ((1 << self._bits[level]) - 1)
+            slot = self._wheels[level][index]
+            entries = list(slot)
+            slot.clear()
+            for entry in entries:
+                self._insert(entry)
+
+    def _run(self):
+        while True:
+            if self._count == 0:
+                self._wakeup.clear()
+                self._wakeup.wait()
+            self.process()
+            hub.sleep(self._tick)
+
+    def _arm(self):
+        self._tick_call = self._clock.call_later(self._tick, self._on_tick)
+
+    def _on_tick(self):
+        # one tick per call, the virtual time is a float multiple of it
+        self._tick_call = None
+        self._advance(max(self._current + 1, self._now_tick()))
+        if self._count and self._started and self._tick_call is None:
+            self._arm()
+
+
+_timer_wheel = None
+
+
+def get_timer_wheel():
+    """Returns the timer wheel shared by all LDP timers, on the clock
+    of get_clock().
+    """
+    global _timer_wheel
+    if _timer_wheel is None:
+        _timer_wheel = TimerWheel(clock=get_clock())
+        _timer_wheel.start()
+    return _timer_wheel
+
+
+class WheelLoopingCall(object):
+    """LoopingCall driven by the shared TimerWheel instead of a greenlet
+    per iteration.
+    """
+    def __init__(self, funct, *args, **kwargs):
+        self._wheel = kwargs.pop('timer_wheel', None)
+        if self._wheel is None:
+            self._wheel = get_timer_wheel()
+        self._funct = funct
+        self._args = args
+        self._kwargs = kwargs
+        self._running = False
+        self._interval = 0
+        self._entry = None
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def interval(self):
+        return self._interval
+
+    def __call__(self):
+        self._entry = None
+        if self._running:
+            # Schedule next iteration of the call.
+            self._entry = self._wheel.schedule(self._interval, self)
+        self._funct(*self._args, **self._kwargs)
+
+    def start(self, interval, now=True):
+        """Start running pre-set function every interval seconds.
+        """
+        if interval < 0:
+            raise ValueError('interval must be >= 0')
+
+        if self._running:
+            self.stop()
+
+        self._running = True
+        self._interval = interval
+        if now:
+            self._entry = self._wheel.schedule(0, self)
+        else:
+            self._entry = self._wheel.schedule(self._interval, self)
+
+    def stop(self):
+        """Stop running scheduled function.
+        """
+        self._running = False
+        self._cancel()
+
+    def reset(self):
+        """Skip the next iteration and reset timer.
+        """
+        self._cancel()
+        self._entry = self._wheel.schedule(self._interval, self)
+
+    def _cancel(self):
+        if self._entry is not None:
+            self._wheel.cancel(self._entry)
+            self._entry = None
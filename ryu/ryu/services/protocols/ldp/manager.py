@@ -13,23 +13,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import socket
-import netaddr
+import logging
 
-from eventlet import semaphore
 from ryu.lib import hub
-from ryu.lib.hub import Timeout
 from ryu.base import app_manager
 from ryu.controller import handler
 from ryu.services.protocols.ldp import event as ldp_event
-from ryu.services.protocols.ldp.interface import LDPInterface 
-from ryu.services.protocols.ldp import ldp_util
-from ryu.services.protocols.ldp.peer import Peer
+from ryu.services.protocols.ldp.decode_pool import DecodePool
+from ryu.services.protocols.ldp.shard import ShardManager
+from ryu.services.protocols.ldp.speaker import LDPSpeaker
+from ryu.services.protocols.ldp.stats import LDPStatistics  # noqa
 
-from ryu.lib.packet import ldp
-from ryu.lib.packet.ldp import LDPMessage
+LOG = logging.getLogger('ldp.manager')
+
+class LDPManager(app_manager.RyuApp, LDPSpeaker):
+    """LDPSpeaker as the Ryu application on eventlet."""
 
-class LDPManager(app_manager.RyuApp):
     @staticmethod
     def _instance_name(router_id, label_space_id):
         return 'lsr-%s:%s' % (router_id, label_space_id)
@@ -40,68 +39,135 @@ class LDPManager(app_manager.RyuApp):
         self._kwargs = kwargs
         self.name = ldp_event.LDP_MANAGER_NAME
         self.shutdown = hub.Queue()
-        self.interfaces = {}
-        self.peers = {} #key peer router_id 
-        self.config = None
+        self.shards = None
         self.register_observer(ldp_event.EventLDPStateChanged,
                                self.name)
-        self.register_observer(ldp_event.EventLDPMessageReceived,
-                               self.name)
         #self.session_thread = hub.spawn(self._session_thread)
 
     def start(self):
         t = hub.spawn(self._shutdown_loop)
         super(LDPManager, self).start()
+        # RyuApp.start() does not chain
+        LDPSpeaker.start(self)
         return t
 
     @handler.set_ev_cls(ldp_event.EventLDPConfigRequest)
     def config_request_handler(self, ev):
         self.config = ev.config
+        if self.config.decode_processes and self.decode_pool is None:
+            self.decode_pool = DecodePool(
+                self.config.decode_processes,
+                self.config.decode_offload_min_bytes)
+            self.decode_pool.start()
+        if self.config.shard_workers and self.shards is None:
+            if ShardManager.is_supported():
+                self.shards = ShardManager(self.config,
+                                           self.config.shard_workers, self)
+                self.shards.start(
+                    self.distribution.local_bindings(),
+                    self.distribution.addresses,
+                    self.dispatcher.subscriptions().items())
+            else:
+                LOG.warning('sharding is not supported, sessions run '
+                            'in this process')
         iface_conf = ev.interface
-        interface = self._new_interface(iface_conf, self.config)
-        self.interfaces[iface_conf.device_name] = interface
-        #TODO: delay timer
-        interface.start()
+        interface = self.add_interface(iface_conf)
+        if self.shards is not None:
+            self.shards.add_address(iface_conf.ip_address)
         rep = ldp_event.EventLDPConfigReply(self._instance_name(self.config.router_id, self.config.label_space_id),
             interface, self.config)
         self.reply_to_request(ev, rep)
 
     @handler.set_ev_cls(ldp_event.EventHelloReceived)
     def hello_received(self, ev):
-        router_id = ev.router_id
-        packet = ev.packet
-        peer = self.peers.get(router_id, None)
-        if peer is not None:
-            peer.reset_hold_timer()
-        else:
-            msg, rest = LDPMessage.parser(packet)
-            peer_router_id = msg.header.router_id
-            trans_addr = LDPMessage.retrive_tlv(ldp.LDP_TLV_IPV4_TRANSPORT_ADDRESS, msg)
-            peer = Peer(self, peer_router_id, trans_addr, self.config)
-            self.peers[router_id] = peer
-            is_active = ldp_util.from_inet_ptoi(peer_router_id) < \
-                ldp_util.from_inet_ptoi(self.config.router_id)
-            hub.spawn(self._session_thread, is_active, peer)
+        super(LDPManager, self).hello_received(ev)
+
+    def _add_peer(self, lsr_id, trans_addr, is_active):
+        if self.shards is None:
+            super(LDPManager, self)._add_peer(lsr_id, trans_addr, is_active)
+        elif not self.shards.has_peer(lsr_id):
+            self.shards.add_peer(lsr_id, trans_addr, is_active)
+            if not is_active:
+                self._acceptor.register(trans_addr,
+                                        self.shards.conn_handler(lsr_id))
+
+    def _remove_peer(self, lsr_id):
+        if self.shards is None:
+            super(LDPManager, self)._remove_peer(lsr_id)
+            return
+        trans_addr = self.shards.remove_peer(lsr_id)
+        if trans_addr is not None:
+            self._acceptor.unregister(trans_addr)
 
     @handler.set_ev_cls(ldp_event.EventLDPStateChanged)
     def ldp_state_change(self, ev):
-        print 'state_change:%s' % (ev.new_state)
+        LOG.debug('state_change:%s', ev.new_state)
+        # the events of the workers are handled by shard_state_changed()
+        if self.shards is None:
+            super(LDPManager, self).ldp_state_change(ev)
+
+    def subscribe_app(self, name, msg_types):
+        """Delivers EventLDPMessageBatch of msg_types to the app name,
+        also those received by the workers.
+        """
+        self.dispatcher.subscribe(name, msg_types)
+        if self.shards is not None:
+            self.shards.subscribe(name, msg_types)
+
+    def shard_state_changed(self, lsr_id, old_state, new_state, seconds):
+        if new_state == ldp_event.LDP_STATE_OPERATIONAL:
+            self.session_setup.record_setup(seconds)
+        elif new_state == ldp_event.LDP_STATE_NON_EXISTENT:
+            self._purge_peer(lsr_id)
+        peer = self.shards.peers.get(lsr_id)
+        if peer is not None:
+            self.send_event_to_observers(ldp_event.EventLDPStateChanged(
+                peer.name, peer, old_state, new_state))
+
+    def shard_messages(self, name, lsr_id, msgs):
+        peer = self.shards.peers.get(lsr_id)
+        if peer is not None:
+            self.send_event(name, ldp_event.EventLDPMessageBatch(
+                peer.name, peer, msgs))
+
+    def shard_bindings(self, lsr_id, prefixes, prefix_lens, labels):
+        self._add_bindings(lsr_id, prefixes, prefix_lens, labels)
+
+    def shard_withdraws(self, lsr_id, prefixes, prefix_lens):
+        self._withdraw_bindings(lsr_id, prefixes, prefix_lens)
+
+    def shard_purge(self, lsr_id):
+        self._purge_peer(lsr_id)
 
-    @handler.set_ev_cls(ldp_event.EventLDPMessageReceived)
-    def ldp_recv_msg(self, ev):
-        print 'receive:%s' % (ev.msg)
+    def _bind(self, fec, label):
+        super(LDPManager, self)._bind(fec, label)
+        if self.shards is not None:
+            self.shards.bind(fec, label)
+
+    def _unbind(self, fec):
+        super(LDPManager, self)._unbind(fec)
+        if self.shards is not None:
+            self.shards.unbind(fec)
+
+    def send_message(self, lsr_id, msg):
+        if self.shards is None:
+            super(LDPManager, self).send_message(lsr_id, msg)
+        else:
+            self.shards.send_message(lsr_id, msg)
 
     @handler.set_ev_cls(ldp_event.EventLDPSendMessage)
     def ldp_send_message(self, ev):
-        msg = ev.msg
-        router_id = ev.router_id
-        peer = self.peers[router_id]
-        peer.send_msg(msg.serialize())
+        self.send_message(ev.peer_lsr_id, ev.msg)
 
-    def _new_interface(self, iface_conf, conf):
-        server = DiscoverServer(iface_conf.ip_address)
-        interface = LDPInterface(self, server, conf)
-        return interface
+    def writer_stats(self):
+        if self.shards is None:
+            return super(LDPManager, self).writer_stats()
+        return self.shards.writer_stats()
+
+    def statistics_snapshot(self, lsr_id=None):
+        if self.shards is None:
+            return super(LDPManager, self).statistics_snapshot(lsr_id)
+        return self.shards.statistics().snapshot(lsr_id)
 
     def _shutdown_loop(self):
         app_mgr = app_manager.AppManager.get_instance()
@@ -111,83 +177,18 @@ class LDPManager(app_manager.RyuApp):
             app_mgr.uninstantiate(instance.monitor_name)
             del self._instances[instance.name]
 
-    def _session_thread(self, is_active, peer):
-        bind_addr = (self.config.router_id, LDP_DISCOVERY_PORT)
-        if is_active:
-            bind_addr = (self.config.router_id, 0)
-        sess = SessionServer(bind_addr)
-        sess.start(is_active, (peer.trans_addr.addr, LDP_DISCOVERY_PORT),
-                peer.conn_handle)
+    def decode_pool_stats(self):
+        if self.decode_pool is None:
+            return None
+        return self.decode_pool.stats()
+
+    def shard_stats(self):
+        if self.shards is None:
+            return None
+        return self.shards.stats()
 
     def start_discover(self):
         pass
 
     def start_listen(self):
         pass
-
-ALL_ROUTER = '224.0.0.2'
-LDP_DISCOVERY_PORT = 646
-DEFAULT_CONN_TIMEOUT = 30
-
-class SessionServer(object):
-
-    def __init__(self, bind_address):
-        sock = socket.socket(socket.AF_INET, 
-            socket.SOCK_STREAM)
-        if bind_address is not None:
-            sock.bind(bind_address)
-        self._socket = sock
-
-    def start(self, is_active, peer_addr, conn_handle):
-        if is_active:
-            with Timeout(DEFAULT_CONN_TIMEOUT, socket.error):
-                self._socket.connect(peer_addr)
-            hub.spawn(conn_handle, self._socket, True)
-        else:
-            self._socket.listen(50)
-            hub.spawn(self._listen_loop, conn_handle)
-
-    def _listen_loop(self, conn_handle):
-        while True:
-            sock, client_address = self._socket.accept()
-            hub.spawn(conn_handle, sock, False)
-
-class DiscoverServer(object):
-
-    def __init__(self, iface):
-        self.write_lock = semaphore.Semaphore()
-        sock = socket.socket(socket.AF_INET, 
-            socket.SOCK_DGRAM)
-        sock.setsockopt(socket.SOL_SOCKET,
-             socket.SO_REUSEADDR, 1)
-        sock.setsockopt(socket.SOL_IP,
-            socket.IP_MULTICAST_LOOP, 0)
-        if hasattr(socket, "SO_REUSEPORT"):
-            sock.setsockopt(socket.SOL_SOCKET,
-                socket.SO_REUSEPORT, 1)
-        sock.setsockopt(socket.IPPROTO_IP,
-            socket.IP_ADD_MEMBERSHIP,
-            socket.inet_aton(ALL_ROUTER) + socket.inet_aton(iface))
-        sock.setsockopt(socket.SOL_IP,
-             socket.IP_MULTICAST_IF,
-             socket.inet_aton(iface))
-        sock.bind((ALL_ROUTER, LDP_DISCOVERY_PORT))
-        self.socket = sock
-
-    def start(self, handler):
-        hub.spawn(self._recv_loop, handler)
-
-    def sendto(self, *args):
-        self.write_lock.acquire()
-        try:
-            self.socket.sendto(*args)
-        finally:
-            self.write_lock.release()
-
-    def _recv_loop(self, handler):
-        while True:
-            data, addr = self.socket.recvfrom(8192)
-            hub.spawn(handler, data, addr)
-
-class LDPStatistics(object):
-    """"""
@@ -0,0 +1,356 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Lazily decoded LDP messages.
+
+MessageView reads the message header and walks the TLVs once, recording
+the offset of each TLV type. A TLV is decoded when it is asked for, so
+reading one field costs one small object instead of a full message.
+The TLVs used by the service are decoded here into namedtuples with the
+field names of the ryu.lib.packet.ldp classes, any other TLV and the
+full message come from the ryu.lib.packet.ldp parser.
+
+parse_pdu() and parse_message() check the message and TLV lengths
+against the end of the PDU, and the FEC elements against their TLV,
+and raise BadMessageLength or BadTlvLength, so a malformed message
+fails while the PDU is parsed and not later in an application callback.
+"""
+
+import socket
+import struct
+from array import array
+from collections import namedtuple
+
+from ryu.lib.packet.ldp import LDPMessage
+from ryu.lib.packet.ldp import LdpExc
+from ryu.services.protocols.ldp.framing import LDP_PDU_HEADER_LEN
+
+# RFC 5036 3.4, 3.5
+LDP_MSG_HEADER_PACK_STR = '!HHI'
+LDP_MSG_HEADER_LEN = struct.calcsize(LDP_MSG_HEADER_PACK_STR)
+LDP_TLV_HEADER_PACK_STR = '!HH'
+LDP_TLV_HEADER_LEN = struct.calcsize(LDP_TLV_HEADER_PACK_STR)
+# length of the message header not counted by the message length
+LDP_MSG_LEN_OFFSET = 4
+# RFC 5036 3.9
+LDP_STATUS_BAD_MESSAGE_LENGTH = 0x05
+LDP_STATUS_BAD_TLV_LENGTH = 0x07
+
+TLV_FEC = 0x0100
+TLV_ADDRESS_LIST = 0x0101
+TLV_GENERIC_LABEL = 0x0200
+TLV_STATUS = 0x0300
+TLV_COMMON_HELLO_PARAMETERS = 0x0400
+TLV_IPV4_TRANSPORT_ADDRESS = 0x0401
+TLV_COMMON_SESSION_PARAMETERS = 0x0500
+
+FEC_WILDCARD = 1
+FEC_PREFIX = 2
+ADDRESS_FAMILY_IPV4 = 1
+
+# bytes read by the decoders below from the value of a TLV
+_MIN_TLV_LEN = {
+    TLV_FEC: 1,
+    TLV_ADDRESS_LIST: 2,
+    TLV_GENERIC_LABEL: 4,
+    TLV_STATUS: 10,
+    TLV_COMMON_HELLO_PARAMETERS: 4,
+    TLV_IPV4_TRANSPORT_ADDRESS: 4,
+    TLV_COMMON_SESSION_PARAMETERS: 14,
+}
+
+CommonHelloParameter = namedtuple('CommonHelloParameter',
+                                  'hold_time t_bit r_bit')
+IPv4TransportAddress = namedtuple('IPv4TransportAddress', 'addr')
+CommonSessionParameters = namedtuple(
+    'CommonSessionParameters',
+    'proto_ver keepalive_time a_bit d_bit pvlim max_pdu_len '
+    'receiver_lsr_id receiver_label_space_id')
+Fec = namedtuple('Fec', 'fec_elements')
+PrefixFecElement = namedtuple('PrefixFecElement',
+                              'address_type element_len prefix')
+WildcardFecElement = namedtuple('WildcardFecElement', '')
+GenericLabel = namedtuple('GenericLabel', 'label')
+AddressList = namedtuple('AddressList', 'address_family addresses')
+Status = namedtuple('Status',
+                    'u_bit f_bit status_code message_id message_type')
+
+
+class BadMessageLength(LdpExc):
+    """A message length does not fit its PDU."""
+    CODE = LDP_STATUS_BAD_MESSAGE_LENGTH
+    SUB_CODE = 0
+    SEND_ERROR = True
+
+
+class BadTlvLength(LdpExc):
+    """A TLV length does not fit its message or its TLV type."""
+    CODE = LDP_STATUS_BAD_TLV_LENGTH
+    SUB_CODE = 0
+    SEND_ERROR = True
+
+
+def _to_bytes(data):
+    # bytes(memoryview) is its repr on python 2
+    if isinstance(data, memoryview):
+        return data.tobytes()
+    return bytes(data)
+
+
+def _inet_ntoa(buf, offset):
+    return socket.inet_ntoa(struct.unpack_from('!4s', buf, offset)[0])
+
+
+def _decode_hello_params(buf, offset, length):
+    hold_time, flags = struct.unpack_from('!HH', buf, offset)
+    return CommonHelloParameter(hold_time, flags >> 15, (flags >> 14) & 1)
+
+
+def _decode_transport_address(buf, offset, length):
+    return IPv4TransportAddress(_inet_ntoa(buf, offset))
+
+
+def _decode_session_params(buf, offset, length):
+    (proto_ver, keepalive_time, flags, pvlim, max_pdu_len, lsr_id,
+     label_space_id) = struct.unpack_from('!HHBBH4sH', buf, offset)
+    return CommonSessionParameters(proto_ver, keepalive_time, flags >> 7,
+                                   (flags >> 6) & 1, pvlim, max_pdu_len,
+                                   socket.inet_ntoa(lsr_id), label_space_id)
+
+
+def _check_fec(buf, offset, end):
+    # the elements _decode_fec() can decode, IPv4 prefixes only
+    while offset < end:
+        element_type = struct.unpack_from('!B', buf, offset)[0]
+        if element_type == FEC_WILDCARD:
+            offset += 1
+            continue
+        if element_type != FEC_PREFIX:
+            raise BadTlvLength('FEC element type %d' % element_type)
+        if offset + 4 > end:
+            raise BadTlvLength('FEC element header past the end of the '
+                               'FEC TLV')
+        address_type, prefix_len = struct.unpack_from('!HB', buf,
+                                                      offset + 1)
+        if address_type != ADDRESS_FAMILY_IPV4 or prefix_len > 32:
+            raise BadTlvLength('prefix of family %d and length %d' %
+                               (address_type, prefix_len))
+        offset += 4 + ((prefix_len + 7) >> 3)
+        if offset > end:
+            raise BadTlvLength('prefix past the end of the FEC TLV')
+
+
+def _decode_fec(buf, offset, length):
+    elements = []
+    end = offset + length
+    while offset < end:
+        element_type = struct.unpack_from('!B', buf, offset)[0]
+        if element_type == FEC_WILDCARD:
+            elements.append(WildcardFecElement())
+            offset += 1
+            continue
+        address_type, prefix_len = struct.unpack_from('!HB', buf,
+                                                      offset + 1)
+        nbytes = (prefix_len + 7) >> 3
+        start = offset + 4
+        prefix = struct.unpack_from('!%ds' % nbytes, buf, start)[0]
+        elements.append(PrefixFecElement(
+            address_type, prefix_len,
+            socket.inet_ntoa(prefix + b'\x00' * (4 - nbytes))))
+        offset = start + nbytes
+    return Fec(elements)
+
+
+def fec_prefixes(fec):
+    """Returns (prefixes, prefix_lens, wildcard) of a decoded FEC TLV:
+    arrays of the IPv4 prefixes, as integers in host order, and prefix
+    lengths of its prefix elements, and True if it has a wildcard
+    element, which stands for all FECs. Other elements are skipped.
+    """
+    prefixes = array('I')
+    prefix_lens = array('B')
+    wildcard = False
+    for element in fec.fec_elements:
+        if isinstance(element, PrefixFecElement):
+            prefixes.append(struct.unpack(
+                '!I', socket.inet_aton(element.prefix))[0])
+            prefix_lens.append(element.element_len)
+        elif isinstance(element, WildcardFecElement):
+            wildcard = True
+    return prefixes, prefix_lens, wildcard
+
+
+def _decode_generic_label(buf, offset, length):
+    return GenericLabel(struct.unpack_from('!I', buf, offset)[0] & 0xfffff)
+
+
+def _decode_address_list(buf, offset, length):
+    family = struct.unpack_from('!H', buf, offset)[0]
+    addrs = [_inet_ntoa(buf, o)
+             for o in range(offset + 2, offset + length, 4)]
+    return AddressList(family, addrs)
+
+
+def _decode_status(buf, offset, length):
+    code, message_id, message_type = struct.unpack_from('!IIH', buf,
+                                                        offset)
+    return Status(code >> 31, (code >> 30) & 1, code & 0x3fffffff,
+                  message_id, message_type)
+
+
+_DECODERS = {
+    TLV_FEC: _decode_fec,
+    TLV_ADDRESS_LIST: _decode_address_list,
+    TLV_GENERIC_LABEL: _decode_generic_label,
+    TLV_STATUS: _decode_status,
+    TLV_COMMON_HELLO_PARAMETERS: _decode_hello_params,
+    TLV_IPV4_TRANSPORT_ADDRESS: _decode_transport_address,
+    TLV_COMMON_SESSION_PARAMETERS: _decode_session_params,
+}
+
+
+class MessageView(object):
+    __slots__ = ('_buf', '_offset', 'type', 'u_bit', 'length', 'msg_id',
+                 '_tlvs', '_decoded', '_message')
+
+    def __init__(self, buf, offset=0):
+        """buf must not change while the view is used, copy a buffer
+        which is going to be reused.
+        """
+        msg_type, length, msg_id = struct.unpack_from(
+            LDP_MSG_HEADER_PACK_STR, buf, offset)
+        self._buf = buf
+        self._offset = offset
+        self.type = msg_type & 0x7fff
+        self.u_bit = msg_type >> 15
+        self.length = length
+        self.msg_id = msg_id
+        self._tlvs = None
+        self._decoded = None
+        self._message = None
+
+    @property
+    def end(self):
+        return self._offset + LDP_MSG_LEN_OFFSET + self.length
+
+    @property
+    def raw(self):
+        """The message bytes without PDU header."""
+        return _to_bytes(self._buf[self._offset:self.end])
+
+    def _index(self):
+        # key TLV type, value offset of the first TLV of the type
+        tlvs = {}
+        buf = self._buf
+        offset = self._offset + LDP_MSG_HEADER_LEN
+        end = self.end
+        while offset < end:
+            if offset + LDP_TLV_HEADER_LEN > end:
+                raise BadTlvLength('TLV header past the end of %s' % self)
+            tlv_type, length = struct.unpack_from(LDP_TLV_HEADER_PACK_STR,
+                                                  buf, offset)
+            tlv_type &= 0x3fff
+            if offset + LDP_TLV_HEADER_LEN + length > end or \
+                    length < _MIN_TLV_LEN.get(tlv_type, 0):
+                raise BadTlvLength('TLV 0x%04x of length %d in %s' %
+                                   (tlv_type, length, self))
+            if tlv_type == TLV_FEC:
+                start = offset + LDP_TLV_HEADER_LEN
+                _check_fec(buf, start, start + length)
+            tlvs.setdefault(tlv_type, offset)
+            offset += LDP_TLV_HEADER_LEN + length
+        self._tlvs = tlvs
+        self._decoded = {}
+        return tlvs
+
+    def tlv_types(self):
+        tlvs = self._tlvs
+        if tlvs is None:
+            tlvs = self._index()
+        return list(tlvs.keys())
+
+    def has_tlv(self, tlv_type):
+        tlvs = self._tlvs
+        if tlvs is None:
+            tlvs = self._index()
+        return tlv_type in tlvs
+
+    def tlv(self, tlv_type):
+        """Returns the first TLV of tlv_type decoded, or None."""
+        tlvs = self._tlvs
+        if tlvs is None:
+            tlvs = self._index()
+        offset = tlvs.get(tlv_type)
+        if offset is None:
+            return None
+        decoded = self._decoded.get(tlv_type)
+        if decoded is None:
+            decoder = _DECODERS.get(tlv_type)
+            if decoder is None:
+                decoded = LDPMessage.retrive_tlv(tlv_type, self.message())
+            else:
+                length = struct.unpack_from('!H', self._buf, offset + 2)[0]
+                decoded = decoder(self._buf, offset + LDP_TLV_HEADER_LEN,
+                                  length)
+            self._decoded[tlv_type] = decoded
+        return decoded
+
+    def message(self):
+        """Returns the message fully decoded by ryu.lib.packet.ldp."""
+        if self._message is None:
+            self._message, rest = LDPMessage.parser(self.raw,
+                                                    include_header=False)
+        return self._message
+
+    @property
+    def tlvs(self):
+        # for LDPMessage.retrive_tlv
+        return self.message().tlvs
+
+    def __str__(self):
+        return '%s<type=0x%04x, msg_id=%d, length=%d>' % (
+            self.__class__.__name__, self.type, self.msg_id, self.length)
+
+
+def parse_message(buf, offset=0, end=None):
+    """Returns the view of the message at offset, after checking its
+    length against end, the end of its PDU, and the lengths of its TLVs.
+    """
+    if end is None:
+        end = len(buf)
+    if offset + LDP_MSG_HEADER_LEN > end:
+        raise BadMessageLength('message header past the end of the PDU')
+    view = MessageView(buf, offset)
+    if view.length < LDP_MSG_HEADER_LEN - LDP_MSG_LEN_OFFSET or \
+            view.end > end:
+        raise BadMessageLength('%s past the end of the PDU' % view)
+    view._index()
+    return view
+
+
+def parse_pdu(pdu):
+    """Returns views of the messages of one PDU. The PDU is copied once
+    and shared by the views.
+    """
+    buf = _to_bytes(pdu)
+    views = []
+    offset = LDP_PDU_HEADER_LEN
+    end = len(buf)
+    while offset < end:
+        view = parse_message(buf, offset, end)
+        views.append(view)
+        offset = view.end
+    return views
@@ -15,20 +15,42 @@
 
 import socket
 import logging
-import traceback
 import struct
+import time
+import traceback
 import abc
 import six
-from eventlet import semaphore
-from ryu.lib import hub
 from ryu.services.protocols.ldp import event as ldp_event
-from ryu.services.protocols.ldp.ldp_util import EventletIOFactory
+from ryu.services.protocols.ldp.bulk import LABEL_MAPPING_FIXED_LEN
+from ryu.services.protocols.ldp.bulk import frame_pdus
+from ryu.services.protocols.ldp.decode_pool import RECORD_BINDINGS
+from ryu.services.protocols.ldp.framing import FramingError
+from ryu.services.protocols.ldp.framing import PDUCoalescer
+from ryu.services.protocols.ldp.framing import PDUFramer
+from ryu.services.protocols.ldp.framing import negotiate_max_pdu_len
+from ryu.services.protocols.ldp.framing import parse_pdu_header
+from ryu.services.protocols.ldp.ldp_util import get_clock
+from ryu.services.protocols.ldp.message_view import LDP_MSG_LEN_OFFSET
+from ryu.services.protocols.ldp.message_view import parse_message
+from ryu.services.protocols.ldp.message_view import parse_pdu
+from ryu.services.protocols.ldp.message_view import \
+    TLV_COMMON_SESSION_PARAMETERS
+from ryu.services.protocols.ldp.stats import MSG_TYPE_INDEX
+from ryu.services.protocols.ldp.stats import MSG_TYPE_OTHER
+from ryu.services.protocols.ldp.template import get_template
+from ryu.services.protocols.ldp.writer import WriterOverflow
 
 from ryu.lib.packet import ldp
-from ryu.lib.packet.ldp import LDPMessage
 LOG = logging.getLogger('ldp.Peer')
 
 LDP_MIN_MSG_LEN = 10
+# RFC 5036 3.9, Keepalive Timer Expired
+LDP_STATUS_KEEPALIVE_TIMER_EXPIRED = 0x14
+# checks of the keepalive timeout per keepalive time
+KEEPALIVE_CHECKS = 4
+# type of a serialized message, without the U bit
+_MSG_TYPE = struct.Struct('!H')
+_MSG_TYPE_MASK = 0x7fff
 
 @six.add_metaclass(abc.ABCMeta)
 class LDPState(object):
@@ -133,85 +155,155 @@ class Peer(object):
 
     def __init__(self, app, peer_router_id, trans_addr, conf):
         self._app = app
+        self._io = app.io_backend
+        # keepalive and hold times run on the clock of the timers
+        self._clock = get_clock()
         self.peer_router_id = peer_router_id
         self.trans_addr = trans_addr
         self.state = ldp_event.LDP_STATE_NON_EXISTENT
+        self.created_at = self._clock.time()
         self.name = self._instance_name(peer_router_id, 0)
         self._conf = conf
+        self._stats = app.statistics.peer(peer_router_id)
         self._socket = None
-        self._recv_buff = ''
+        self._last_rx = 0
         self._state_map = {}
         self._state_instance = None
-        self._send_lock = semaphore.Semaphore()
+        self._writer = None
+        self._flush_timer = self._io.create_timer(self.flush)
+        self._reset_connection()
         self._keepalive_send_timer = \
-            EventletIOFactory.create_looping_call(self._send_keepalive)
+            self._io.create_looping_call(self._send_keepalive)
         self._keepalive_timeout_timer = \
-            EventletIOFactory.create_looping_call(self.keepalive_timeout)
-        self._keepalive_time = 0
+            self._io.create_looping_call(self.keepalive_timeout)
         self._msg_id = 0
 
+    def _reset_connection(self):
+        # Nothing received or queued on a previous connection may go
+        # into a new one, the peer starts over with an Init.
+        conf = self._conf
+        self._framer = PDUFramer()
+        self._rx_batch = []
+        self._rx_count = 0
+        self._coalescer = PDUCoalescer(conf.router_id, conf.label_space_id,
+            negotiate_max_pdu_len(conf.max_pdu_len, 0))
+        self._priority_coalescer = PDUCoalescer(conf.router_id,
+            conf.label_space_id, negotiate_max_pdu_len(conf.max_pdu_len, 0))
+        self._flush_timer.cancel()
+        self._flush_scheduled = False
+        self._keepalive_time = 0
+
     def send_event_to_observers(self, ev):
         self._app.send_event_to_observers(ev)
 
     def conn_handle(self, socket, is_active):
+        """Runs the session on a connected socket, the receive loop
+        needs green threads.
+        """
+        if self._socket is not None:
+            # The receive loop of the old connection ended or ends now
+            # without reporting it.
+            old, self._socket = self._socket, None
+            if self.state != ldp_event.LDP_STATE_NON_EXISTENT:
+                self.connection_lost('Replaced by a new connection')
+            old.close()
+        self._socket = socket
+        self.connection_made(socket, is_active)
+        self._io.spawn(self._recv_loop, socket)
+
+    def connection_made(self, conn, is_active):
+        """Starts the session on conn, a connection of the io backend.
+        Without conn_handle() the backend calls data_received() and
+        connection_lost().
+        """
+        self._reset_connection()
         if is_active:
             self._state_map = self._ACTIVE_STATE_MAP
         else:
             self._state_map = self._PASSIVE_STATE_MAP
-        self._socket = socket
+        self._last_rx = self._clock.time()
+        self._writer = self._io.create_writer(
+            conn, self._conf.send_high_watermark,
+            self._conf.send_low_watermark,
+            error_handler=self._write_failed,
+            wait_histogram=self._stats.send_queue_wait)
+        self._writer.start()
         self.state_change(ldp_event.LDP_STATE_INITIAL)
-        hub.spawn(self._recv_loop)
 
     def send_init(self):
         keepalive_time = self._conf.keep_alive
+        key = ('init', self._conf.router_id, self.peer_router_id,
+               keepalive_time, self._conf.max_pdu_len)
+        template = get_template(key, self._init_msg)
+        self.send_msg(template.render(self.next_msg_ids(1)), flush=True)
+
+    def _init_msg(self):
         # TODO: params are to be configurable
-        tlvs = [ldp.CommonSessionParameters(proto_ver=1, keepalive_time=keepalive_time,
-                pvlim=0, max_pdu_len=0, receiver_lsr_id=self.peer_router_id,
+        tlvs = [ldp.CommonSessionParameters(proto_ver=1,
+                keepalive_time=self._conf.keep_alive,
+                pvlim=0, max_pdu_len=self._conf.max_pdu_len,
+                receiver_lsr_id=self.peer_router_id,
                 receiver_label_space_id=0, a_bit=0, d_bit=0)]
-        msg = ldp.LDPInit(router_id = self._conf.router_id, msg_id = self._msg_id,
+        return ldp.LDPInit(router_id = self._conf.router_id, msg_id = 0,
             tlvs = tlvs)
-        self.send_msg(msg)
 
     def send_keepalive(self):
         self._keepalive_send_timer.start(self._keepalive_time / 3)
 
     def _send_keepalive(self):
-        msg = ldp.LDPKeepAlive(router_id=self._conf.router_id, msg_id = self._msg_id,
+        template = get_template(('keepalive', self._conf.router_id),
+                                self._keepalive_msg)
+        self.send_msg(template.render(self.next_msg_ids(1)),
+                      priority=True)
+
+    def _keepalive_msg(self):
+        return ldp.LDPKeepAlive(router_id=self._conf.router_id, msg_id = 0,
             tlvs=[])
-        self.send_msg(msg)
 
-    def keepalive_timeout(self):
-        print 'timeout'
+    def send_notification(self, status_code, msg_id=0, msg_type=0):
+        tlvs = [ldp.Status(u_bit=0, f_bit=0, status_code=status_code,
+                           message_id=msg_id, message_type=msg_type)]
+        msg = ldp.LDPNotification(router_id=self._conf.router_id,
+                                  msg_id=0, tlvs=tlvs)
+        self.send_msg(msg, priority=True)
 
-    def reset_hold_timer(self):
-        pass
-        #self._hello_timer.reset()
+    def keepalive_timeout(self):
+        # Any message received is proof the peer is alive, receiving
+        # only records the time and this check runs a few times per
+        # keepalive time.
+        if self._clock.time() - self._last_rx < self._keepalive_time:
+            return
+        LOG.info('%s: keepalive timer expired', self.name)
+        self._keepalive_timeout_timer.stop()
+        self.send_notification(LDP_STATUS_KEEPALIVE_TIMER_EXPIRED)
+        self._writer.close()
 
     def start_keepalive_timeout(self):
-        self._keepalive_timeout_timer.start(self._keepalive_time, now=False)
+        self._keepalive_timeout_timer.start(
+            float(self._keepalive_time) / KEEPALIVE_CHECKS, now=False)
 
     def state_change(self, new_state):
         if self.state == new_state:
             return
         old_state = self.state
         self.state = new_state
+        if old_state == ldp_event.LDP_STATE_OPERATIONAL:
+            self._stats.flaps += 1
         self.state_impl = self._state_map[new_state](self)
         state_changed = ldp_event.EventLDPStateChanged(
             self.name, self, old_state, new_state)
         self.send_event_to_observers(state_changed)
         self.state_impl.action()
 
-    def _recv_loop(self):
-        required_len = LDP_MIN_MSG_LEN
+    def _recv_loop(self, sock):
         conn_lost_reason = "Connection lost as protocol is no longer active"
         try:
             while True:
-                next_bytes = self._socket.recv(required_len)
-                if len(next_bytes) == 0:
-                    print 'peer closed'
+                if self._framer.recv_into(sock) == 0:
                     conn_lost_reason = 'Peer closed connection'
                     break
-                self.data_received(next_bytes)
+                self._last_rx = self._clock.time()
+                self._process_pdus()
         except socket.error as err:
             conn_lost_reason = 'Connection to peer lost: %s.' % err
         except ldp.LdpExc as ex:
@@ -220,47 +312,101 @@ class Peer(object):
             LOG.debug(traceback.format_exc())
             conn_lost_reason = str(e)
         finally:
-            self.connection_lost(conn_lost_reason)
+            # a connection replaced by a newer one is not reported
+            if self._socket is sock:
+                self.connection_lost(conn_lost_reason)
 
     def data_received(self, next_bytes):
+        self._last_rx = self._clock.time()
+        self._framer.feed(next_bytes)
+        self._process_pdus()
+
+    def _process_pdus(self):
+        # After msg_budget messages the batch is delivered and other
+        # peers get their turn, so a bulk dump from one peer does not
+        # hold back the keepalives and hellos of the others.
+        budget = self._conf.msg_budget
+        clock = time.time
+        parse_time = self._stats.pdu_parse_time
         try:
-            self._data_received(next_bytes)
+            pool = self._app.decode_pool
+            if pool is not None and \
+                    self.state == ldp_event.LDP_STATE_OPERATIONAL and \
+                    pool.should_offload(self._framer.complete_len()) and \
+                    self._app.dispatcher.accepts_bindings():
+                self._offload_pdus(pool)
+            for pdu in self._framer.pdus():
+                start = clock()
+                self._data_received(pdu)
+                parse_time.record(clock() - start)
+                if self._rx_count >= budget:
+                    self._deliver_batch()
+                    self._io.cooperate()
         except ldp.LdpExc as exc:
+            # the malformed messages and TLVs of message_view.py
+            self._stats.parse_errors += 1
             if exc.SEND_ERROR:
-                self.send_notification(exc.CODE, exc.SUB_CODE)
+                self.send_notification(exc.CODE)
             else:
-                self._socket.close()
+                self._close()
             raise exc
-
-    def _data_received(self, next_bytes):
-        # Append buffer with received bytes.
-        self._recv_buff += next_bytes
-
-        while True:
-            if len(self._recv_buff) < LDP_MIN_MSG_LEN:
-                return
-            version, pdu_len, router_id, label_space_id \
-                = Peer.parse_msg_header(
-                    self._recv_buff[:LDP_MIN_MSG_LEN])
-            # RFC
-            buf_len = len(self._recv_buff) - 4
-            if buf_len < pdu_len:
-                return
-            #TODO: t
-            try:
-                include_header = (pdu_len > LDP_MIN_MSG_LEN)
-                while True:
-                    msg, rest = LDPMessage.parser(self._recv_buff, include_header)
-                    self._handle_msg(msg)
-                    self._recv_buff = rest
-                    if len(rest) <= LDP_MIN_MSG_LEN: break
-                    include_header = False
-                # If we have a valid bgp message we call message handler.
-            except KeyError:
-                return
+        except FramingError:
+            self._stats.parse_errors += 1
+            raise
+        finally:
+            self._deliver_batch()
+
+    def _offload_pdus(self, pool):
+        # The receive loop waits for the worker, so nothing of this
+        # session is handled before the records, which are in order.
+        data = self._framer.pop_pdus()
+        budget = self._conf.msg_budget
+        dispatcher = self._app.dispatcher
+        for record in pool.decode(data):
+            if record[0] == RECORD_BINDINGS:
+                self._deliver_batch()
+                self._count_bindings(record[1], record[3])
+                dispatcher.dispatch_bindings(self, *record[1:])
+                self._io.cooperate()
+                continue
+            for offset in record[1]:
+                # the worker checked the message length
+                self._handle_msg(parse_message(data, offset))
+                if self._rx_count >= budget:
+                    self._deliver_batch()
+                    self._io.cooperate()
+
+    def _count_bindings(self, msg_count, prefix_lens):
+        # the Label Mappings were not parsed here, their size follows
+        # from the prefix lengths
+        index = MSG_TYPE_INDEX[ldp.LDP_MSG_LABEL_MAPPING]
+        self._stats.rx_msgs[index] += msg_count
+        self._stats.rx_bytes[index] += \
+            LABEL_MAPPING_FIXED_LEN * msg_count + \
+            sum((prefix_len + 7) >> 3 for prefix_len in prefix_lens)
+
+    def _deliver_batch(self):
+        self._rx_count = 0
+        if not self._rx_batch:
+            return
+        msgs = self._rx_batch
+        self._rx_batch = []
+        self._app.dispatcher.dispatch(self, msgs)
+        self._stats.dispatch_latency.record(
+            self._clock.time() - self._last_rx)
+
+    def _data_received(self, pdu):
+        # pdu is a memoryview of exactly one PDU, the messages are
+        # MessageViews decoding TLVs on access.
+        for msg in parse_pdu(pdu):
+            self._handle_msg(msg)
 
     def _handle_msg(self, msg):
+        self._rx_count += 1
         msg_type = msg.type
+        index = MSG_TYPE_INDEX.get(msg_type, MSG_TYPE_OTHER)
+        self._stats.rx_msgs[index] += 1
+        self._stats.rx_bytes[index] += LDP_MSG_LEN_OFFSET + msg.length
         # state change by msg type
         # if initial recv, call then and current state change call
         state_change = True
@@ -286,32 +432,153 @@ class Peer(object):
             new_state = self.state_impl.new_state()
             self.state_change(new_state)
         else:
-            msg_recv = ldp_event.EventLDPMessageReceived(
-                self.name, msg)
-            self.send_event_to_observers(msg_recv)
+            # delivered with the other messages of this receive
+            self._rx_batch.append(msg)
 
     def _handle_init(self, msg):
-        tlv = LDPMessage.retrive_tlv(ldp.LDP_TLV_COMMON_SESSION_PARAMETERS, msg)
+        tlv = msg.tlv(TLV_COMMON_SESSION_PARAMETERS)
         if self._conf.keep_alive < tlv.keepalive_time:
-            self._keepalive_time = self._conf.keepalive
+            self._keepalive_time = self._conf.keep_alive
         else:
             self._keepalive_time = tlv.keepalive_time
+        self._coalescer.max_pdu_len = negotiate_max_pdu_len(
+            self._conf.max_pdu_len, tlv.max_pdu_len)
+        self._priority_coalescer.max_pdu_len = self._coalescer.max_pdu_len
 
     @staticmethod
     def parse_msg_header(buff):
-        return struct.unpack('!HH4sH', buff)
+        return parse_pdu_header(buff)
+
+    def send_msg(self, msg, flush=False, priority=False):
+        """Queues msg to be packed with other messages into one PDU.
+        msg is a message object or a message already serialized without
+        PDU header (bytes, bytearray or memoryview), whose id was taken
+        from next_msg_ids().
+        The queue is sent when the PDU is full, when pdu_coalesce_delay
+        has passed or, if flush is True, right away.
+        A priority msg is sent in a PDU of its own ahead of the queued
+        messages.
+        """
+        if isinstance(msg, (bytes, bytearray, memoryview)):
+            data = msg
+        else:
+            msg.msg_id = self.next_msg_ids(1)
+            data = msg.serialize(include_header=False)
+        self._count_sent(data, 1, len(data))
+        if priority:
+            self._priority_coalescer.add(data)
+            self._write(self._priority_coalescer.flush(), priority=True)
+            return
+        for pdu in self._coalescer.add(data):
+            self._write(pdu)
+        if flush or self._conf.pdu_coalesce_delay <= 0:
+            self.flush()
+        elif len(self._coalescer) and not self._flush_scheduled:
+            self._flush_scheduled = True
+            self._flush_timer.start(self._conf.pdu_coalesce_delay)
+
+    def flush(self):
+        """Sends the queued messages now."""
+        self._flush_scheduled = False
+        pdu = self._coalescer.flush()
+        if pdu is not None:
+            self._write(pdu)
+
+    def next_msg_ids(self, count):
+        """Reserves count message ids, returns the first."""
+        first = self._msg_id + 1
+        self._msg_id += count
+        return first
+
+    def send_bulk(self, buf, ends):
+        """Sends the messages encoded by the bulk codec, buf holds the
+        messages without PDU header and ends their end offsets. Messages
+        queued by send_msg() are sent first.
+        """
+        self.flush()
+        if len(ends):
+            self._count_sent(buf, len(ends), int(ends[-1]))
+            self._write(frame_pdus(buf, ends, self._coalescer.header,
+                                   self._coalescer.max_pdu_len))
+
+    def _count_sent(self, data, msg_count, nbytes):
+        msg_type = _MSG_TYPE.unpack_from(data)[0] & _MSG_TYPE_MASK
+        index = MSG_TYPE_INDEX.get(msg_type, MSG_TYPE_OTHER)
+        self._stats.tx_msgs[index] += msg_count
+        self._stats.tx_bytes[index] += nbytes
+
+    def _write(self, data, priority=False):
+        try:
+            self._writer.write(data, priority)
+        except WriterOverflow as e:
+            LOG.warning('%s: peer does not read, %s', self.name, e)
+            self._write_failed(e)
+
+    def _write_failed(self, exc):
+        # Called when the writer stopped. Wakes up _recv_loop, which
+        # then reports the connection lost. A writer of a backend
+        # without socket closes its connection when stopped.
+        self._writer.stop()
+        if self._socket is None:
+            return
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+
+    def _close(self):
+        if self._socket is not None:
+            self._socket.close()
+        elif self._writer is not None:
+            self._writer.stop()
+
+    @property
+    def writable(self):
+        """False while the outbound queue is above the high watermark,
+        bulk senders should wait_writable() then.
+        """
+        return self._writer is None or self._writer.writable
 
-    def send_msg(self, msg):
-        self._msg_id += 1
-        self._send_with_lock(msg)
+    def wait_writable(self, timeout=None):
+        if self._writer is None:
+            return True
+        return self._writer.wait_writable(timeout)
 
-    def _send_with_lock(self, msg):
-        self._send_lock.acquire()
-        try:
-            self._socket.sendall(msg.serialize())
-        finally:
-            self._send_lock.release()
+    def call_when_writable(self, callback, *args):
+        """Calls callback(*args) in its own turn once the peer is
+        writable, or the session is gone.
+        """
+        if self._writer is None:
+            self._io.spawn(callback, *args)
+        else:
+            self._writer.call_when_writable(callback, *args)
+
+    def writer_stats(self):
+        if self._writer is None:
+            return None
+        return self._writer.stats()
+
+    def stop(self):
+        """Stops the timers and closes the session."""
+        self._keepalive_send_timer.stop()
+        self._keepalive_timeout_timer.stop()
+        if self._writer is not None:
+            self._writer.stop()
+        if self._socket is not None:
+            # wakes up _recv_loop, see _write_failed()
+            try:
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            self._socket.close()
 
     def connection_lost(self, reason):
         """Stops all timers and notifies peer that connection is lost.
         """
+        LOG.info('%s: %s', self.name, reason)
+        self._keepalive_send_timer.stop()
+        self._keepalive_timeout_timer.stop()
+        if self._writer is not None:
+            self._writer.stop()
+        if self._state_map:
+            self.state_change(ldp_event.LDP_STATE_NON_EXISTENT)
@@ -0,0 +1,197 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Sampled wall time of the session and discovery hot paths.
+
+The instrumentation points are the methods of POINTS. While the
+profiler is stopped they are the plain methods, it costs nothing.
+start() replaces them on their classes with timing wrappers and stop()
+puts the originals back.
+
+One call in sample_every of a point that is entered outside of any
+other point is sampled, with every point it calls. A sample records the
+wall time and the self time (without the points called) of each point
+under its stack of points, per green thread. Wall time includes the
+time other sessions ran while a point yielded, e.g. in
+Peer._process_pdus().
+
+stats() returns the per stage table, folded() the stacks in the folded
+format of flamegraph.pl with the self time in microseconds as value.
+"""
+
+import logging
+import time
+
+try:
+    from greenlet import getcurrent as _current_thread
+except ImportError:
+    from threading import current_thread as _current_thread
+
+from ryu.services.protocols.ldp.discovery import DiscoverServer
+from ryu.services.protocols.ldp.discovery import DiscoveryEngine
+from ryu.services.protocols.ldp.dispatch import MessageDispatcher
+from ryu.services.protocols.ldp.interface import LDPInterface
+from ryu.services.protocols.ldp.message_view import MessageView
+from ryu.services.protocols.ldp.peer import Peer
+
+try:
+    from ryu.services.protocols.ldp import aio
+except ImportError:
+    aio = None
+
+LOG = logging.getLogger('ldp.probe')
+
+DEFAULT_SAMPLE_EVERY = 100
+
+# (stage name, class, method)
+POINTS = [
+    ('peer.process_pdus', Peer, '_process_pdus'),
+    ('peer.data_received', Peer, '_data_received'),
+    ('peer.handle_msg', Peer, '_handle_msg'),
+    # TLVs are decoded on access, message() runs the full parser
+    ('message.tlv', MessageView, 'tlv'),
+    ('message.parser', MessageView, 'message'),
+    ('dispatch', MessageDispatcher, 'dispatch'),
+    ('dispatch.bindings', MessageDispatcher, 'dispatch_bindings'),
+    ('peer.send_msg', Peer, 'send_msg'),
+    ('peer.send_bulk', Peer, 'send_bulk'),
+    ('discovery.recv', DiscoverServer, '_datagram_received'),
+    ('discovery.recv', DiscoveryEngine, '_datagram_received'),
+    ('interface.send_hello', LDPInterface, 'send_hello'),
+]
+if aio is not None:
+    POINTS.append(('discovery.recv', aio._DiscoveryProtocol,
+                   'datagram_received'))
+
+# per stage: samples, total, self, max
+_SAMPLES = 0
+_TOTAL = 1
+_SELF = 2
+_MAX = 3
+
+
+class SamplingProfiler(object):
+    def __init__(self, points=None, clock=time.time):
+        self._points = POINTS if points is None else points
+        self._clock = clock
+        self._originals = []  # (class, method name, original)
+        self._stacks = {}  # key green thread
+        self._roots = 0
+        self.sample_every = DEFAULT_SAMPLE_EVERY
+        self.reset()
+
+    @property
+    def active(self):
+        return bool(self._originals)
+
+    def start(self, sample_every=DEFAULT_SAMPLE_EVERY):
+        if sample_every < 1:
+            raise ValueError('sample_every must be at least 1')
+        self.sample_every = sample_every
+        if self.active:
+            return
+        for name, cls, method in self._points:
+            original = cls.__dict__[method]
+            self._originals.append((cls, method, original))
+            setattr(cls, method, self._wrap(name, original))
+        LOG.info('profiling %d points, 1 in %d', len(self._points),
+                 sample_every)
+
+    def stop(self):
+        for cls, method, original in reversed(self._originals):
+            setattr(cls, method, original)
+        self._originals = []
+        self._stacks.clear()
+
+    def reset(self):
+        self._stages = {}  # key stage name
+        self._folded = {}  # key stack of stage names, value self time
+
+    def _wrap(self, name, func):
+        stacks = self._stacks
+        clock = self._clock
+
+        def probe(*args, **kwargs):
+            key = _current_thread()
+            stack = stacks.get(key)
+            if stack is None:
+                stack = stacks[key] = []
+            if stack:
+                sampled = stack[-1] is not None
+            else:
+                self._roots += 1
+                sampled = self._roots % self.sample_every == 0
+            if not sampled:
+                stack.append(None)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    stack.pop()
+                    if not stack:
+                        stacks.pop(key, None)
+            # [stack of stage names, time of the points called]
+            frame = [stack[-1][0] + (name, ) if stack else (name, ), 0.0]
+            stack.append(frame)
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                stack.pop()
+                if stack:
+                    stack[-1][1] += elapsed
+                else:
+                    stacks.pop(key, None)
+                self._record(name, frame[0], elapsed, elapsed - frame[1])
+
+        probe.__name__ = func.__name__
+        probe.__doc__ = func.__doc__
+        return probe
+
+    def _record(self, name, path, elapsed, self_time):
+        stage = self._stages.get(name)
+        if stage is None:
+            stage = self._stages[name] = [0, 0.0, 0.0, 0.0]
+        stage[_SAMPLES] += 1
+        stage[_TOTAL] += elapsed
+        stage[_SELF] += self_time
+        if elapsed > stage[_MAX]:
+            stage[_MAX] = elapsed
+        self._folded[path] = self._folded.get(path, 0.0) + self_time
+
+    def stats(self):
+        """Returns the sampled wall and self time of each stage."""
+        stages = {}
+        for name, stage in self._stages.items():
+            samples = stage[_SAMPLES]
+            stages[name] = {'samples': samples,
+                            'total': stage[_TOTAL],
+                            'self': stage[_SELF],
+                            'avg': stage[_TOTAL] / samples,
+                            'max': stage[_MAX]}
+        return {'active': self.active,
+                'sample_every': self.sample_every,
+                'stages': stages}
+
+    def folded(self):
+        """Returns the sampled stacks as lines of 'stage;stage self_us'."""
+        lines = ['%s %d' % (';'.join(path), int(self_time * 1000000))
+                 for path, self_time in sorted(self._folded.items())]
+        return '\n'.join(lines)
+
+
+# the points are methods of classes, so there is one per process
+profiler = SamplingProfiler()
@@ -65,8 +65,14 @@ class WebSocketLdp(app_manager.RyuApp):
         pass
 
     @rpc_public('adver.send_label_mapping')
-    def send_label_mapping(self, prefix, label):
-      return {'prefix': prefix, 'label': label}
+    def send_label_mapping(self, prefix, label=None):
+        # prefix is "a.b.c.d/len", a local label is allocated unless given
+        if label is None:
+            addr, prefix_len = prefix.split('/')
+            manager = app_manager.lookup_service_brick(
+                ldp_event.LDP_MANAGER_NAME)
+            label = manager.bind_local_label(addr, int(prefix_len))
+        return {'prefix': prefix, 'label': label}
 
     @rpc_public('adver.send_label_request')
     def send_label_request(self):
@@ -76,6 +82,44 @@ class WebSocketLdp(app_manager.RyuApp):
     def send_notification(self):
         pass
 
+    @rpc_public('show.label_usage')
+    def show_label_usage(self):
+        manager = app_manager.lookup_service_brick(
+            ldp_event.LDP_MANAGER_NAME)
+        return manager.label_stats()
+
+    @rpc_public('show.session_stats')
+    def show_session_stats(self):
+        manager = app_manager.lookup_service_brick(
+            ldp_event.LDP_MANAGER_NAME)
+        return manager.session_stats()
+
+    @rpc_public('show.statistics')
+    def show_statistics(self, lsr_id=None):
+        manager = app_manager.lookup_service_brick(
+            ldp_event.LDP_MANAGER_NAME)
+        return manager.statistics_snapshot(lsr_id)
+
+    @rpc_public('oper.profile')
+    def set_profiling(self, enable=True, sample_every=100, reset=False):
+        # samples 1 in sample_every calls of the session hot path
+        manager = app_manager.lookup_service_brick(
+            ldp_event.LDP_MANAGER_NAME)
+        return {'active': manager.set_profiling(enable, sample_every,
+                                                reset)}
+
+    @rpc_public('show.profile')
+    def show_profile(self):
+        manager = app_manager.lookup_service_brick(
+            ldp_event.LDP_MANAGER_NAME)
+        return manager.profile_stats()
+
+    @rpc_public('show.profile_folded')
+    def show_profile_folded(self):
+        manager = app_manager.lookup_service_brick(
+            ldp_event.LDP_MANAGER_NAME)
+        return manager.profile_folded()
+
     @rpc_public('show.ldp_neighbor')
     def show_ldp_neighbor(self):
         pass
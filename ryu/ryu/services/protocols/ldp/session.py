@@ -0,0 +1,218 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Session establishment.
+
+SessionAcceptor listens once on the transport address and hands every
+incoming connection to the Peer registered for its source address. A
+connection that arrives before the hello of its peer is held for
+DEFAULT_ACCEPT_HOLD_TIME seconds.
+SessionConnector opens the sessions of the active role. A limited
+number of connects run at a time and a failed connect is retried after
+a jittered exponential backoff, so a restart of many neighbours at once
+does not turn into a connect storm.
+"""
+
+import logging
+import random
+import socket
+
+from eventlet import semaphore
+from ryu.lib import hub
+from ryu.lib.hub import Timeout
+
+LOG = logging.getLogger('ldp.session')
+
+LDP_SESSION_PORT = 646
+DEFAULT_CONN_TIMEOUT = 30
+DEFAULT_LISTEN_BACKLOG = 128
+DEFAULT_ACCEPT_HOLD_TIME = 5
+DEFAULT_MAX_CONNECTING = 16
+DEFAULT_BACKOFF_INITIAL = 1
+DEFAULT_BACKOFF_MAX = 60
+DEFAULT_BACKOFF_JITTER = 0.5
+
+
+class ConnectBackoff(object):
+    """Exponential backoff, each delay is randomized by +-jitter."""
+
+    def __init__(self, initial=DEFAULT_BACKOFF_INITIAL,
+                 maximum=DEFAULT_BACKOFF_MAX, jitter=DEFAULT_BACKOFF_JITTER,
+                 rand=random.random):
+        self.initial = initial
+        self.maximum = maximum
+        self.jitter = jitter
+        self._rand = rand
+        self.attempts = 0
+
+    def next_delay(self):
+        delay = min(self.initial * (2 ** self.attempts), self.maximum)
+        self.attempts += 1
+        return delay * (1 - self.jitter + 2 * self.jitter * self._rand())
+
+    def reset(self):
+        self.attempts = 0
+
+
+class SessionSetupStats(object):
+    def __init__(self):
+        self.connects = 0
+        self.connect_failures = 0
+        self.accepts = 0
+        self.rejects = 0
+        self.setups = 0
+        self.setup_time_total = 0.0
+        self.setup_time_min = None
+        self.setup_time_max = None
+        self.setup_time_last = None
+
+    def record_setup(self, seconds):
+        self.setups += 1
+        self.setup_time_total += seconds
+        self.setup_time_last = seconds
+        if self.setup_time_min is None or seconds < self.setup_time_min:
+            self.setup_time_min = seconds
+        if self.setup_time_max is None or seconds > self.setup_time_max:
+            self.setup_time_max = seconds
+
+    def stats(self):
+        avg = None
+        if self.setups:
+            avg = self.setup_time_total / self.setups
+        return {'connects': self.connects,
+                'connect_failures': self.connect_failures,
+                'accepts': self.accepts,
+                'rejects': self.rejects,
+                'setups': self.setups,
+                'setup_time_avg': avg,
+                'setup_time_min': self.setup_time_min,
+                'setup_time_max': self.setup_time_max,
+                'setup_time_last': self.setup_time_last}
+
+
+class SessionAcceptor(object):
+    def __init__(self, bind_address, stats=None,
+                 backlog=DEFAULT_LISTEN_BACKLOG,
+                 hold_time=DEFAULT_ACCEPT_HOLD_TIME):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(bind_address)
+        self._socket = sock
+        self._backlog = backlog
+        self._hold_time = hold_time
+        self._handlers = {}  # key source address
+        self._pending = {}  # key source address, not yet registered
+        self._thread = None
+        self.stats = stats or SessionSetupStats()
+
+    def register(self, addr, conn_handle):
+        """conn_handle(sock, False) is called for connections from addr."""
+        self._handlers[addr] = conn_handle
+        sock = self._pending.pop(addr, None)
+        if sock is not None:
+            self._hand_over(sock, conn_handle)
+
+    def unregister(self, addr):
+        self._handlers.pop(addr, None)
+
+    def start(self):
+        if self._thread is None:
+            self._socket.listen(self._backlog)
+            self._thread = hub.spawn(self._accept_loop)
+
+    def stop(self):
+        if self._thread is not None:
+            hub.kill(self._thread)
+            self._thread = None
+        self._socket.close()
+
+    def _accept_loop(self):
+        while True:
+            sock, (addr, port) = self._socket.accept()
+            conn_handle = self._handlers.get(addr)
+            if conn_handle is not None:
+                self._hand_over(sock, conn_handle)
+                continue
+            old = self._pending.pop(addr, None)
+            if old is not None:
+                self._reject(addr, old)
+            self._pending[addr] = sock
+            hub.spawn_after(self._hold_time, self._expire, addr, sock)
+
+    def _hand_over(self, sock, conn_handle):
+        self.stats.accepts += 1
+        hub.spawn(conn_handle, sock, False)
+
+    def _expire(self, addr, sock):
+        if self._pending.get(addr) is sock:
+            del self._pending[addr]
+            self._reject(addr, sock)
+
+    def _reject(self, addr, sock):
+        # no hello adjacency with addr, the peer retries
+        LOG.debug('rejected session from %s', addr)
+        self.stats.rejects += 1
+        sock.close()
+
+
+class SessionConnector(object):
+    def __init__(self, bind_ip, stats=None,
+                 max_connecting=DEFAULT_MAX_CONNECTING,
+                 timeout=DEFAULT_CONN_TIMEOUT,
+                 backoff_factory=ConnectBackoff):
+        self._bind_ip = bind_ip
+        self._timeout = timeout
+        self._backoff_factory = backoff_factory
+        self._connecting = semaphore.Semaphore(max_connecting)
+        self.stats = stats or SessionSetupStats()
+
+    def connect(self, peer_addr, conn_handle, is_wanted, delay=0):
+        """Connects to peer_addr, after delay seconds, until it succeeds
+        or is_wanted() returns False, then calls conn_handle(sock, True).
+        """
+        return hub.spawn(self._connect_loop, peer_addr, conn_handle,
+                         is_wanted, delay)
+
+    def _connect_loop(self, peer_addr, conn_handle, is_wanted, delay=0):
+        backoff = self._backoff_factory()
+        if delay:
+            hub.sleep(delay)
+        while is_wanted():
+            sock = self._try_connect(peer_addr)
+            if sock is not None:
+                conn_handle(sock, True)
+                return
+            delay = backoff.next_delay()
+            LOG.debug('connect to %s failed, retry in %.1fs',
+                      peer_addr, delay)
+            hub.sleep(delay)
+
+    def _try_connect(self, peer_addr):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._connecting.acquire()
+        try:
+            self.stats.connects += 1
+            sock.bind((self._bind_ip, 0))
+            with Timeout(self._timeout, socket.error):
+                sock.connect(peer_addr)
+            return sock
+        except socket.error as err:
+            self.stats.connect_failures += 1
+            LOG.debug('connect to %s: %s', peer_addr, err)
+            sock.close()
+            return None
+        finally:
+            self._connecting.release()
@@ -0,0 +1,746 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Sessions sharded over worker processes.
+
+Each peer belongs to the worker shard_of(lsr_id) and the worker runs
+its Peer, framing, keepalives and label distribution. The main process
+keeps discovery, the shared session acceptor, the label information
+base and the API. A worker is told about its peers and the local
+bindings and reports session state changes and the received bindings.
+Messages sent through the API go to the worker of the peer, session
+state changes and the subscribed messages come back as events with a
+ShardPeer, and the statistics are asked from the workers when they are
+read. Message callbacks are not called for the peers of the workers.
+
+Main process and worker talk over a unix stream socket. A record is a
+header of kind and payload length followed by the payload:
+
+    PEER_ADD    lsr_id, transport address, active role
+    PEER_REMOVE lsr_id
+    PEER_CONN   lsr_id, the accepted socket was passed just before
+    ADDRESS     local address
+    BIND        local bindings, see _pack_bindings()
+    UNBIND      local FECs withdrawn
+    STATE       lsr_id, state, seconds since the peer was added
+    BINDINGS    bindings received from a peer
+    WITHDRAWS   FECs withdrawn by a peer
+    PURGE       lsr_id, the peer withdrew all its bindings
+    CONFIG      the pickled LDPConfig, the first record to a worker
+    SEND        lsr_id, the pickled message to send to the peer
+    STATS       sequence number, worker index, the reply holds the
+                pickled LDPStatistics and writer stats of the worker
+    SUBSCRIBE   the pickled app name and message types
+    MESSAGES    lsr_id, app name, the messages subscribed by the app
+
+Sockets are passed over a second unix socket per worker. Bindings
+queued within one hub turn go out as one record.
+
+A worker is a new interpreter running this module, a forked child
+would inherit the green threads of the main process.
+"""
+
+import logging
+import os
+import socket
+import struct
+import subprocess
+import sys
+import time
+import zlib
+from array import array
+from multiprocessing import reduction
+
+from six.moves import cPickle as pickle
+
+from eventlet import semaphore
+from ryu.lib import hub
+from ryu.services.protocols.ldp import event as ldp_event
+from ryu.services.protocols.ldp.backend import EventletBackend
+from ryu.services.protocols.ldp.dispatch import MessageDispatcher
+from ryu.services.protocols.ldp.distribution import DistributionEngine
+from ryu.services.protocols.ldp.message_view import TLV_FEC
+from ryu.services.protocols.ldp.message_view import TLV_GENERIC_LABEL
+from ryu.services.protocols.ldp.message_view import fec_prefixes
+from ryu.services.protocols.ldp.message_view import parse_message
+from ryu.services.protocols.ldp.peer import Peer
+from ryu.services.protocols.ldp.session import LDP_SESSION_PORT
+from ryu.services.protocols.ldp.session import ConnectBackoff
+from ryu.services.protocols.ldp.session import SessionConnector
+from ryu.services.protocols.ldp.stats import LDPStatistics
+
+from ryu.lib.packet import ldp
+
+LOG = logging.getLogger('ldp.shard')
+
+REC_PEER_ADD = 1
+REC_PEER_REMOVE = 2
+REC_PEER_CONN = 3
+REC_ADDRESS = 4
+REC_BIND = 5
+REC_UNBIND = 6
+REC_STATE = 7
+REC_BINDINGS = 8
+REC_WITHDRAWS = 9
+REC_CONFIG = 10
+REC_SEND = 11
+REC_STATS = 12
+REC_SUBSCRIBE = 13
+REC_MESSAGES = 14
+REC_PURGE = 15
+_LABELED = (REC_BIND, REC_BINDINGS)
+
+_RECORD_HEADER = struct.Struct('!BI')
+_PEER = struct.Struct('!4s4sB')
+_STATE = struct.Struct('!4sBd')
+_BINDINGS_HEADER = struct.Struct('!4sI')
+_STATS = struct.Struct('!II')
+_MESSAGES_HEADER = struct.Struct('!4sH')
+RECV_SIZE = 64 * 1024
+STOP_TIMEOUT = 1
+STATS_TIMEOUT = 1
+
+_STATES = (ldp_event.LDP_STATE_NON_EXISTENT, ldp_event.LDP_STATE_INITIAL,
+           ldp_event.LDP_STATE_OPEN_SENT, ldp_event.LDP_STATE_OPEN_REC,
+           ldp_event.LDP_STATE_OPERATIONAL)
+_BIG_ENDIAN = sys.byteorder == 'big'
+_NO_LSR = '0.0.0.0'
+
+
+def shard_of(lsr_id, count):
+    """Returns the worker index of the peer, the same in every
+    process.
+    """
+    return (zlib.crc32(socket.inet_aton(lsr_id)) & 0xffffffff) % count
+
+
+def _be_bytes(values):
+    if not _BIG_ENDIAN and values.itemsize > 1:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tostring() if not hasattr(values, 'tobytes') \
+        else values.tobytes()
+
+
+def _be_array(typecode, data):
+    values = array(typecode)
+    if hasattr(values, 'frombytes'):
+        values.frombytes(data)
+    else:
+        values.fromstring(data)
+    if not _BIG_ENDIAN and values.itemsize > 1:
+        values.byteswap()
+    return values
+
+
+def _pack_bindings(kind, lsr_id, prefixes, prefix_lens, labels):
+    payload = [_BINDINGS_HEADER.pack(socket.inet_aton(lsr_id),
+                                     len(prefixes)),
+               _be_bytes(prefixes), _be_bytes(prefix_lens)]
+    if kind in _LABELED:
+        payload.append(_be_bytes(labels))
+    return b''.join(payload)
+
+
+def _unpack_bindings(kind, payload):
+    """Returns (lsr_id, prefixes, prefix_lens, labels), labels is None
+    for records without labels.
+    """
+    lsr_id, count = _BINDINGS_HEADER.unpack_from(payload)
+    offset = _BINDINGS_HEADER.size
+    prefixes = _be_array('I', payload[offset:offset + 4 * count])
+    offset += 4 * count
+    prefix_lens = _be_array('B', payload[offset:offset + count])
+    labels = None
+    if kind in _LABELED:
+        offset += count
+        labels = _be_array('I', payload[offset:offset + 4 * count])
+    return socket.inet_ntoa(lsr_id), prefixes, prefix_lens, labels
+
+
+def _pack_messages(name, lsr_id, msgs):
+    name = name.encode('utf-8')
+    return b''.join([_MESSAGES_HEADER.pack(socket.inet_aton(lsr_id),
+                                           len(name)), name] +
+                    [msg.raw for msg in msgs])
+
+
+def _unpack_messages(payload):
+    """Returns (app name, lsr_id, MessageViews)."""
+    lsr_id, name_len = _MESSAGES_HEADER.unpack_from(payload)
+    offset = _MESSAGES_HEADER.size
+    name = payload[offset:offset + name_len].decode('utf-8')
+    offset += name_len
+    msgs = []
+    while offset < len(payload):
+        msg = parse_message(payload, offset)
+        msgs.append(msg)
+        offset = msg.end
+    return name, socket.inet_ntoa(lsr_id), msgs
+
+
+class _Batch(object):
+    __slots__ = ('kind', 'lsr_id', 'prefixes', 'prefix_lens', 'labels')
+
+    def __init__(self, kind, lsr_id):
+        self.kind = kind
+        self.lsr_id = lsr_id
+        self.prefixes = array('I')
+        self.prefix_lens = array('B')
+        self.labels = array('I')
+
+
+class ShardChannel(object):
+    """Record stream over a unix stream socket, sockets are passed
+    over fd_socket.
+    """
+
+    def __init__(self, sock, fd_socket, pid=None):
+        self._socket = sock
+        self._fd_socket = fd_socket
+        self._pid = pid
+        self._write_lock = semaphore.Semaphore()
+        self._pending = []
+        self._flush_scheduled = False
+        self.records_sent = 0
+        self.records_received = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    # The write lock is held from taking the queued bindings until the
+    # record is written, so records keep their order.
+
+    def send(self, kind, payload=b''):
+        """Sends the queued bindings and then the record."""
+        self._write_lock.acquire()
+        try:
+            self._flush()
+            self._write(kind, payload)
+        finally:
+            self._write_lock.release()
+
+    def send_socket(self, kind, payload, sock):
+        """Passes sock, then sends the record. The receiver takes the
+        socket with recv_socket() when it handles the record.
+        """
+        self._write_lock.acquire()
+        try:
+            self._flush()
+            reduction.send_handle(self._fd_socket, sock.fileno(),
+                                  self._pid)
+            self._write(kind, payload)
+        finally:
+            self._write_lock.release()
+
+    def recv_socket(self):
+        fd = reduction.recv_handle(self._fd_socket)
+        try:
+            return socket.fromfd(fd, socket.AF_INET, socket.SOCK_STREAM)
+        finally:
+            os.close(fd)
+
+    def _write(self, kind, payload):
+        data = _RECORD_HEADER.pack(kind, len(payload)) + payload
+        self._socket.sendall(data)
+        self.records_sent += 1
+        self.bytes_sent += len(data)
+
+    def queue(self, kind, lsr_id, prefixes, prefix_lens, labels=None):
+        """Queues bindings (arrays) of a BIND, UNBIND, BINDINGS or
+        WITHDRAWS record.
+        """
+        pending = self._pending
+        if pending and pending[-1].kind == kind and \
+                pending[-1].lsr_id == lsr_id:
+            batch = pending[-1]
+        else:
+            batch = _Batch(kind, lsr_id)
+            pending.append(batch)
+        batch.prefixes.extend(prefixes)
+        batch.prefix_lens.extend(prefix_lens)
+        if kind in _LABELED:
+            batch.labels.extend(labels)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            hub.spawn(self.flush)
+
+    def flush(self):
+        self._write_lock.acquire()
+        try:
+            self._flush()
+        finally:
+            self._write_lock.release()
+
+    def _flush(self):
+        self._flush_scheduled = False
+        pending = self._pending
+        self._pending = []
+        for batch in pending:
+            self._write(batch.kind, _pack_bindings(
+                batch.kind, batch.lsr_id, batch.prefixes,
+                batch.prefix_lens, batch.labels))
+
+    def recv_loop(self, handler):
+        """Calls handler(kind, payload) for each record until the other
+        side closes.
+        """
+        sock = self._socket
+        buf = bytearray()
+        while True:
+            data = sock.recv(RECV_SIZE)
+            if not data:
+                return
+            self.bytes_received += len(data)
+            buf += data
+            offset = 0
+            while len(buf) - offset >= _RECORD_HEADER.size:
+                kind, length = _RECORD_HEADER.unpack_from(buf, offset)
+                start = offset + _RECORD_HEADER.size
+                if len(buf) - start < length:
+                    break
+                payload = bytes(buf[start:start + length])
+                offset = start + length
+                self.records_received += 1
+                handler(kind, payload)
+            del buf[:offset]
+
+    def close(self):
+        self._socket.close()
+        self._fd_socket.close()
+
+
+class ShardWorker(object):
+    """The LDPManager of a worker process, runs the sessions of its
+    peers and reports to the main process.
+    """
+
+    def __init__(self, index, channel):
+        self.index = index
+        self.channel = channel
+        self.config = None
+        self.peers = {}  # key LSR-ID
+        self._added_at = {}  # key LSR-ID
+        self._active = {}  # key LSR-ID
+        self._reconnect_backoffs = {}  # key LSR-ID
+        self.decode_pool = None
+        self.io_backend = EventletBackend()
+        # sent to the main process on a STATS record
+        self.statistics = LDPStatistics()
+        self.dispatcher = MessageDispatcher(self)
+        self.distribution = DistributionEngine(self)
+        self._connector = None
+        self.dispatcher.register_callback([ldp.LDP_MSG_LABEL_MAPPING],
+                                          self._label_mapping_received)
+        self.dispatcher.register_bindings_callback(
+            self._label_bindings_received,
+            replaces=self._label_mapping_received)
+        self.dispatcher.register_callback([ldp.LDP_MSG_LABEL_WITHDRAW],
+                                          self._label_withdraw_received)
+
+    def run(self):
+        self.channel.recv_loop(self._record_received)
+        LOG.info('shard %d: main process is gone', self.index)
+
+    def send_event(self, name, ev):
+        # the message batches of the apps subscribed in the main process
+        if isinstance(ev, ldp_event.EventLDPMessageBatch):
+            self.channel.send(REC_MESSAGES, _pack_messages(
+                name, ev.peer.peer_router_id, ev.msgs))
+
+    def send_event_to_observers(self, ev):
+        if not isinstance(ev, ldp_event.EventLDPStateChanged):
+            return
+        peer = ev.peer
+        lsr_id = peer.peer_router_id
+        seconds = time.time() - self._added_at.get(lsr_id, time.time())
+        if ev.new_state == ldp_event.LDP_STATE_OPERATIONAL:
+            self._reconnect_backoffs.pop(lsr_id, None)
+            self.distribution.peer_up(peer)
+        elif ev.new_state == ldp_event.LDP_STATE_NON_EXISTENT:
+            self.distribution.peer_down(lsr_id)
+        self.channel.send(REC_STATE, _STATE.pack(
+            socket.inet_aton(lsr_id), _STATES.index(ev.new_state),
+            seconds))
+        if ev.new_state == ldp_event.LDP_STATE_NON_EXISTENT:
+            self._restart_session(peer)
+
+    def _restart_session(self, peer):
+        # The main process removes the peer when its adjacency is gone,
+        # until then a lost session is opened again as in
+        # LDPSpeaker._restart_session().
+        lsr_id = peer.peer_router_id
+        if self.peers.get(lsr_id) is not peer:
+            return
+        self._added_at[lsr_id] = time.time()
+        if not self._active[lsr_id]:
+            return
+        backoff = self._reconnect_backoffs.get(lsr_id)
+        if backoff is None:
+            backoff = self._reconnect_backoffs[lsr_id] = ConnectBackoff()
+        self._connect(peer, backoff.next_delay())
+
+    def writer_stats(self):
+        return dict((lsr_id, peer.writer_stats())
+                    for lsr_id, peer in self.peers.items())
+
+    def _record_received(self, kind, payload):
+        if kind in (REC_BIND, REC_UNBIND):
+            lsr_id, prefixes, prefix_lens, labels = \
+                _unpack_bindings(kind, payload)
+            for i in range(len(prefixes)):
+                # see fec_key()
+                fec = (prefixes[i] << 6) | prefix_lens[i]
+                if kind == REC_BIND:
+                    self.distribution.bind(fec, labels[i])
+                else:
+                    self.distribution.unbind(fec)
+        elif kind == REC_PEER_ADD:
+            lsr_id, trans_addr, is_active = _PEER.unpack(payload)
+            self._add_peer(socket.inet_ntoa(lsr_id),
+                           socket.inet_ntoa(trans_addr), is_active)
+        elif kind == REC_PEER_CONN:
+            sock = self.channel.recv_socket()
+            peer = self.peers.get(socket.inet_ntoa(payload))
+            if peer is None:
+                sock.close()
+            else:
+                hub.spawn(peer.conn_handle, sock, False)
+        elif kind == REC_PEER_REMOVE:
+            lsr_id = socket.inet_ntoa(payload)
+            peer = self.peers.pop(lsr_id, None)
+            self._added_at.pop(lsr_id, None)
+            self._active.pop(lsr_id, None)
+            self._reconnect_backoffs.pop(lsr_id, None)
+            if peer is not None:
+                peer.stop()
+                self.statistics.remove_peer(lsr_id)
+        elif kind == REC_SEND:
+            peer = self.peers.get(socket.inet_ntoa(payload[:4]))
+            if peer is None:
+                LOG.warning('shard %d: message to unknown peer %s',
+                            self.index, socket.inet_ntoa(payload[:4]))
+            else:
+                peer.send_msg(pickle.loads(payload[4:]))
+        elif kind == REC_STATS:
+            seq, index = _STATS.unpack(payload)
+            self.channel.send(REC_STATS, _STATS.pack(seq, self.index) +
+                              pickle.dumps((self.statistics,
+                                            self.writer_stats()), 2))
+        elif kind == REC_SUBSCRIBE:
+            name, msg_types = pickle.loads(payload)
+            self.dispatcher.subscribe(name, msg_types)
+        elif kind == REC_ADDRESS:
+            self.distribution.add_address(socket.inet_ntoa(payload))
+        elif kind == REC_CONFIG:
+            self.config = pickle.loads(payload)
+            self._connector = SessionConnector(self.config.router_id)
+        else:
+            LOG.warning('shard %d: unknown record %d', self.index, kind)
+
+    def _add_peer(self, lsr_id, trans_addr, is_active):
+        if lsr_id in self.peers:
+            return
+        peer = Peer(self, lsr_id, trans_addr, self.config)
+        self.peers[lsr_id] = peer
+        self._added_at[lsr_id] = time.time()
+        self._active[lsr_id] = is_active
+        if is_active:
+            self._connect(peer)
+
+    def _connect(self, peer, delay=0):
+        lsr_id = peer.peer_router_id
+        self._connector.connect(
+            (peer.trans_addr, LDP_SESSION_PORT), peer.conn_handle,
+            lambda: self.peers.get(lsr_id) is peer, delay)
+
+    def _label_mapping_received(self, peer, msg):
+        prefixes, prefix_lens, wildcard = fec_prefixes(msg.tlv(TLV_FEC))
+        label = msg.tlv(TLV_GENERIC_LABEL).label
+        self.channel.queue(REC_BINDINGS, peer.peer_router_id, prefixes,
+                           prefix_lens, [label] * len(prefixes))
+
+    def _label_bindings_received(self, peer, prefixes, prefix_lens,
+                                 labels):
+        self.channel.queue(REC_BINDINGS, peer.peer_router_id, prefixes,
+                           prefix_lens, labels)
+
+    def _label_withdraw_received(self, peer, msg):
+        prefixes, prefix_lens, wildcard = fec_prefixes(msg.tlv(TLV_FEC))
+        if wildcard:
+            # sent after the queued bindings of the peer
+            self.channel.send(REC_PURGE,
+                              socket.inet_aton(peer.peer_router_id))
+        else:
+            self.channel.queue(REC_WITHDRAWS, peer.peer_router_id,
+                               prefixes, prefix_lens)
+
+
+def _inherited_socket(fd):
+    sock = socket.fromfd(fd, socket.AF_UNIX, socket.SOCK_STREAM)
+    os.close(fd)
+    return sock
+
+
+def worker_main(argv):
+    """Entry point of a worker process, argv is the index and the
+    descriptors of the record and the fd socket.
+    """
+    hub.patch(thread=False)
+    index, channel_fd, fd_socket_fd = [int(arg) for arg in argv]
+    channel = ShardChannel(_inherited_socket(channel_fd),
+                           _inherited_socket(fd_socket_fd))
+    ShardWorker(index, channel).run()
+
+
+class ShardPeer(object):
+    """A peer of a worker as the main process sees it, the peer of the
+    events to the applications.
+    """
+
+    def __init__(self, shards, peer_router_id, trans_addr):
+        self._shards = shards
+        self.peer_router_id = peer_router_id
+        self.trans_addr = trans_addr
+        self.name = Peer._instance_name(peer_router_id, 0)
+        self.state = ldp_event.LDP_STATE_NON_EXISTENT
+
+    def send_msg(self, msg):
+        self._shards.send_message(self.peer_router_id, msg)
+
+
+class ShardManager(object):
+    """The main process side of the workers.
+
+    handler gets the reports of the workers:
+        shard_state_changed(lsr_id, old_state, new_state, seconds)
+        shard_bindings(lsr_id, prefixes, prefix_lens, labels)
+        shard_withdraws(lsr_id, prefixes, prefix_lens)
+        shard_messages(app_name, lsr_id, msgs)
+    """
+
+    @staticmethod
+    def is_supported():
+        return hasattr(socket, 'AF_UNIX') and \
+            hasattr(reduction, 'send_handle')
+
+    def __init__(self, conf, count, handler):
+        self.config = conf
+        self.count = count
+        self._handler = handler
+        self._channels = []
+        self._processes = []
+        self._threads = []
+        self.peers = {}  # key LSR-ID, value ShardPeer
+        self._stats_lock = semaphore.Semaphore()
+        self._stats_event = hub.Event()
+        self._stats_seq = 0
+        self._stats_replies = {}  # key worker index
+
+    def start(self, bindings=(), addresses=(), subscriptions=()):
+        """Starts the workers and sends them the local bindings
+        (fec, label), addresses and the subscriptions
+        (app name, msg types) of the apps.
+        """
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(sys.path)
+        config = pickle.dumps(self.config, 2)
+        for index in range(self.count):
+            parent, child = socket.socketpair()
+            fd_parent, fd_child = socket.socketpair()
+            for sock in (child, fd_child):
+                if hasattr(sock, 'set_inheritable'):
+                    sock.set_inheritable(True)
+            process = subprocess.Popen(
+                [sys.executable, '-m', __name__, str(index),
+                 str(child.fileno()), str(fd_child.fileno())],
+                close_fds=False, env=env)
+            child.close()
+            fd_child.close()
+            channel = ShardChannel(parent, fd_parent, process.pid)
+            channel.send(REC_CONFIG, config)
+            self._channels.append(channel)
+            self._processes.append(process)
+            self._threads.append(hub.spawn(channel.recv_loop,
+                                           self._record_received))
+        for addr in addresses:
+            self.add_address(addr)
+        for fec, label in bindings:
+            self.bind(fec, label)
+        for name, msg_types in subscriptions:
+            self.subscribe(name, msg_types)
+
+    def stop(self):
+        for thread in self._threads:
+            hub.kill(thread)
+        for channel in self._channels:
+            channel.close()
+        # a worker exits when its channel is closed
+        for process in self._processes:
+            if process.poll() is None:
+                hub.sleep(STOP_TIMEOUT)
+            if process.poll() is None:
+                process.terminate()
+            process.wait()
+        self._threads = []
+        self._channels = []
+        self._processes = []
+
+    def _channel(self, lsr_id):
+        return self._channels[shard_of(lsr_id, self.count)]
+
+    def has_peer(self, lsr_id):
+        return lsr_id in self.peers
+
+    def add_peer(self, lsr_id, trans_addr, is_active):
+        self.peers[lsr_id] = ShardPeer(self, lsr_id, trans_addr)
+        self._channel(lsr_id).send(REC_PEER_ADD, _PEER.pack(
+            socket.inet_aton(lsr_id), socket.inet_aton(trans_addr),
+            is_active))
+
+    def remove_peer(self, lsr_id):
+        """Returns the transport address of the removed peer."""
+        peer = self.peers.pop(lsr_id, None)
+        if peer is None:
+            return None
+        self._channel(lsr_id).send(REC_PEER_REMOVE,
+                                   socket.inet_aton(lsr_id))
+        return peer.trans_addr
+
+    def send_message(self, lsr_id, msg):
+        """Sends msg, a message object or a message serialized without
+        PDU header, through the worker of the peer.
+        """
+        if lsr_id not in self.peers:
+            raise KeyError(lsr_id)
+        if isinstance(msg, memoryview):
+            msg = msg.tobytes()
+        self._channel(lsr_id).send(
+            REC_SEND, socket.inet_aton(lsr_id) + pickle.dumps(msg, 2))
+
+    def subscribe(self, name, msg_types):
+        """The workers send the messages of msg_types to the app name."""
+        payload = pickle.dumps((name, list(msg_types)), 2)
+        for channel in self._channels:
+            channel.send(REC_SUBSCRIBE, payload)
+
+    def conn_handler(self, lsr_id):
+        """Returns a conn_handle for SessionAcceptor.register() which
+        passes the session socket to the worker of the peer.
+        """
+        def _conn_handle(sock, is_active):
+            try:
+                self._channel(lsr_id).send_socket(
+                    REC_PEER_CONN, socket.inet_aton(lsr_id), sock)
+            finally:
+                sock.close()
+        return _conn_handle
+
+    def bind(self, fec, label):
+        for channel in self._channels:
+            channel.queue(REC_BIND, _NO_LSR, (fec >> 6, ), (fec & 0x3f, ),
+                          (label, ))
+
+    def unbind(self, fec):
+        for channel in self._channels:
+            channel.queue(REC_UNBIND, _NO_LSR, (fec >> 6, ), (fec & 0x3f, ))
+
+    def add_address(self, addr):
+        for channel in self._channels:
+            channel.send(REC_ADDRESS, socket.inet_aton(addr))
+
+    def _record_received(self, kind, payload):
+        handler = self._handler
+        if kind == REC_STATE:
+            lsr_id, state, seconds = _STATE.unpack(payload)
+            lsr_id = socket.inet_ntoa(lsr_id)
+            peer = self.peers.get(lsr_id)
+            old_state = None
+            if peer is not None:
+                old_state = peer.state
+                peer.state = _STATES[state]
+            handler.shard_state_changed(lsr_id, old_state, _STATES[state],
+                                        seconds)
+        elif kind in (REC_BINDINGS, REC_WITHDRAWS):
+            lsr_id, prefixes, prefix_lens, labels = \
+                _unpack_bindings(kind, payload)
+            if kind == REC_BINDINGS:
+                handler.shard_bindings(lsr_id, prefixes, prefix_lens,
+                                       labels)
+            else:
+                handler.shard_withdraws(lsr_id, prefixes, prefix_lens)
+        elif kind == REC_PURGE:
+            handler.shard_purge(socket.inet_ntoa(payload))
+        elif kind == REC_MESSAGES:
+            handler.shard_messages(*_unpack_messages(payload))
+        elif kind == REC_STATS:
+            seq, index = _STATS.unpack_from(payload)
+            if seq == self._stats_seq:
+                self._stats_replies[index] = pickle.loads(
+                    payload[_STATS.size:])
+                if len(self._stats_replies) == len(self._channels):
+                    self._stats_event.set()
+        else:
+            LOG.warning('unknown record %d from a shard', kind)
+
+    def _collect_stats(self):
+        """Returns the (LDPStatistics, writer stats) of the workers
+        which replied within STATS_TIMEOUT.
+        """
+        self._stats_lock.acquire()
+        try:
+            self._stats_seq += 1
+            self._stats_replies = {}
+            self._stats_event.clear()
+            for index, channel in enumerate(self._channels):
+                channel.send(REC_STATS, _STATS.pack(self._stats_seq, index))
+            if self._channels and \
+                    not self._stats_event.wait(STATS_TIMEOUT):
+                LOG.warning('%d of %d shards sent no statistics',
+                            len(self._channels) - len(self._stats_replies),
+                            len(self._channels))
+            return list(self._stats_replies.values())
+        finally:
+            self._stats_lock.release()
+
+    def statistics(self):
+        """Returns the LDPStatistics of the peers of all workers."""
+        statistics = LDPStatistics()
+        for worker_statistics, writer_stats in self._collect_stats():
+            statistics.merge(worker_statistics)
+        return statistics
+
+    def writer_stats(self):
+        stats = {}
+        for worker_statistics, writer_stats in self._collect_stats():
+            stats.update(writer_stats)
+        return stats
+
+    def stats(self):
+        shards = []
+        for index, channel in enumerate(self._channels):
+            shards.append({
+                'peers': sum(1 for lsr_id in self.peers
+                             if shard_of(lsr_id, self.count) == index),
+                'records_sent': channel.records_sent,
+                'records_received': channel.records_received,
+                'bytes_sent': channel.bytes_sent,
+                'bytes_received': channel.bytes_received,
+                'alive': self._processes[index].poll() is None})
+        return {'workers': self.count, 'shards': shards}
+
+
+if __name__ == '__main__':
+    worker_main(sys.argv[1:])
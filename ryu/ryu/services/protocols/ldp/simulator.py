@@ -0,0 +1,444 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Neighbour simulator and load generator for LDPManager.
+
+Emulates count LSRs with consecutive addresses from base_address, each
+an LDPSpeaker with its own hellos, session and label bindings, against
+one LDPManager on the same box. The manager disables multicast loopback,
+so the simulated LSRs do not hear its hellos. They are given its LSR-ID
+and open the session as they would after its hello, active if their
+LSR-ID is the higher one. Their own hellos are looped back to the
+manager.
+
+Phases:
+    setup       hellos and sessions, each LSR advertises its labels
+                when the session is up; converged once all sessions
+                are operational, every LSR sent all of its labels and
+                the bindings learned from the manager did not change
+                for settle seconds
+    withdraw    each LSR withdraws withdraw_fraction of its labels
+    churn       for duration seconds, each churn_interval a fraction
+                of the LSRs closes its TCP session and keeps sending
+                hellos, or loses its hellos for longer than the hold
+                time
+
+After a flap the adjacencies stay up and the active side opens a new
+session, see LDPSpeaker._restart_session(). The LSRs which are not
+operational at the end of a phase are listed in its not_operational.
+
+Setup, e.g. with the manager on 10.0.0.1 of a dummy interface:
+    ip link add ldp0 type dummy
+    ip link set ldp0 multicast on up
+    ip addr add 10.0.0.1/16 dev ldp0
+    for i in $(seq 1 100); do
+        ip addr add 10.0.1.$i/16 dev ldp0; done
+
+Usage:
+PYTHONPATH=. python -m ryu.services.protocols.ldp.simulator \\
+    --manager 10.0.0.1 --base-address 10.0.1.1 --count 100 \\
+    --labels 1000 --duration 60 --manager-pid $(pgrep -f ryu-manager)
+
+The report is printed as one JSON document.
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import socket
+import struct
+import sys
+import time
+
+from ryu.lib import hub
+from ryu.services.protocols.ldp import event as ldp_event
+from ryu.services.protocols.ldp import ldp_util
+from ryu.services.protocols.ldp.backend import EventletBackend
+from ryu.services.protocols.ldp.interface import LDPInterface
+from ryu.services.protocols.ldp.session import LDP_SESSION_PORT
+from ryu.services.protocols.ldp.speaker import LDPSpeaker
+
+LOG = logging.getLogger('ldp.simulator')
+
+DEFAULT_HOLD_TIME = 15
+DEFAULT_SETTLE = 2.0
+DEFAULT_TIMEOUT = 600
+POLL_INTERVAL = 0.1
+# advertised prefixes are /24s from here on, distinct per LSR
+LABEL_PREFIX_BASE = 0x14000000  # 20.0.0.0
+LABEL_PREFIX_LEN = 24
+
+
+class HelloSender(object):
+    """Discovery server of a simulated LSR, sends its hellos from its
+    address and drops them while muted.
+    """
+
+    def __init__(self, ip_address):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF,
+                        socket.inet_aton(ip_address))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        sock.bind((ip_address, 0))
+        self.socket = sock
+        self.muted_until = 0
+        self.sent = 0
+        self.dropped = 0
+
+    def start(self, handler):
+        # the hellos of the manager are not looped back
+        pass
+
+    def stop(self):
+        self.socket.close()
+
+    def mute(self, seconds):
+        self.muted_until = max(self.muted_until, time.time() + seconds)
+
+    def sendto(self, data, addr):
+        if time.time() < self.muted_until:
+            self.dropped += 1
+            return
+        self.socket.sendto(data, addr)
+        self.sent += 1
+
+
+class SimulatedLSR(LDPSpeaker):
+    """An LSR with one neighbour, the manager."""
+
+    def __init__(self, config, manager_id, manager_address,
+                 io_backend=None):
+        super(SimulatedLSR, self).__init__(config, io_backend)
+        self.manager_id = manager_id
+        self.manager_address = manager_address
+        self.is_active = ldp_util.from_inet_ptoi(manager_id) < \
+            ldp_util.from_inet_ptoi(config.router_id)
+        self.hellos = HelloSender(config.router_id)
+        self.session_ups = 0
+        self.session_downs = 0
+        self.up_at = None
+        self.down_at = None
+        self.recovery_times = []
+
+    def start(self):
+        super(SimulatedLSR, self).start()
+        router_id = self.config.router_id
+        self._acceptor = self.io_backend.create_acceptor(
+            (router_id, LDP_SESSION_PORT), self.session_setup)
+        self._connector = self.io_backend.create_connector(
+            router_id, self.session_setup)
+        self._acceptor.start()
+        interface = LDPInterface(self, self.hellos, self.config)
+        self.interfaces[router_id] = interface
+        self.distribution.add_address(router_id)
+        interface.start()
+        # as after the first hello of the manager
+        self._add_peer(self.manager_id, self.manager_address,
+                       self.is_active)
+
+    def _has_adjacency(self, lsr_id):
+        # the hellos of the manager are not heard, its adjacency is
+        # taken for granted
+        return lsr_id == self.manager_id
+
+    @property
+    def operational(self):
+        peer = self.peers.get(self.manager_id)
+        return peer is not None and \
+            peer.state == ldp_event.LDP_STATE_OPERATIONAL
+
+    def advertised(self):
+        """True once all labels and withdraws are on the wire."""
+        peer = self.peers.get(self.manager_id)
+        if peer is None:
+            return False
+        stats = self.distribution.stats()
+        writer = peer.writer_stats()
+        return (not stats['syncing'] and not stats['pending'] and
+                writer is not None and not writer['bytes_pending'])
+
+    def learned(self):
+        return self.info_base.peer_count(self.manager_id)
+
+    def ldp_state_change(self, ev):
+        super(SimulatedLSR, self).ldp_state_change(ev)
+        if ev.peer.peer_router_id != self.manager_id:
+            return
+        now = time.time()
+        if ev.new_state == ldp_event.LDP_STATE_OPERATIONAL:
+            self.session_ups += 1
+            self.up_at = now
+            if self.down_at is not None:
+                self.recovery_times.append(now - self.down_at)
+        elif ev.new_state == ldp_event.LDP_STATE_NON_EXISTENT and \
+                ev.old_state == ldp_event.LDP_STATE_OPERATIONAL:
+            self.session_downs += 1
+            self.down_at = now
+
+    def lose_hellos(self, seconds):
+        """Sends no hellos for seconds, the manager ends the session if
+        they exceed its hold time.
+        """
+        self.hellos.mute(seconds)
+
+    def flap(self):
+        """Closes the TCP session, the hellos go on."""
+        peer = self.peers.get(self.manager_id)
+        if peer is not None:
+            peer.stop()
+
+
+class ProcessCPU(object):
+    """CPU time of a process from /proc."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self._ticks = os.sysconf('SC_CLK_TCK')
+
+    def seconds(self):
+        with open('/proc/%d/stat' % self.pid) as f:
+            # the fields after the command, which may contain spaces
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / float(self._ticks)
+
+
+def _labels(index, count):
+    for i in range(count):
+        prefix = LABEL_PREFIX_BASE + ((index * count + i) << 8)
+        yield socket.inet_ntoa(struct.pack('!I', prefix)), LABEL_PREFIX_LEN
+
+
+class Simulator(object):
+    def __init__(self, manager_id, base_address, count,
+                 manager_address=None, labels=0, withdraw_fraction=0.0,
+                 duration=0, churn_interval=5.0, flap_fraction=0.0,
+                 hello_loss_fraction=0.0, hold_time=DEFAULT_HOLD_TIME,
+                 start_rate=0, settle=DEFAULT_SETTLE,
+                 timeout=DEFAULT_TIMEOUT, manager_pid=None, seed=None):
+        self.manager_id = manager_id
+        self.manager_address = manager_address or manager_id
+        self.base_address = base_address
+        self.count = count
+        self.labels = labels
+        self.withdraw_fraction = withdraw_fraction
+        self.duration = duration
+        self.churn_interval = churn_interval
+        self.flap_fraction = flap_fraction
+        self.hello_loss_fraction = hello_loss_fraction
+        self.hold_time = hold_time
+        # LSRs started per second, 0 starts all at once
+        self.start_rate = start_rate
+        self.settle = settle
+        self.timeout = timeout
+        self.cpu = ProcessCPU(manager_pid) if manager_pid else None
+        self._random = random.Random(seed)
+        self.io_backend = EventletBackend()
+        self.lsrs = []
+
+    def _create_lsrs(self):
+        base = ldp_util.from_inet_ptoi(self.base_address)
+        for index in range(self.count):
+            router_id = socket.inet_ntoa(struct.pack('!I', base + index))
+            config = ldp_event.LDPConfig(router_id=router_id,
+                                         hold_time=self.hold_time)
+            lsr = SimulatedLSR(config, self.manager_id,
+                               self.manager_address, self.io_backend)
+            for prefix, prefix_len in _labels(index, self.labels):
+                lsr.bind_local_label(prefix, prefix_len)
+            self.lsrs.append(lsr)
+
+    def _wait(self, predicate):
+        """Returns the time predicate() became True, None on timeout."""
+        deadline = time.time() + self.timeout
+        while not predicate():
+            if time.time() > deadline:
+                return None
+            hub.sleep(POLL_INTERVAL)
+        return time.time()
+
+    def _wait_converged(self):
+        def _sent():
+            return all(lsr.operational and lsr.advertised()
+                       for lsr in self.lsrs)
+        if self._wait(_sent) is None:
+            return None
+        # the labels of the manager, the last change is the convergence
+        learned = None
+        changed_at = time.time()
+        while time.time() - changed_at < self.settle:
+            now_learned = [lsr.learned() for lsr in self.lsrs]
+            if now_learned != learned:
+                learned = now_learned
+                changed_at = time.time()
+            hub.sleep(POLL_INTERVAL)
+        return changed_at
+
+    def _cpu_seconds(self):
+        return self.cpu.seconds() if self.cpu is not None else None
+
+    def _phase(self, start, end, cpu_start):
+        phase = {'seconds': end - start if end is not None else None,
+                 'converged': end is not None,
+                 'not_operational': [lsr.config.router_id
+                                     for lsr in self.lsrs
+                                     if not lsr.operational]}
+        if phase['not_operational']:
+            LOG.warning('%d LSRs are not operational',
+                        len(phase['not_operational']))
+        if self.cpu is not None:
+            cpu = self.cpu.seconds() - cpu_start
+            phase['manager_cpu_seconds'] = cpu
+            phase['manager_cpu_percent'] = \
+                100.0 * cpu / (time.time() - start)
+        return phase
+
+    def run_setup(self):
+        self._create_lsrs()
+        start = time.time()
+        cpu_start = self._cpu_seconds()
+        for lsr in self.lsrs:
+            lsr.start()
+            if self.start_rate:
+                hub.sleep(1.0 / self.start_rate)
+        converged_at = self._wait_converged()
+        report = self._phase(start, converged_at, cpu_start)
+        setups = [lsr.up_at - start for lsr in self.lsrs
+                  if lsr.up_at is not None]
+        report['sessions'] = len(setups)
+        report['active_sessions'] = sum(1 for lsr in self.lsrs
+                                        if lsr.is_active)
+        if setups:
+            report['session_setup_rate'] = len(setups) / max(setups)
+            report['session_setup_avg'] = sum(setups) / len(setups)
+            report['session_setup_max'] = max(setups)
+        report['labels_sent'] = self.labels * self.count
+        report['labels_learned'] = sum(lsr.learned() for lsr in self.lsrs)
+        return report
+
+    def run_withdraw(self):
+        withdraws = int(self.labels * self.withdraw_fraction)
+        start = time.time()
+        cpu_start = self._cpu_seconds()
+        for index, lsr in enumerate(self.lsrs):
+            for prefix, prefix_len in _labels(index, withdraws):
+                lsr.unbind_local_label(prefix, prefix_len)
+        done_at = self._wait_converged()
+        report = self._phase(start, done_at, cpu_start)
+        report['labels_withdrawn'] = withdraws * self.count
+        return report
+
+    def run_churn(self):
+        start = time.time()
+        cpu_start = self._cpu_seconds()
+        flaps = hello_losses = 0
+        # longer than the hold time, so the manager drops the adjacency
+        mute = self.hold_time + 1
+        while time.time() - start < self.duration:
+            for lsr in self.lsrs:
+                r = self._random.random()
+                if r < self.flap_fraction:
+                    lsr.flap()
+                    flaps += 1
+                elif r < self.flap_fraction + self.hello_loss_fraction:
+                    lsr.lose_hellos(mute)
+                    hello_losses += 1
+            hub.sleep(self.churn_interval)
+        recovered_at = self._wait_converged()
+        report = self._phase(start, recovered_at, cpu_start)
+        recoveries = [t for lsr in self.lsrs for t in lsr.recovery_times]
+        report.update({'flaps': flaps, 'hello_losses': hello_losses,
+                       'session_downs': sum(lsr.session_downs
+                                            for lsr in self.lsrs),
+                       'recoveries': len(recoveries)})
+        if recoveries:
+            report['recovery_avg'] = sum(recoveries) / len(recoveries)
+            report['recovery_max'] = max(recoveries)
+        return report
+
+    def run(self):
+        report = {'lsrs': self.count, 'labels_per_lsr': self.labels}
+        try:
+            report['setup'] = self.run_setup()
+            if self.withdraw_fraction and report['setup']['converged']:
+                report['withdraw'] = self.run_withdraw()
+            if self.duration:
+                report['churn'] = self.run_churn()
+        finally:
+            self.stop()
+        return report
+
+    def stop(self):
+        # the interface of an LSR closes its hello socket
+        for lsr in self.lsrs:
+            lsr.stop()
+        self.io_backend.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='LDP neighbour simulator and load generator')
+    parser.add_argument('--manager', required=True,
+                        help='LSR-ID of the manager')
+    parser.add_argument('--manager-address',
+                        help='transport address of the manager, default '
+                        'its LSR-ID')
+    parser.add_argument('--base-address', required=True,
+                        help='address and LSR-ID of the first LSR')
+    parser.add_argument('--count', type=int, default=10)
+    parser.add_argument('--labels', type=int, default=0,
+                        help='labels advertised by each LSR')
+    parser.add_argument('--withdraw-fraction', type=float, default=0.0)
+    parser.add_argument('--duration', type=float, default=0,
+                        help='seconds of churn')
+    parser.add_argument('--churn-interval', type=float, default=5.0)
+    parser.add_argument('--flap-fraction', type=float, default=0.0,
+                        help='LSRs flapping per churn interval')
+    parser.add_argument('--hello-loss-fraction', type=float, default=0.0,
+                        help='LSRs losing their hellos per churn interval')
+    parser.add_argument('--hold-time', type=int, default=DEFAULT_HOLD_TIME)
+    parser.add_argument('--start-rate', type=float, default=0,
+                        help='LSRs started per second, default all at once')
+    parser.add_argument('--settle', type=float, default=DEFAULT_SETTLE)
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument('--manager-pid', type=int)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    hub.patch(thread=False)
+    logging.basicConfig(level=logging.WARNING)
+    simulator = Simulator(
+        args.manager, args.base_address, args.count,
+        manager_address=args.manager_address, labels=args.labels,
+        withdraw_fraction=args.withdraw_fraction, duration=args.duration,
+        churn_interval=args.churn_interval,
+        flap_fraction=args.flap_fraction,
+        hello_loss_fraction=args.hello_loss_fraction,
+        hold_time=args.hold_time, start_rate=args.start_rate,
+        settle=args.settle, timeout=args.timeout,
+        manager_pid=args.manager_pid, seed=args.seed)
+    report = simulator.run()
+    sys.stdout.write(json.dumps(report, indent=2, sort_keys=True) + '\n')
+    converged = all(report[phase]['converged']
+                    for phase in ('setup', 'withdraw', 'churn')
+                    if phase in report)
+    return 0 if converged else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
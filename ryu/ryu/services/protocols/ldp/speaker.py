@@ -0,0 +1,386 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Discovery, sessions and label distribution of one LSR.
+
+LDPSpeaker runs on the io backend it is given, see backend.py, and needs
+no Ryu application manager, e.g. on asyncio:
+
+    loop = aio.new_event_loop()
+    speaker = LDPSpeaker(LDPConfig(router_id='1.1.1.1'),
+                         aio.AsyncioBackend(loop))
+    speaker.add_interface(LDPInterfaceConf('10.0.0.1', 'eth0'))
+    speaker.start()
+    loop.run_forever()
+
+LDPManager runs it as a Ryu application on eventlet.
+"""
+
+import logging
+
+from ryu.services.protocols.ldp import event as ldp_event
+from ryu.services.protocols.ldp import ldp_util
+from ryu.services.protocols.ldp.adjacency import AdjacencyTable
+from ryu.services.protocols.ldp.adjacency import negotiate_hold_time
+from ryu.services.protocols.ldp.backend import EventletBackend
+from ryu.services.protocols.ldp.dispatch import MessageDispatcher
+from ryu.services.protocols.ldp.distribution import DistributionEngine
+from ryu.services.protocols.ldp.fec_index import FecIndex
+from ryu.services.protocols.ldp.hello import HelloCache
+from ryu.services.protocols.ldp.hello import hello_params
+from ryu.services.protocols.ldp.info_base import LabelInformationBase
+from ryu.services.protocols.ldp.info_base import fec_key
+from ryu.services.protocols.ldp.interface import LDPInterface
+from ryu.services.protocols.ldp.label_allocator import LabelAllocator
+from ryu.services.protocols.ldp.message_view import TLV_FEC
+from ryu.services.protocols.ldp.message_view import TLV_GENERIC_LABEL
+from ryu.services.protocols.ldp.message_view import fec_prefixes
+from ryu.services.protocols.ldp.peer import Peer
+from ryu.services.protocols.ldp.probe import DEFAULT_SAMPLE_EVERY
+from ryu.services.protocols.ldp.probe import profiler
+from ryu.services.protocols.ldp.session import ConnectBackoff
+from ryu.services.protocols.ldp.session import LDP_SESSION_PORT
+from ryu.services.protocols.ldp.session import SessionSetupStats
+from ryu.services.protocols.ldp.stats import LDPStatistics
+
+from ryu.lib.packet import ldp
+
+LOG = logging.getLogger('ldp.speaker')
+
+ADJACENCY_SWEEP_INTERVAL = 1
+
+
+class LDPSpeaker(object):
+    name = ldp_event.LDP_MANAGER_NAME
+
+    def __init__(self, config=None, io_backend=None):
+        # LDPManager is a RyuApp first, RyuApp.__init__ calls this
+        # without arguments and its send_event*() take precedence.
+        super(LDPSpeaker, self).__init__()
+        self.config = config
+        self.io_backend = io_backend or EventletBackend()
+        # for adjacency hold times and session setup times
+        self._clock = ldp_util.get_clock()
+        self.interfaces = {}
+        self.peers = {}  # key peer router_id
+        self._reconnect_backoffs = {}  # key peer router_id
+        self.adjacencies = AdjacencyTable(self._adjacency_expired,
+                                          self._clock.time)
+        self.hello_cache = HelloCache()
+        self.dispatcher = MessageDispatcher(self)
+        self.info_base = LabelInformationBase()
+        self.fec_index = FecIndex()
+        self.label_allocator = LabelAllocator()
+        self.distribution = DistributionEngine(self)
+        self.session_setup = SessionSetupStats()
+        self.statistics = LDPStatistics()
+        self.decode_pool = None
+        self._acceptor = None
+        self._connector = None
+        self._state_observers = []
+        self._subscriber_handlers = {}  # key subscriber name
+        self.dispatcher.register_callback([ldp.LDP_MSG_LABEL_MAPPING],
+                                          self._label_mapping_received)
+        self.dispatcher.register_bindings_callback(
+            self._label_bindings_received,
+            replaces=self._label_mapping_received)
+        self.dispatcher.register_callback([ldp.LDP_MSG_LABEL_WITHDRAW],
+                                          self._label_withdraw_received)
+        self._adjacency_sweeper = self.io_backend.create_looping_call(
+            self.adjacencies.sweep)
+
+    def start(self):
+        self._adjacency_sweeper.start(ADJACENCY_SWEEP_INTERVAL, now=False)
+
+    def stop(self):
+        self._adjacency_sweeper.stop()
+        for interface in self.interfaces.values():
+            interface.stop()
+        # no new sessions for the peers closed here
+        peers = list(self.peers.values())
+        self.peers.clear()
+        for peer in peers:
+            peer.stop()
+        if self._acceptor is not None:
+            self._acceptor.stop()
+            self._acceptor = None
+        self.io_backend.stop()
+
+    def add_interface(self, iface_conf):
+        """Starts discovery on the interface, returns its
+        LDPInterface.
+        """
+        if self._acceptor is None:
+            self._acceptor = self.io_backend.create_acceptor(
+                (self.config.router_id, LDP_SESSION_PORT),
+                self.session_setup)
+            self._connector = self.io_backend.create_connector(
+                self.config.router_id, self.session_setup)
+            self._acceptor.start()
+        server = self.io_backend.create_discover_server(iface_conf)
+        interface = LDPInterface(self, server, self.config)
+        self.interfaces[iface_conf.device_name] = interface
+        self.distribution.add_address(iface_conf.ip_address)
+        #TODO: delay timer
+        interface.start()
+        return interface
+
+    def subscribe(self, name, msg_types, handler):
+        """handler(ev) gets the EventLDPMessageBatch of msg_types."""
+        self._subscriber_handlers[name] = handler
+        self.dispatcher.subscribe(name, msg_types)
+
+    def add_state_observer(self, observer):
+        """observer(ev) gets every EventLDPStateChanged."""
+        self._state_observers.append(observer)
+
+    def send_event(self, name, ev):
+        # hellos of the interfaces to self, message batches to the
+        # subscribers, each in its own turn as through an event queue
+        if name == self.name:
+            if isinstance(ev, ldp_event.EventHelloReceived):
+                self.io_backend.spawn(self.hello_received, ev)
+            return
+        handler = self._subscriber_handlers.get(name)
+        if handler is not None:
+            self.io_backend.spawn(handler, ev)
+
+    def send_event_to_observers(self, ev):
+        if isinstance(ev, ldp_event.EventLDPStateChanged):
+            self.io_backend.spawn(self.ldp_state_change, ev)
+            for observer in self._state_observers:
+                self.io_backend.spawn(observer, ev)
+
+    def hello_received(self, ev):
+        interface = ev.interface
+        hello = ev.hello
+        peer_router_id = hello.lsr_id
+        key = (interface, peer_router_id, hello.label_space_id)
+        adj = self.adjacencies.get(key)
+        hold_time = negotiate_hold_time(self.config.hold_time,
+                                        hello.hold_time, hello.t_bit)
+        params = hello_params(ev.packet)
+        if adj is not None and adj.hold_time == hold_time and \
+                adj.trans_addr == hello.trans_addr:
+            # e.g. an optional TLV changed, the fast path of the
+            # interface compares the new parameters from now on
+            adj.hello_params = params
+            self.adjacencies.refresh(key)
+            return
+        self.adjacencies.add(interface, peer_router_id,
+                             hello.label_space_id, hello.trans_addr,
+                             hold_time, params)
+        self._add_peer(peer_router_id, hello.trans_addr,
+                       self._is_active(peer_router_id))
+
+    def _is_active(self, lsr_id):
+        # the LSR with the higher LSR-ID opens the session
+        return ldp_util.from_inet_ptoi(lsr_id) < \
+            ldp_util.from_inet_ptoi(self.config.router_id)
+
+    def _add_peer(self, lsr_id, trans_addr, is_active):
+        if lsr_id not in self.peers:
+            peer = Peer(self, lsr_id, trans_addr, self.config)
+            self.peers[lsr_id] = peer
+            self._start_session(is_active, peer)
+
+    def _start_session(self, is_active, peer, delay=0):
+        handle = self.io_backend.session_handle(peer)
+        if is_active:
+            self._connector.connect(
+                (peer.trans_addr, LDP_SESSION_PORT), handle,
+                lambda: self.peers.get(peer.peer_router_id) is peer,
+                delay)
+        else:
+            # connections from the peer come in on the shared acceptor
+            self._acceptor.register(peer.trans_addr, handle)
+
+    def _adjacency_expired(self, adj):
+        if self.adjacencies.has_lsr(adj.lsr_id):
+            return
+        # The last hello adjacency is gone, so is the session.
+        self._remove_peer(adj.lsr_id)
+
+    def _remove_peer(self, lsr_id):
+        peer = self.peers.pop(lsr_id, None)
+        self._reconnect_backoffs.pop(lsr_id, None)
+        if peer is not None:
+            self._acceptor.unregister(peer.trans_addr)
+            peer.stop()
+            self.statistics.remove_peer(lsr_id)
+
+    def ldp_state_change(self, ev):
+        if ev.new_state == ldp_event.LDP_STATE_OPERATIONAL:
+            self.session_setup.record_setup(
+                self._clock.time() - ev.peer.created_at)
+            self._reconnect_backoffs.pop(ev.peer.peer_router_id, None)
+            self.distribution.peer_up(ev.peer)
+        elif ev.new_state == ldp_event.LDP_STATE_NON_EXISTENT:
+            lsr_id = ev.peer.peer_router_id
+            self.distribution.peer_down(lsr_id)
+            self._purge_peer(lsr_id)
+            self._restart_session(ev.peer)
+
+    def _restart_session(self, peer):
+        # The session is gone but the hello adjacency is not, so a new
+        # session is opened. The passive side stays registered on the
+        # acceptor, the active side connects again after a backoff that
+        # grows until a session becomes operational.
+        lsr_id = peer.peer_router_id
+        if self.peers.get(lsr_id) is not peer or \
+                not self._has_adjacency(lsr_id):
+            return
+        peer.created_at = self._clock.time()
+        if not self._is_active(lsr_id):
+            return
+        backoff = self._reconnect_backoffs.get(lsr_id)
+        if backoff is None:
+            backoff = self._reconnect_backoffs[lsr_id] = ConnectBackoff()
+        self._start_session(True, peer, backoff.next_delay())
+
+    def _has_adjacency(self, lsr_id):
+        return self.adjacencies.has_lsr(lsr_id)
+
+    def _purge_peer(self, lsr_id):
+        for fec, label in self.info_base.binding_keys(lsr_id):
+            # see fec_key()
+            self.fec_index.release_int(fec >> 6, fec & 0x3f)
+        self.info_base.purge_peer(lsr_id)
+
+    def _label_mapping_received(self, peer, msg):
+        # a wildcard names no binding, it is skipped
+        prefixes, prefix_lens, wildcard = fec_prefixes(msg.tlv(TLV_FEC))
+        label = msg.tlv(TLV_GENERIC_LABEL).label
+        self._add_bindings(peer.peer_router_id, prefixes, prefix_lens,
+                           [label] * len(prefixes))
+
+    def _label_bindings_received(self, peer, prefixes, prefix_lens, labels):
+        self._add_bindings(peer.peer_router_id, prefixes, prefix_lens,
+                           labels)
+
+    def _add_bindings(self, lsr_id, prefixes, prefix_lens, labels):
+        for i in range(len(labels)):
+            prefix = prefixes[i]
+            prefix_len = prefix_lens[i]
+            # see fec_key()
+            if self.info_base.add_key(lsr_id, (prefix << 6) | prefix_len,
+                                      labels[i]):
+                self.fec_index.add_ref_int(prefix, prefix_len)
+
+    def _label_withdraw_received(self, peer, msg):
+        prefixes, prefix_lens, wildcard = fec_prefixes(msg.tlv(TLV_FEC))
+        if wildcard:
+            # RFC 5036 3.4.1, all bindings of the peer are withdrawn
+            self._purge_peer(peer.peer_router_id)
+        else:
+            self._withdraw_bindings(peer.peer_router_id, prefixes,
+                                    prefix_lens)
+
+    def _withdraw_bindings(self, lsr_id, prefixes, prefix_lens):
+        for i in range(len(prefixes)):
+            prefix = prefixes[i]
+            prefix_len = prefix_lens[i]
+            # the value of a FEC in fec_index counts the peers bound to
+            # it; see fec_key()
+            if self.info_base.withdraw_key(
+                    lsr_id, (prefix << 6) | prefix_len) is not None:
+                self.fec_index.release_int(prefix, prefix_len)
+
+    def resolve_fec(self, addr):
+        """Returns (prefix, prefix_len, [(lsr_id, label)]) of the longest
+        FEC matching addr, or None. Used for forwarding resolution and
+        to answer LSP ping.
+        """
+        found = self.fec_index.lookup(addr)
+        if found is None:
+            return None
+        prefix, prefix_len, value = found
+        return prefix, prefix_len, self.info_base.lookup_fec(prefix,
+                                                             prefix_len)
+
+    def bind_local_label(self, prefix, prefix_len):
+        """Returns the local label of the FEC, allocating one if the FEC
+        has none yet.
+        """
+        fec = fec_key(prefix, prefix_len)
+        label = self.distribution.label(fec)
+        if label is None:
+            label = self.label_allocator.allocate()
+            self._bind(fec, label)
+        return label
+
+    def unbind_local_label(self, prefix, prefix_len):
+        fec = fec_key(prefix, prefix_len)
+        label = self.distribution.label(fec)
+        if label is not None:
+            self._unbind(fec)
+            self.label_allocator.free(label)
+        return label
+
+    def _bind(self, fec, label):
+        self.distribution.bind(fec, label)
+
+    def _unbind(self, fec):
+        self.distribution.unbind(fec)
+
+    def send_message(self, lsr_id, msg):
+        self.peers[lsr_id].send_msg(msg)
+
+    def hello_cache_stats(self):
+        return self.hello_cache.stats()
+
+    def dispatch_stats(self):
+        return self.dispatcher.stats()
+
+    def session_stats(self):
+        return self.session_setup.stats()
+
+    def writer_stats(self):
+        return dict((lsr_id, peer.writer_stats())
+                    for lsr_id, peer in self.peers.items())
+
+    def distribution_stats(self):
+        return self.distribution.stats()
+
+    def statistics_snapshot(self, lsr_id=None):
+        """Message, error and latency statistics of the sessions, see
+        LDPStatistics.snapshot().
+        """
+        return self.statistics.snapshot(lsr_id)
+
+    def set_profiling(self, enable, sample_every=DEFAULT_SAMPLE_EVERY,
+                      reset=False):
+        """Starts or stops the sampling profiler of probe.py, reset
+        drops what was sampled so far.
+        """
+        if reset:
+            profiler.reset()
+        if enable:
+            profiler.start(sample_every)
+        else:
+            profiler.stop()
+        return profiler.active
+
+    def profile_stats(self):
+        return profiler.stats()
+
+    def profile_folded(self):
+        return profiler.folded()
+
+    def label_stats(self):
+        stats = self.label_allocator.stats()
+        stats['local_bindings'] = len(self.distribution)
+        return stats
@@ -0,0 +1,187 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Per peer counters and latency histograms.
+
+Every counter lives in an array allocated with the PeerStatistics of
+the peer, indexed by the message type index of MSG_TYPE_INDEX, so
+counting a message on the receive and send paths is a dict lookup and
+two index increments. Histograms have fixed log2 buckets of
+microseconds: bucket 0 counts below 1us, bucket i counts from 2**(i-1)
+to 2**i us, the last one everything above.
+
+Nothing is summed up until snapshot() is called.
+"""
+
+from array import array
+
+# session messages of RFC 5036, the last index counts all other types
+MSG_TYPES = (
+    (0x0001, 'notification'),
+    (0x0200, 'init'),
+    (0x0201, 'keepalive'),
+    (0x0300, 'address'),
+    (0x0301, 'address_withdraw'),
+    (0x0400, 'label_mapping'),
+    (0x0401, 'label_request'),
+    (0x0402, 'label_withdraw'),
+    (0x0403, 'label_release'),
+    (0x0404, 'label_abort_request'),
+)
+MSG_TYPE_NAMES = tuple(name for msg_type, name in MSG_TYPES) + ('other', )
+MSG_TYPE_INDEX = dict((msg_type, i)
+                      for i, (msg_type, name) in enumerate(MSG_TYPES))
+MSG_TYPE_OTHER = len(MSG_TYPES)
+
+HISTOGRAM_BUCKETS = 26  # the last bucket starts at about 16s
+
+
+class Histogram(object):
+    __slots__ = ('counts', 'total', 'max')
+
+    def __init__(self):
+        self.counts = array('L', [0]) * HISTOGRAM_BUCKETS
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        bucket = int(seconds * 1000000).bit_length()
+        if bucket >= HISTOGRAM_BUCKETS:
+            bucket = HISTOGRAM_BUCKETS - 1
+        self.counts[bucket] += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        counts = self.counts
+        for i, count in enumerate(other.counts):
+            counts[i] += count
+        self.total += other.total
+        if other.max > self.max:
+            self.max = other.max
+
+    def snapshot(self):
+        """buckets holds [upper bound in seconds, count] of the buckets
+        that counted something, the upper bound of the last is None.
+        """
+        count = sum(self.counts)
+        buckets = []
+        for i, n in enumerate(self.counts):
+            if n:
+                le = (1 << i) / 1000000.0
+                buckets.append([le if i < HISTOGRAM_BUCKETS - 1 else None,
+                                n])
+        return {'count': count,
+                'avg': self.total / count if count else None,
+                'max': self.max,
+                'buckets': buckets}
+
+
+class PeerStatistics(object):
+    __slots__ = ('rx_msgs', 'rx_bytes', 'tx_msgs', 'tx_bytes',
+                 'parse_errors', 'flaps', 'pdu_parse_time',
+                 'dispatch_latency', 'send_queue_wait')
+
+    def __init__(self):
+        size = len(MSG_TYPE_NAMES)
+        self.rx_msgs = array('L', [0]) * size
+        self.rx_bytes = array('L', [0]) * size
+        self.tx_msgs = array('L', [0]) * size
+        self.tx_bytes = array('L', [0]) * size
+        self.parse_errors = 0
+        self.flaps = 0
+        self.pdu_parse_time = Histogram()
+        # from the receive of the bytes to the return of the dispatch
+        self.dispatch_latency = Histogram()
+        self.send_queue_wait = Histogram()
+
+    def merge(self, other):
+        for name in ('rx_msgs', 'rx_bytes', 'tx_msgs', 'tx_bytes'):
+            counts = getattr(self, name)
+            for i, count in enumerate(getattr(other, name)):
+                counts[i] += count
+        self.parse_errors += other.parse_errors
+        self.flaps += other.flaps
+        self.pdu_parse_time.merge(other.pdu_parse_time)
+        self.dispatch_latency.merge(other.dispatch_latency)
+        self.send_queue_wait.merge(other.send_queue_wait)
+
+    @staticmethod
+    def _by_type(msgs, nbytes):
+        return dict((name, {'messages': msgs[i], 'bytes': nbytes[i]})
+                    for i, name in enumerate(MSG_TYPE_NAMES) if msgs[i])
+
+    def snapshot(self):
+        return {'received': self._by_type(self.rx_msgs, self.rx_bytes),
+                'sent': self._by_type(self.tx_msgs, self.tx_bytes),
+                'received_bytes': sum(self.rx_bytes),
+                'sent_bytes': sum(self.tx_bytes),
+                'parse_errors': self.parse_errors,
+                'flaps': self.flaps,
+                'pdu_parse_time': self.pdu_parse_time.snapshot(),
+                'dispatch_latency': self.dispatch_latency.snapshot(),
+                'send_queue_wait': self.send_queue_wait.snapshot()}
+
+
+class LDPStatistics(object):
+    """The PeerStatistics of all peers by LSR-ID. The statistics of a
+    removed peer are kept in the totals.
+    """
+
+    def __init__(self):
+        self._peers = {}  # key LSR-ID
+        self._removed = PeerStatistics()
+
+    def peer(self, lsr_id):
+        """Returns the PeerStatistics of lsr_id, they survive a new
+        session with the same peer.
+        """
+        stats = self._peers.get(lsr_id)
+        if stats is None:
+            stats = self._peers[lsr_id] = PeerStatistics()
+        return stats
+
+    def remove_peer(self, lsr_id):
+        stats = self._peers.pop(lsr_id, None)
+        if stats is not None:
+            self._removed.merge(stats)
+
+    def merge(self, other):
+        """Adds the statistics of other, used for those of the shard
+        workers.
+        """
+        for lsr_id, stats in other._peers.items():
+            self.peer(lsr_id).merge(stats)
+        self._removed.merge(other._removed)
+
+    def totals(self):
+        totals = PeerStatistics()
+        totals.merge(self._removed)
+        for stats in self._peers.values():
+            totals.merge(stats)
+        return totals
+
+    def snapshot(self, lsr_id=None):
+        """Returns the totals and the statistics of each peer, or of
+        lsr_id only.
+        """
+        if lsr_id is not None:
+            stats = self._peers.get(lsr_id)
+            return {lsr_id: stats.snapshot()} if stats is not None else {}
+        return {'total': self.totals().snapshot(),
+                'peers': dict((peer_id, stats.snapshot())
+                              for peer_id, stats in self._peers.items())}
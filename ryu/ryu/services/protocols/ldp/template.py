@@ -0,0 +1,75 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Pre-serialized message templates.
+
+Hellos, keepalives and inits have the same bytes every time except for
+the message id. They are serialized once and only the message id is
+patched with struct.pack_into() when one is sent.
+"""
+
+import struct
+
+from ryu.services.protocols.ldp.framing import LDP_PDU_HEADER_LEN
+
+# message id follows the message type and length fields
+LDP_MSG_ID_OFFSET = 4
+
+
+class MessageTemplate(object):
+    def __init__(self, msg, include_header=False):
+        self._buff = bytearray(msg.serialize(include_header=include_header))
+        self._msg_id_offset = LDP_MSG_ID_OFFSET
+        if include_header:
+            self._msg_id_offset += LDP_PDU_HEADER_LEN
+
+    def __len__(self):
+        return len(self._buff)
+
+    def render(self, msg_id):
+        """Returns the serialized message carrying msg_id."""
+        struct.pack_into('!I', self._buff, self._msg_id_offset,
+                         msg_id & 0xffffffff)
+        return bytes(self._buff)
+
+
+class MessageTemplateCache(object):
+    def __init__(self):
+        self._templates = {}
+
+    def __len__(self):
+        return len(self._templates)
+
+    def get(self, key, factory, include_header=False):
+        """Returns the template for key, factory() builds the message
+        the first time key is seen.
+        """
+        cache_key = (key, include_header)
+        template = self._templates.get(cache_key)
+        if template is None:
+            template = MessageTemplate(factory(), include_header)
+            self._templates[cache_key] = template
+        return template
+
+    def clear(self):
+        self._templates.clear()
+
+
+_template_cache = MessageTemplateCache()
+
+
+def get_template(key, factory, include_header=False):
+    return _template_cache.get(key, factory, include_header)
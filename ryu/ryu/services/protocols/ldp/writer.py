@@ -0,0 +1,208 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Per peer outbound queue.
+
+write() only queues, a writer thread per peer drains the queue to the
+socket, so a slow peer blocks nobody but its own writer. Once
+high_watermark bytes are pending the writer is not writable until the
+queue drained below low_watermark; producers of bulk traffic check
+writable, wait_writable() or call_when_writable(). More than
+max_pending bytes means the peer does not read at all and write()
+raises WriterOverflow.
+
+Session traffic (keepalive, notification) is written with priority,
+it is sent ahead of everything queued without priority and is never
+refused.
+
+The time data spends in the queue is recorded in wait_histogram, a
+stats.Histogram, if one is given.
+"""
+
+import collections
+import logging
+import time
+
+from ryu.lib import hub
+
+LOG = logging.getLogger('ldp.writer')
+
+DEFAULT_HIGH_WATERMARK = 1024 * 1024
+DEFAULT_LOW_WATERMARK = 256 * 1024
+# hard limit relative to the high watermark
+MAX_PENDING_FACTOR = 8
+
+
+class WriterOverflow(Exception):
+    """The peer does not drain its queue."""
+
+
+class PeerWriter(object):
+    def __init__(self, sock, high_watermark=DEFAULT_HIGH_WATERMARK,
+                 low_watermark=DEFAULT_LOW_WATERMARK, max_pending=None,
+                 error_handler=None, wait_histogram=None):
+        assert low_watermark <= high_watermark
+        self._socket = sock
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.max_pending = max_pending or \
+            high_watermark * MAX_PENDING_FACTOR
+        self._error_handler = error_handler
+        self._wait_histogram = wait_histogram
+        self._queue = collections.deque()
+        self._priority_queue = collections.deque()
+        # enqueue times, parallel to the queues
+        self._queue_times = collections.deque()
+        self._priority_queue_times = collections.deque()
+        self._wakeup = hub.Event()
+        self._writable_event = hub.Event()
+        self._writable_event.set()
+        self._writable_callbacks = []
+        self._thread = None
+        self._stopped = False
+        self._closing = False
+        self.writable = True
+        self.bytes_pending = 0
+        self.bytes_sent = 0
+        self.time_blocked = 0.0
+        self.pause_count = 0
+
+    def __len__(self):
+        return len(self._queue) + len(self._priority_queue)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = hub.spawn(self._run)
+
+    def stop(self):
+        self._stopped = True
+        if self._thread is not None:
+            hub.kill(self._thread)
+            self._thread = None
+        self._queue.clear()
+        self._priority_queue.clear()
+        self._queue_times.clear()
+        self._priority_queue_times.clear()
+        self.bytes_pending = 0
+        # nothing will be written any more, release waiting producers
+        self._set_writable()
+
+    def close(self):
+        """Drops the queued data but what was written with priority,
+        e.g. a notification, sends that and then stops as after a write
+        error.
+        """
+        self._closing = True
+        self._queue.clear()
+        self._queue_times.clear()
+        self.bytes_pending = sum(len(d) for d in self._priority_queue)
+        if self._thread is None:
+            self._stopped_by_writer(None)
+        else:
+            self._wakeup.set()
+
+    def write(self, data, priority=False):
+        """Queues data, returns self.writable."""
+        if self._stopped or self._closing:
+            return False
+        size = len(data)
+        if priority:
+            self._priority_queue.append(data)
+            self._priority_queue_times.append(time.time())
+        elif self.bytes_pending + size > self.max_pending:
+            raise WriterOverflow('%d bytes pending' % self.bytes_pending)
+        else:
+            self._queue.append(data)
+            self._queue_times.append(time.time())
+        self.bytes_pending += size
+        if self.writable and self.bytes_pending >= self.high_watermark:
+            self.writable = False
+            self.pause_count += 1
+            self._writable_event.clear()
+        self._wakeup.set()
+        return self.writable
+
+    def wait_writable(self, timeout=None):
+        """Blocks until the queue drained below the low watermark."""
+        if self.writable or self._stopped:
+            return True
+        return self._writable_event.wait(timeout)
+
+    def call_when_writable(self, callback, *args):
+        """Spawns callback(*args) once the queue drained below the low
+        watermark or the writer stopped.
+        """
+        if self.writable or self._stopped:
+            hub.spawn(callback, *args)
+        else:
+            self._writable_callbacks.append((callback, args))
+
+    def _set_writable(self):
+        self._writable_event.set()
+        callbacks = self._writable_callbacks
+        self._writable_callbacks = []
+        for callback, args in callbacks:
+            hub.spawn(callback, *args)
+
+    def _run(self):
+        queue = self._queue
+        priority_queue = self._priority_queue
+        wait_histogram = self._wait_histogram
+        error = None
+        try:
+            while True:
+                if priority_queue:
+                    data = priority_queue.popleft()
+                    queued_at = self._priority_queue_times.popleft()
+                elif self._closing:
+                    break
+                elif queue:
+                    data = queue.popleft()
+                    queued_at = self._queue_times.popleft()
+                else:
+                    self._wakeup.clear()
+                    self._wakeup.wait()
+                    continue
+                start = time.time()
+                if wait_histogram is not None:
+                    wait_histogram.record(start - queued_at)
+                self._socket.sendall(data)
+                self.time_blocked += time.time() - start
+                size = len(data)
+                self.bytes_pending -= size
+                self.bytes_sent += size
+                if not self.writable and \
+                        self.bytes_pending <= self.low_watermark:
+                    self.writable = True
+                    self._set_writable()
+        except Exception as e:
+            LOG.debug('writer stopped: %s', e)
+            error = e
+        self._thread = None
+        self._stopped_by_writer(error)
+
+    def _stopped_by_writer(self, error):
+        self.stop()
+        if self._error_handler is not None:
+            self._error_handler(error)
+
+    def stats(self):
+        return {'queue_depth': len(self),
+                'bytes_pending': self.bytes_pending,
+                'bytes_sent': self.bytes_sent,
+                'time_blocked': self.time_blocked,
+                'writable': self.writable,
+                'pause_count': self.pause_count}
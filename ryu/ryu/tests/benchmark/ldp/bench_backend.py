@@ -0,0 +1,169 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Session setup and full label sync between two standalone speakers, on
+the eventlet backend vs the asyncio backend (and uvloop if installed).
+
+The speakers are connected by a socketpair or over TCP on the loopback
+interface, discovery is not part of the measurement.
+
+Usage:
+PYTHONPATH=. python ryu/tests/benchmark/ldp/bench_backend.py
+"""
+
+import socket
+import time
+
+from eventlet.green import socket as green_socket
+from ryu.lib import hub
+from ryu.services.protocols.ldp import event as ldp_event
+from ryu.services.protocols.ldp.backend import EventletBackend
+from ryu.services.protocols.ldp.peer import Peer
+from ryu.services.protocols.ldp.speaker import LDPSpeaker
+from ryu.tests.benchmark.ldp import common
+
+try:
+    from ryu.services.protocols.ldp import aio
+except ImportError:
+    aio = None
+
+BENCH = 'backend'
+ADVERTISER_ID = '2.2.2.2'
+RECEIVER_ID = '1.1.1.1'
+TIMEOUT = 60
+POLL_INTERVAL = 0.001
+TRANSPORTS = ('unix', 'tcp')
+
+
+def _tcp_pair(socket_module):
+    # the kernel completes the handshake before accept()
+    listener = socket_module.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    local = socket_module.create_connection(listener.getsockname())
+    remote, addr = listener.accept()
+    listener.close()
+    return local, remote
+
+
+class _EventletDriver(object):
+    name = 'eventlet'
+
+    def __init__(self):
+        self.backend = EventletBackend()
+
+    def socketpair(self, transport):
+        if transport == 'tcp':
+            return _tcp_pair(green_socket)
+        return green_socket.socketpair()
+
+    def run_until(self, predicate):
+        deadline = time.time() + TIMEOUT
+        while not predicate():
+            if time.time() > deadline:
+                raise RuntimeError('timed out')
+            hub.sleep(POLL_INTERVAL)
+
+    def close(self):
+        self.backend.stop()
+
+
+class _AsyncioDriver(object):
+    def __init__(self, use_uvloop):
+        self.name = 'uvloop' if use_uvloop else 'asyncio'
+        self.loop = aio.new_event_loop(use_uvloop)
+        self.backend = aio.AsyncioBackend(self.loop)
+
+    def socketpair(self, transport):
+        if transport == 'tcp':
+            return _tcp_pair(socket)
+        return socket.socketpair()
+
+    def run_until(self, predicate):
+        deadline = time.time() + TIMEOUT
+
+        def _poll():
+            if predicate() or time.time() > deadline:
+                self.loop.stop()
+            else:
+                self.loop.call_later(POLL_INTERVAL, _poll)
+        self.loop.call_soon(_poll)
+        self.loop.run_forever()
+        if not predicate():
+            raise RuntimeError('timed out')
+
+    def close(self):
+        self.backend.stop()
+        self.loop.close()
+
+
+def _drivers():
+    drivers = [_EventletDriver]
+    if aio is not None:
+        drivers.append(lambda: _AsyncioDriver(False))
+        if aio.uvloop is not None:
+            drivers.append(lambda: _AsyncioDriver(True))
+    return drivers
+
+
+def _peer(speaker, lsr_id):
+    peer = Peer(speaker, lsr_id, '127.0.0.1', speaker.config)
+    speaker.peers[lsr_id] = peer
+    return peer
+
+
+def _run_case(driver, transport, count):
+    advertiser = LDPSpeaker(ldp_event.LDPConfig(router_id=ADVERTISER_ID),
+                            driver.backend)
+    receiver = LDPSpeaker(ldp_event.LDPConfig(router_id=RECEIVER_ID),
+                          driver.backend)
+    for i in range(count):
+        advertiser.bind_local_label('10.%d.%d.0' % (i >> 8 & 0xff, i & 0xff),
+                                    24)
+    to_receiver = _peer(advertiser, RECEIVER_ID)
+    to_advertiser = _peer(receiver, ADVERTISER_ID)
+    local, remote = driver.socketpair(transport)
+    try:
+        start = time.time()
+        driver.backend.start_session(local, to_receiver, True)
+        driver.backend.start_session(remote, to_advertiser, False)
+        driver.run_until(
+            lambda: to_receiver.state == ldp_event.LDP_STATE_OPERATIONAL and
+            to_advertiser.state == ldp_event.LDP_STATE_OPERATIONAL)
+        setup = time.time() - start
+        driver.run_until(
+            lambda: receiver.info_base.peer_count(ADVERTISER_ID) >= count)
+        sync = time.time() - start - setup
+    finally:
+        to_receiver.stop()
+        to_advertiser.stop()
+        driver.close()
+    return common.report(BENCH, '%s_%s' % (driver.name, transport),
+                         labels=count, setup_seconds=setup,
+                         sync_seconds=sync, labels_per_sec=count / sync)
+
+
+def run(count=50000, transports=TRANSPORTS):
+    return [_run_case(driver(), transport, count)
+            for transport in transports for driver in _drivers()]
+
+
+def main():
+    run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Label Mapping encoding and decoding of a full sync, per message objects
+vs the bulk codec.
+
+Usage:
+PYTHONPATH=. python ryu/tests/benchmark/ldp/bench_bulk.py
+"""
+
+import socket
+import struct
+from array import array
+
+from ryu.lib.packet import ldp
+from ryu.services.protocols.ldp import bulk
+from ryu.services.protocols.ldp.framing import LDP_PDU_HEADER_LEN
+from ryu.services.protocols.ldp.framing import PDUCoalescer
+from ryu.services.protocols.ldp.framing import PDUFramer
+from ryu.services.protocols.ldp.message_view import TLV_FEC
+from ryu.services.protocols.ldp.message_view import TLV_GENERIC_LABEL
+from ryu.services.protocols.ldp.message_view import parse_pdu
+from ryu.tests.benchmark.ldp import common
+
+BENCH = 'bulk'
+ROUTER_ID = '1.1.1.1'
+
+
+def _bindings(count):
+    prefixes = array('I', [(10 << 24) + (i << 8) for i in range(count)])
+    prefix_lens = array('B', [24] * count)
+    labels = array('I', range(16, 16 + count))
+    return prefixes, prefix_lens, labels
+
+
+def _encode_objects(prefixes, prefix_lens, labels):
+    coalescer = PDUCoalescer(ROUTER_ID)
+    pdus = []
+    for i in range(len(labels)):
+        prefix = socket.inet_ntoa(struct.pack('!I', prefixes[i]))
+        tlvs = [ldp.Fec(fec_elements=[ldp.PrefixFecElement(
+                    address_type=1, element_len=prefix_lens[i],
+                    prefix=prefix)]),
+                ldp.GenericLabel(label=labels[i])]
+        msg = ldp.LDPLabelMapping(router_id=ROUTER_ID, msg_id=i + 1,
+                                  tlvs=tlvs)
+        pdus.extend(coalescer.add(msg.serialize(include_header=False)))
+    pdus.append(coalescer.flush())
+    return b''.join(bytes(pdu) for pdu in pdus)
+
+
+def _encode_bulk(prefixes, prefix_lens, labels):
+    buf, ends = bulk.encode_label_mappings(prefixes, prefix_lens, labels)
+    return bulk.frame_pdus(buf, ends, PDUCoalescer(ROUTER_ID).header)
+
+
+def _decode_views(data):
+    framer = PDUFramer()
+    framer.feed(data)
+    bindings = []
+    for pdu in framer.pdus():
+        for view in parse_pdu(pdu):
+            element = view.tlv(TLV_FEC).fec_elements[0]
+            bindings.append((element.prefix, element.element_len,
+                             view.tlv(TLV_GENERIC_LABEL).label))
+    return bindings
+
+
+def _decode_bulk(data):
+    framer = PDUFramer()
+    framer.feed(data)
+    labels = array('I')
+    for pdu in framer.pdus():
+        labels.extend(bulk.decode_label_mappings(pdu,
+                                                 LDP_PDU_HEADER_LEN)[2])
+    return labels
+
+
+def run(count=20000, repeat=3):
+    results = []
+    bindings = _bindings(count)
+    data = _encode_bulk(*bindings)
+    for case, func, args in (('encode_objects', _encode_objects, bindings),
+                             ('encode_bulk', _encode_bulk, bindings),
+                             ('decode_views', _decode_views, (data, )),
+                             ('decode_bulk', _decode_bulk, (data, ))):
+        elapsed = common.best_of(repeat, func, *args)
+        results.append(common.report(
+            BENCH, case, msgs=count, bytes=len(data), seconds=elapsed,
+            msgs_per_sec=count / elapsed,
+            mbps=common.mbps(len(data), elapsed),
+            numpy=bulk.numpy is not None))
+    return results
+
+
+def main():
+    run()
+
+
+if __name__ == '__main__':
+    main()
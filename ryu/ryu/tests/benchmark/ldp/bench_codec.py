@@ -0,0 +1,127 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Decoding cost, eager LDPMessage.parser vs lazy MessageView.
+
+Each case decodes a message and reads the one field the service needs
+from it, as Peer, LDPManager and the hello handling do.
+
+Usage:
+PYTHONPATH=. python ryu/tests/benchmark/ldp/bench_codec.py
+"""
+
+import gc
+
+from ryu.lib.packet import ldp
+from ryu.lib.packet.ldp import LDPMessage
+from ryu.services.protocols.ldp import message_view
+from ryu.services.protocols.ldp.message_view import parse_pdu
+from ryu.tests.benchmark.ldp import common
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+BENCH = 'codec'
+ROUTER_ID = '1.1.1.1'
+
+
+def _hello():
+    tlvs = [ldp.CommonHelloParameter(hold_time=15, t_bit=0, r_bit=0),
+            ldp.IPv4TransportAddress(addr=ROUTER_ID)]
+    return (ldp.LDPHello(router_id=ROUTER_ID, msg_id=1, tlvs=tlvs),
+            ldp.LDP_TLV_COMMON_HELLO_PARAMETERS,
+            message_view.TLV_COMMON_HELLO_PARAMETERS, 'hold_time')
+
+
+def _init():
+    tlvs = [ldp.CommonSessionParameters(
+        proto_ver=1, keepalive_time=180, pvlim=0, max_pdu_len=4096,
+        receiver_lsr_id='2.2.2.2', receiver_label_space_id=0, a_bit=0,
+        d_bit=0)]
+    return (ldp.LDPInit(router_id=ROUTER_ID, msg_id=1, tlvs=tlvs),
+            ldp.LDP_TLV_COMMON_SESSION_PARAMETERS,
+            message_view.TLV_COMMON_SESSION_PARAMETERS, 'keepalive_time')
+
+
+def _address():
+    addrs = ['10.0.%d.%d' % (i >> 8, i & 0xff) for i in range(64)]
+    tlvs = [ldp.AddressList(address_family=1, addresses=addrs)]
+    return (ldp.LDPAddress(router_id=ROUTER_ID, msg_id=1, tlvs=tlvs),
+            message_view.TLV_ADDRESS_LIST, message_view.TLV_ADDRESS_LIST,
+            'addresses')
+
+
+def _label_mapping():
+    fec_elements = [ldp.PrefixFecElement(address_type=1, element_len=32,
+                                         prefix='10.1.2.3')]
+    tlvs = [ldp.Fec(fec_elements=fec_elements),
+            ldp.GenericLabel(label=1000)]
+    return (ldp.LDPLabelMapping(router_id=ROUTER_ID, msg_id=1, tlvs=tlvs),
+            ldp.LDP_TLV_GENERIC_LABEL, message_view.TLV_GENERIC_LABEL,
+            'label')
+
+
+def _eager(pdu, tlv_type, field, count):
+    for _ in range(count):
+        msg, rest = LDPMessage.parser(pdu)
+        getattr(LDPMessage.retrive_tlv(tlv_type, msg), field)
+
+
+def _lazy(pdu, tlv_type, field, count):
+    for _ in range(count):
+        getattr(parse_pdu(pdu)[0].tlv(tlv_type), field)
+
+
+def _allocated(func, *args):
+    """Peak bytes allocated by func, None without tracemalloc."""
+    if tracemalloc is None:
+        return None
+    gc.collect()
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def run(count=20000, repeat=3):
+    results = []
+    for name, factory in (('hello', _hello), ('init', _init),
+                          ('address', _address),
+                          ('label_mapping', _label_mapping)):
+        msg, eager_type, lazy_type, field = factory()
+        pdu = bytes(msg.serialize())
+        for case, func, tlv_type in (('eager', _eager, eager_type),
+                                     ('lazy', _lazy, lazy_type)):
+            elapsed = common.best_of(repeat, func, pdu, tlv_type, field,
+                                     count)
+            results.append(common.report(
+                BENCH, '%s_%s' % (name, case), msgs=count,
+                msg_len=len(pdu), seconds=elapsed,
+                msgs_per_sec=count / elapsed,
+                peak_alloc_bytes_per_msg=_allocated(
+                    func, pdu, tlv_type, field, 1)))
+    return results
+
+
+def main():
+    run()
+
+
+if __name__ == '__main__':
+    main()
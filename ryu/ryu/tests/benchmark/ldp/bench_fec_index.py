@@ -0,0 +1,81 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Longest prefix match cost of FecIndex with 1M prefixes.
+
+Usage:
+PYTHONPATH=. python ryu/tests/benchmark/ldp/bench_fec_index.py
+"""
+
+import random
+import time
+
+from ryu.services.protocols.ldp.fec_index import FecIndex
+from ryu.tests.benchmark.ldp import common
+
+BENCH = 'fec_index'
+PREFIX_LENS = (16, 20, 22, 24, 24, 24, 28, 32)
+
+
+def _random_fecs(count, rand):
+    fecs = {}
+    while len(fecs) < count:
+        prefix_len = rand.choice(PREFIX_LENS)
+        mask = (0xffffffff << (32 - prefix_len)) & 0xffffffff
+        fecs[(rand.getrandbits(32) & mask, prefix_len)] = len(fecs)
+    return [(p, l, v) for (p, l), v in fecs.items()]
+
+
+def run(prefix_count=1000000, lookup_count=200000, seed=1):
+    rand = random.Random(seed)
+    fecs = _random_fecs(prefix_count, rand)
+    index = FecIndex()
+    results = []
+
+    start = time.time()
+    index.build(fecs)
+    elapsed = time.time() - start
+    results.append(common.report(
+        BENCH, 'build', prefixes=len(index), seconds=elapsed))
+
+    addrs = [rand.getrandbits(32) for _ in range(lookup_count)]
+    start = time.time()
+    for addr in addrs:
+        index.lookup_int(addr)
+    elapsed = time.time() - start
+    results.append(common.report(
+        BENCH, 'lookup', prefixes=len(index), lookups=lookup_count,
+        seconds=elapsed, usec_per_lookup=elapsed / lookup_count * 1e6))
+
+    updates = fecs[:lookup_count // 2]
+    start = time.time()
+    for prefix, prefix_len, value in updates:
+        index.delete_int(prefix, prefix_len)
+    for prefix, prefix_len, value in updates:
+        index.insert_int(prefix, prefix_len, value)
+    elapsed = time.time() - start
+    results.append(common.report(
+        BENCH, 'delete_insert', prefixes=len(index), ops=len(updates) * 2,
+        seconds=elapsed, usec_per_op=elapsed / (len(updates) * 2) * 1e6))
+    return results
+
+
+def main():
+    run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Receive framing throughput, string concatenation vs PDUFramer.
+
+Usage:
+PYTHONPATH=. python ryu/tests/benchmark/ldp/bench_framing.py
+"""
+
+import struct
+
+from ryu.services.protocols.ldp.framing import LDP_PDU_HEADER_LEN
+from ryu.services.protocols.ldp.framing import LDP_PDU_LEN_OFFSET
+from ryu.services.protocols.ldp.framing import PDUFramer
+from ryu.tests.benchmark.ldp import common
+
+BENCH = 'framing'
+
+
+def legacy_framing(sock, read_size):
+    """The framing Peer used before PDUFramer: recv() of read_size
+    bytes, string concatenation and a slice copy per PDU.
+    """
+    buff = b''
+    count = 0
+    while True:
+        next_bytes = sock.recv(read_size)
+        if len(next_bytes) == 0:
+            return count
+        buff += next_bytes
+        while len(buff) >= LDP_PDU_HEADER_LEN:
+            (pdu_len, ) = struct.unpack('!H', buff[2:4])
+            if len(buff) - LDP_PDU_LEN_OFFSET < pdu_len:
+                break
+            pdu = buff[:pdu_len + LDP_PDU_LEN_OFFSET]
+            buff = buff[pdu_len + LDP_PDU_LEN_OFFSET:]
+            count += len(pdu) > 0
+
+
+def framer_framing(sock):
+    framer = PDUFramer()
+    count = 0
+    while framer.recv_into(sock):
+        for pdu in framer.pdus():
+            count += len(pdu) > 0
+    return count
+
+
+def run(pdu_count=20000, body_len=200, chunk_size=65536, repeat=3):
+    stream = common.make_stream(pdu_count, body_len)
+    results = []
+
+    def _legacy():
+        sock = common.StreamSocket(stream, chunk_size)
+        assert legacy_framing(sock, LDP_PDU_HEADER_LEN) == pdu_count
+
+    def _framer():
+        sock = common.StreamSocket(stream, chunk_size)
+        assert framer_framing(sock) == pdu_count
+
+    for case, func in (('legacy_recv10', _legacy),
+                       ('pdu_framer', _framer)):
+        elapsed = common.best_of(repeat, func)
+        results.append(common.report(
+            BENCH, case, pdus=pdu_count, body_len=body_len,
+            chunk_size=chunk_size, seconds=elapsed,
+            mb_per_sec=common.mbps(len(stream), elapsed)))
+    return results
+
+
+def main():
+    for body_len in (20, 200, 1000):
+        run(body_len=body_len)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Label Information Base memory and operation cost.
+
+Loads 1M bindings spread over 50 peers and checks the memory of the
+table against the documented budgets: 42 MiB once loaded and 62 MiB at
+the peak while growing. A table created with the capacity for 1M
+bindings does not grow and stays within 42 MiB throughout.
+
+Peaks are those of the binding arrays and, on python 3, of all
+allocations traced by tracemalloc during the load.
+
+Usage:
+PYTHONPATH=. python ryu/tests/benchmark/ldp/bench_info_base.py
+"""
+
+import gc
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from ryu.services.protocols.ldp.info_base import LabelInformationBase
+from ryu.tests.benchmark.ldp import common
+
+BENCH = 'info_base'
+MEMORY_BUDGET = 42 * 1024 * 1024
+GROWTH_PEAK_BUDGET = 62 * 1024 * 1024
+
+
+def _peer_id(index):
+    return '10.255.%d.%d' % (index >> 8, index & 0xff)
+
+
+def _load(capacity, peers, fecs):
+    per_peer = len(fecs) // len(peers)
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+    lib = LabelInformationBase(capacity)
+    start = time.time()
+    for i, fec in enumerate(fecs):
+        lib.add_key(peers[i // per_peer % len(peers)], fec, 16 + i % 1000)
+    elapsed = time.time() - start
+    traced_peak = None
+    if tracemalloc is not None:
+        traced_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return lib, elapsed, traced_peak
+
+
+def _report_load(case, lib, elapsed, traced_peak, peak_budget):
+    usage = lib.memory_usage()
+    peak = lib.peak_memory_usage()
+    return common.report(
+        BENCH, case, bindings=len(lib), seconds=elapsed,
+        ops_per_sec=len(lib) / elapsed, memory_bytes=usage,
+        bytes_per_binding=float(usage) / len(lib), peak_memory_bytes=peak,
+        traced_peak_bytes=traced_peak, memory_budget=MEMORY_BUDGET,
+        peak_budget=peak_budget,
+        within_budget=usage <= MEMORY_BUDGET and peak <= peak_budget and
+        (traced_peak is None or traced_peak <= peak_budget))
+
+
+def run(bindings=1000000, peer_count=50):
+    peers = [_peer_id(i) for i in range(peer_count)]
+    per_peer = bindings // peer_count
+    # /32 FECs, every peer advertises its own range
+    fecs = [((0x0a000000 + i) << 6) | 32 for i in range(bindings)]
+    results = []
+
+    lib, elapsed, traced_peak = _load(int(bindings / 0.7) + 1, peers, fecs)
+    results.append(_report_load('insert_presized', lib, elapsed,
+                                traced_peak, MEMORY_BUDGET))
+    del lib
+
+    lib, elapsed, traced_peak = _load(0, peers, fecs)
+    results.append(_report_load('insert', lib, elapsed, traced_peak,
+                                GROWTH_PEAK_BUDGET))
+
+    start = time.time()
+    for i, fec in enumerate(fecs):
+        lib.lookup_key(peers[i // per_peer % peer_count], fec)
+    elapsed = time.time() - start
+    results.append(common.report(
+        BENCH, 'lookup', bindings=bindings, seconds=elapsed,
+        ops_per_sec=bindings / elapsed))
+
+    withdraws = fecs[:bindings // 10]
+    start = time.time()
+    for i, fec in enumerate(withdraws):
+        lib.withdraw_key(peers[i // per_peer % peer_count], fec)
+    elapsed = time.time() - start
+    results.append(common.report(
+        BENCH, 'withdraw', bindings=len(withdraws), seconds=elapsed,
+        ops_per_sec=len(withdraws) / elapsed))
+
+    start = time.time()
+    purged = lib.purge_peer(peers[-1])
+    elapsed = time.time() - start
+    results.append(common.report(
+        BENCH, 'purge_peer', bindings=purged, seconds=elapsed))
+    return results
+
+
+def main():
+    run()
+
+
+if __name__ == '__main__':
+    main()
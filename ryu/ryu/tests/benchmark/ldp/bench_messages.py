@@ -0,0 +1,153 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Serialize and parse throughput of the message codec, per message type.
+
+address_10k is an Address message with 10000 addresses, sequential
+chains Label Mappings behind an Address message as in
+test_ldp.test_sequencial_message and parses them one after the other.
+
+Usage:
+PYTHONPATH=. python ryu/tests/benchmark/ldp/bench_messages.py
+"""
+
+from ryu.lib.packet import ldp
+from ryu.lib.packet.ldp import LDPMessage
+from ryu.tests.benchmark.ldp import common
+
+BENCH = 'messages'
+ROUTER_ID = '1.1.1.1'
+# the messages of a case are about this many bytes, at least MIN_COUNT
+BYTES_PER_CASE = 4 * 1024 * 1024
+MIN_COUNT = 20
+SEQUENTIAL_MAPPINGS = 31
+
+
+def _addrs(count):
+    return ['10.%d.%d.%d' % (i >> 16, (i >> 8) & 0xff, i & 0xff)
+            for i in range(count)]
+
+
+def _fec(prefixes):
+    return ldp.Fec(fec_elements=[
+        ldp.PrefixFecElement(address_type=1, element_len=24, prefix=prefix)
+        for prefix in prefixes])
+
+
+def _label_mapping(i=0):
+    return ldp.LDPLabelMapping(
+        router_id=ROUTER_ID, msg_id=i + 1,
+        tlvs=[_fec(['10.%d.%d.0' % (i >> 8, i & 0xff)]),
+              ldp.GenericLabel(label=16 + i)])
+
+
+def _messages():
+    return [
+        ('hello', ldp.LDPHello(router_id=ROUTER_ID, msg_id=1, tlvs=[
+            ldp.CommonHelloParameter(hold_time=15, t_bit=0, r_bit=0),
+            ldp.IPv4TransportAddress(addr=ROUTER_ID)])),
+        ('init', ldp.LDPInit(router_id=ROUTER_ID, msg_id=1, tlvs=[
+            ldp.CommonSessionParameters(
+                proto_ver=1, keepalive_time=180, pvlim=0, max_pdu_len=4096,
+                receiver_lsr_id='2.2.2.2', receiver_label_space_id=0,
+                a_bit=0, d_bit=0)])),
+        ('keepalive', ldp.LDPKeepAlive(router_id=ROUTER_ID, msg_id=1,
+                                       tlvs=[])),
+        ('notification', ldp.LDPNotification(router_id=ROUTER_ID, msg_id=1,
+            tlvs=[ldp.Status(u_bit=0, f_bit=0,
+                             status_code=ldp.LDP_STATUS_HOLD_TIMER_EXPIRED,
+                             message_id=1, message_type=0)])),
+        ('address', ldp.LDPAddress(router_id=ROUTER_ID, msg_id=1, tlvs=[
+            ldp.AddressList(address_family=1, addresses=_addrs(16))])),
+        ('address_10k', ldp.LDPAddress(router_id=ROUTER_ID, msg_id=1, tlvs=[
+            ldp.AddressList(address_family=1, addresses=_addrs(10000))])),
+        ('label_mapping', _label_mapping()),
+        ('label_withdraw', ldp.LDPLabelWithdraw(router_id=ROUTER_ID,
+            msg_id=1, tlvs=[_fec(['10.0.%d.0' % i for i in range(64)])])),
+    ]
+
+
+def _serialize(msg, count):
+    for _ in range(count):
+        msg.serialize()
+
+
+def _parse(data, count):
+    for _ in range(count):
+        LDPMessage.parser(data)
+
+
+def _sequential():
+    """Returns the messages, the first with the PDU header."""
+    msgs = [ldp.LDPAddress(router_id=ROUTER_ID, msg_id=1, tlvs=[
+        ldp.AddressList(address_family=1, addresses=_addrs(3))])]
+    msgs.extend(_label_mapping(i) for i in range(SEQUENTIAL_MAPPINGS))
+    return msgs
+
+
+def _serialize_sequential(msgs, count):
+    for _ in range(count):
+        data = msgs[0].serialize()
+        for msg in msgs[1:]:
+            data += msg.serialize(include_header=False)
+
+
+def _parse_sequential(data, count):
+    for _ in range(count):
+        msg, rest = LDPMessage.parser(data)
+        while rest:
+            msg, rest = LDPMessage.parser(rest, include_header=False)
+
+
+def _count(msg_len):
+    return max(MIN_COUNT, BYTES_PER_CASE // msg_len)
+
+
+def _report(name, op, msgs, nbytes, elapsed):
+    return common.report(BENCH, '%s_%s' % (name, op), msgs=msgs,
+                         bytes=nbytes, seconds=elapsed,
+                         msgs_per_sec=msgs / elapsed,
+                         mb_per_sec=common.mbps(nbytes, elapsed))
+
+
+def run(repeat=3):
+    results = []
+    for name, msg in _messages():
+        data = bytes(msg.serialize())
+        count = _count(len(data))
+        for op, func, arg in (('serialize', _serialize, msg),
+                              ('parse', _parse, data)):
+            elapsed = common.best_of(repeat, func, arg, count)
+            results.append(_report(name, op, count, count * len(data),
+                                   elapsed))
+    msgs = _sequential()
+    data = bytes(msgs[0].serialize()) + b''.join(
+        bytes(msg.serialize(include_header=False)) for msg in msgs[1:])
+    count = _count(len(data))
+    for op, func, arg in (('serialize', _serialize_sequential, msgs),
+                          ('parse', _parse_sequential, data)):
+        elapsed = common.best_of(repeat, func, arg, count)
+        results.append(_report('sequential', op, count * len(msgs),
+                               count * len(data), elapsed))
+    return results
+
+
+def main():
+    run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Receive throughput of an operational Peer: framing, message parsing,
+session handling and dispatch of a Label Mapping stream delivered in
+chunks of different sizes, as by the receive loop or an asyncio
+transport.
+
+Usage:
+PYTHONPATH=. python ryu/tests/benchmark/ldp/bench_peer_receive.py
+"""
+
+from ryu.lib.packet import ldp
+from ryu.services.protocols.ldp import event as ldp_event
+from ryu.services.protocols.ldp.backend import EventletBackend
+from ryu.services.protocols.ldp.dispatch import MessageDispatcher
+from ryu.services.protocols.ldp.framing import PDUCoalescer
+from ryu.services.protocols.ldp.peer import Peer
+from ryu.services.protocols.ldp.stats import LDPStatistics
+from ryu.tests.benchmark.ldp import common
+
+BENCH = 'peer_receive'
+ROUTER_ID = '1.1.1.1'
+PEER_ID = '2.2.2.2'
+CHUNK_SIZES = (64, 512, 4096, 65536)
+
+
+class _App(object):
+    """What Peer needs of LDPSpeaker, no application is subscribed."""
+
+    def __init__(self):
+        self.decode_pool = None
+        self.io_backend = EventletBackend()
+        self.statistics = LDPStatistics()
+        self.dispatcher = MessageDispatcher(self)
+
+    def send_event(self, name, ev):
+        pass
+
+    def send_event_to_observers(self, ev):
+        pass
+
+
+def _label_mappings(count):
+    coalescer = PDUCoalescer(PEER_ID)
+    pdus = []
+    for i in range(count):
+        fec = ldp.Fec(fec_elements=[ldp.PrefixFecElement(
+            address_type=1, element_len=24,
+            prefix='10.%d.%d.0' % ((i >> 8) & 0xff, i & 0xff))])
+        msg = ldp.LDPLabelMapping(router_id=PEER_ID, msg_id=i + 1,
+                                  tlvs=[fec, ldp.GenericLabel(label=16 + i)])
+        pdus.extend(coalescer.add(msg.serialize(include_header=False)))
+    pdus.append(coalescer.flush())
+    return b''.join(bytes(pdu) for pdu in pdus)
+
+
+def _operational_peer():
+    conf = ldp_event.LDPConfig(router_id=ROUTER_ID)
+    peer = Peer(_App(), PEER_ID, PEER_ID, conf)
+    peer.state = ldp_event.LDP_STATE_OPERATIONAL
+    return peer
+
+
+def _receive(chunks):
+    peer = _operational_peer()
+    for chunk in chunks:
+        peer.data_received(chunk)
+
+
+def run(count=20000, chunk_sizes=CHUNK_SIZES, repeat=3):
+    data = _label_mappings(count)
+    results = []
+    for chunk_size in chunk_sizes:
+        chunks = [data[i:i + chunk_size]
+                  for i in range(0, len(data), chunk_size)]
+        elapsed = common.best_of(repeat, _receive, chunks)
+        results.append(common.report(
+            BENCH, 'chunk_%d' % chunk_size, msgs=count, bytes=len(data),
+            chunk_size=chunk_size, seconds=elapsed,
+            msgs_per_sec=count / elapsed,
+            mb_per_sec=common.mbps(len(data), elapsed)))
+    return results
+
+
+def main():
+    run()
+
+
+if __name__ == '__main__':
+    main()
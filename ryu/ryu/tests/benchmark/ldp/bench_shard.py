@@ -0,0 +1,166 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Session setup and label ingest of sharded peers by worker count.
+
+Each simulated neighbour is one end of a socketpair, the other end is
+handed to the workers like an accepted session. A neighbour opens the
+session and then sends its label mappings, the result is the time until
+all sessions are operational and the rate at which the main process
+receives the bindings.
+
+Usage:
+PYTHONPATH=. python ryu/tests/benchmark/ldp/bench_shard.py
+"""
+
+import socket
+import struct
+import time
+from array import array
+
+from ryu.lib import hub
+hub.patch(thread=False)
+
+from ryu.services.protocols.ldp import bulk
+from ryu.services.protocols.ldp import event as ldp_event
+from ryu.services.protocols.ldp.framing import LDP_PDU_HEADER_PACK_STR
+from ryu.services.protocols.ldp.framing import PDUCoalescer
+from ryu.services.protocols.ldp.shard import ShardManager
+from ryu.tests.benchmark.ldp import common
+
+BENCH = 'shard'
+ROUTER_ID = '1.1.1.1'
+TIMEOUT = 60
+POLL_INTERVAL = 0.01
+RECV_SIZE = 64 * 1024
+
+LDP_MSG_INIT = 0x0200
+LDP_MSG_KEEPALIVE = 0x0201
+TLV_COMMON_SESSION_PARAMETERS = 0x0500
+
+
+def _session_open(lsr_id):
+    """Returns a PDU holding Init and KeepAlive of the neighbour."""
+    params = struct.pack('!HHBBH4sH', 1, 30, 0, 0, 4096,
+                         socket.inet_aton(ROUTER_ID), 0)
+    init = struct.pack('!HHIHH', LDP_MSG_INIT, 4 + 4 + len(params), 1,
+                       TLV_COMMON_SESSION_PARAMETERS,
+                       len(params)) + params
+    keepalive = struct.pack('!HHI', LDP_MSG_KEEPALIVE, 4, 2)
+    body = init + keepalive
+    return struct.pack(LDP_PDU_HEADER_PACK_STR, 1, len(body) + 6,
+                       socket.inet_aton(lsr_id), 0) + body
+
+
+def _label_mappings(lsr_id, index, count):
+    prefixes = array('I', [(10 << 24) + (index << 16) + (i << 8)
+                           for i in range(count)])
+    prefix_lens = array('B', [24] * count)
+    labels = array('I', range(16, 16 + count))
+    buf, ends = bulk.encode_label_mappings(prefixes, prefix_lens, labels,
+                                           msg_id=3)
+    return bytes(bulk.frame_pdus(buf, ends, PDUCoalescer(lsr_id).header))
+
+
+class _Collector(object):
+    def __init__(self):
+        self.operational = 0
+        self.bindings = 0
+
+    def shard_state_changed(self, lsr_id, old_state, new_state, seconds):
+        if new_state == ldp_event.LDP_STATE_OPERATIONAL:
+            self.operational += 1
+
+    def shard_bindings(self, lsr_id, prefixes, prefix_lens, labels):
+        self.bindings += len(labels)
+
+    def shard_withdraws(self, lsr_id, prefixes, prefix_lens):
+        pass
+
+    def shard_purge(self, lsr_id):
+        pass
+
+
+def _drain(sock):
+    try:
+        while sock.recv(RECV_SIZE):
+            pass
+    except socket.error:
+        pass
+
+
+def _wait(predicate):
+    deadline = time.time() + TIMEOUT
+    while not predicate():
+        if time.time() > deadline:
+            raise RuntimeError('timed out')
+        hub.sleep(POLL_INTERVAL)
+
+
+def _run_case(workers, peer_count, labels_per_peer):
+    collector = _Collector()
+    conf = ldp_event.LDPConfig(router_id=ROUTER_ID)
+    shards = ShardManager(conf, workers, collector)
+    shards.start()
+    neighbours = []
+    threads = []
+    try:
+        lsr_ids = ['2.%d.%d.1' % (i >> 8, i & 0xff)
+                   for i in range(peer_count)]
+        mappings = [_label_mappings(lsr_id, i, labels_per_peer)
+                    for i, lsr_id in enumerate(lsr_ids)]
+        start = time.time()
+        for lsr_id in lsr_ids:
+            local, remote = socket.socketpair()
+            shards.add_peer(lsr_id, '127.0.0.1', False)
+            shards.conn_handler(lsr_id)(local, False)
+            remote.sendall(_session_open(lsr_id))
+            neighbours.append(remote)
+            threads.append(hub.spawn(_drain, remote))
+        _wait(lambda: collector.operational == peer_count)
+        setup = time.time() - start
+
+        total = peer_count * labels_per_peer
+        start = time.time()
+        for remote, data in zip(neighbours, mappings):
+            remote.sendall(data)
+        _wait(lambda: collector.bindings >= total)
+        ingest = time.time() - start
+    finally:
+        for remote in neighbours:
+            remote.close()
+        for thread in threads:
+            hub.kill(thread)
+        shards.stop()
+    nbytes = sum(len(data) for data in mappings)
+    return common.report(
+        BENCH, 'workers_%d' % workers, workers=workers, peers=peer_count,
+        labels=total, setup_seconds=setup,
+        sessions_per_sec=peer_count / setup, ingest_seconds=ingest,
+        labels_per_sec=total / ingest, mbps=common.mbps(nbytes, ingest))
+
+
+def run(worker_counts=(1, 2, 4), peer_count=64, labels_per_peer=5000):
+    return [_run_case(workers, peer_count, labels_per_peer)
+            for workers in worker_counts]
+
+
+def main():
+    run()
+
+
+if __name__ == '__main__':
+    main()
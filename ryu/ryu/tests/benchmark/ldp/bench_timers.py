@@ -0,0 +1,211 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Peer timer cost, LoopingCall per timer vs the shared TimerWheel.
+
+Every simulated peer owns a keepalive send timer and a keepalive
+timeout timer which is reset whenever the send timer fires, like a
+session receiving keepalives. The benchmark runs the hub for a while
+and reports CPU time and memory for 1k and 10k peers.
+
+The virtual cases run 10k peers with 180 second keepalives, started
+with random jitter, for an hour of ldp_util.VirtualClock time. Half way
+all peers go silent at once and the report has the resulting expiry
+storm: timeouts, their peak per virtual second and their spread.
+Runs are reproducible by the seed.
+
+Usage:
+PYTHONPATH=. python ryu/tests/benchmark/ldp/bench_timers.py
+"""
+
+import functools
+import gc
+import multiprocessing
+import random
+import resource
+import time
+
+from ryu.lib import hub
+from ryu.services.protocols.ldp import ldp_util
+from ryu.tests.benchmark.ldp import common
+
+BENCH = 'timers'
+
+
+def _cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _max_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class _SimPeer(object):
+    def __init__(self, looping_call_cls, keepalive):
+        self.sent = 0
+        self.timeouts = 0
+        self._keepalive = keepalive
+        self._send_timer = looping_call_cls(self._send)
+        self._timeout_timer = looping_call_cls(self._timeout)
+
+    def start(self):
+        self._send_timer.start(self._keepalive / 3.0)
+        self._timeout_timer.start(self._keepalive, now=False)
+
+    def stop(self):
+        self._send_timer.stop()
+        self._timeout_timer.stop()
+
+    def _send(self):
+        self.sent += 1
+        self._timeout_timer.reset()
+
+    def _timeout(self):
+        self.timeouts += 1
+
+
+def run_peers(looping_call_cls, peer_count, keepalive=3.0, duration=10.0):
+    gc.collect()
+    rss_before = _max_rss_kb()
+    cpu_before = _cpu_time()
+    peers = [_SimPeer(looping_call_cls, keepalive)
+             for _ in range(peer_count)]
+    for peer in peers:
+        peer.start()
+    hub.sleep(duration)
+    cpu = _cpu_time() - cpu_before
+    rss = _max_rss_kb() - rss_before
+    for peer in peers:
+        peer.stop()
+    return {
+        'peers': peer_count,
+        'duration': duration,
+        'cpu_seconds': cpu,
+        'max_rss_delta_kb': rss,
+        'keepalives': sum(p.sent for p in peers),
+        'timeouts': sum(p.timeouts for p in peers),
+    }
+
+
+class _VirtualPeer(_SimPeer):
+    def __init__(self, looping_call_cls, keepalive, clock):
+        super(_VirtualPeer, self).__init__(looping_call_cls, keepalive)
+        self._clock = clock
+        self.expired_at = None
+
+    def silence(self):
+        self._send_timer.stop()
+
+    def _timeout(self):
+        _SimPeer._timeout(self)
+        if self.expired_at is None:
+            self.expired_at = self._clock.time()
+
+
+def run_virtual(peer_count, keepalive=180.0, duration=3600.0, jitter=1.0,
+                seed=0):
+    """Runs peer_count peers for duration seconds of virtual time, all
+    silent from half way on. Peers start at random within
+    jitter * keepalive.
+    """
+    rand = random.Random(seed)
+    clock = ldp_util.VirtualClock()
+    wheel = ldp_util.TimerWheel(clock=clock)
+    wheel.start()
+    looping_call_cls = functools.partial(ldp_util.WheelLoopingCall,
+                                         timer_wheel=wheel)
+    peers = [_VirtualPeer(looping_call_cls, keepalive, clock)
+             for _ in range(peer_count)]
+    silent_at = duration / 2
+    start = time.time()
+    for peer in peers:
+        clock.call_later(rand.uniform(0, jitter * keepalive), peer.start)
+    clock.run_until(silent_at)
+    for peer in peers:
+        peer.silence()
+    clock.run_until(duration)
+    elapsed = time.time() - start
+    wheel.stop()
+    expiries = {}
+    for peer in peers:
+        if peer.expired_at is not None:
+            second = int(peer.expired_at - silent_at)
+            expiries[second] = expiries.get(second, 0) + 1
+        peer.stop()
+    return {
+        'peers': peer_count,
+        'virtual_seconds': duration,
+        'seconds': elapsed,
+        'speedup': duration / elapsed,
+        'callbacks': clock.fired,
+        'keepalives': sum(p.sent for p in peers),
+        'timeouts': sum(p.timeouts for p in peers),
+        'storm_expiries': sum(expiries.values()),
+        'storm_peak_per_sec': max(expiries.values()) if expiries else 0,
+        'storm_spread_seconds': (max(expiries) - min(expiries) + 1
+                                 if expiries else 0),
+    }
+
+
+def run_wheel_ops(count=100000, repeat=3):
+    """Raw schedule/reset/cancel cost of the wheel without the hub."""
+    results = []
+    wheel = ldp_util.TimerWheel()
+
+    def _schedule_cancel():
+        entries = [wheel.schedule(i % 600, _noop) for i in range(count)]
+        for entry in entries:
+            wheel.cancel(entry)
+
+    elapsed = common.best_of(repeat, _schedule_cancel)
+    results.append(common.report(
+        BENCH, 'wheel_schedule_cancel', ops=count * 2, seconds=elapsed,
+        ops_per_sec=count * 2 / elapsed))
+    return results
+
+
+def _noop():
+    pass
+
+
+def main():
+    run_wheel_ops()
+    for jitter in (0.0, 1.0):
+        common.report(BENCH, 'virtual_jitter_%g' % jitter,
+                      **run_virtual(10000, jitter=jitter))
+    # Each case runs in its own process so that max RSS is comparable.
+    for peer_count in (1000, 10000):
+        for case in sorted(_CASES):
+            pool = multiprocessing.Pool(1)
+            metrics = pool.apply(_run_case, (case, peer_count))
+            pool.close()
+            pool.join()
+            common.report(BENCH, case, **metrics)
+
+
+_CASES = {
+    'looping_call': ldp_util.LoopingCall,
+    'timer_wheel': ldp_util.WheelLoopingCall,
+}
+
+
+def _run_case(case, peer_count):
+    return run_peers(_CASES[case], peer_count)
+
+
+if __name__ == '__main__':
+    main()
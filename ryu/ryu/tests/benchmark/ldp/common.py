@@ -0,0 +1,103 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Helpers shared by the LDP benchmarks.
+
+Each benchmark prints one JSON object per result line so that the
+output can be collected and compared between runs, suite.py collects
+them with take_results().
+"""
+
+import json
+import struct
+import sys
+import time
+
+from ryu.services.protocols.ldp.framing import LDP_PDU_HEADER_PACK_STR
+from ryu.services.protocols.ldp.framing import LDP_PDU_LEN_OFFSET
+
+_results = []
+
+
+def best_of(repeat, func, *args, **kwargs):
+    """Runs func repeat times and returns the fastest wall time."""
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        func(*args, **kwargs)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def report(bench, case, **metrics):
+    result = {'bench': bench, 'case': case}
+    result.update(metrics)
+    sys.stdout.write(json.dumps(result, sort_keys=True) + '\n')
+    sys.stdout.flush()
+    _results.append(result)
+    return result
+
+
+def take_results():
+    """Returns the results reported since the last call."""
+    results = list(_results)
+    del _results[:]
+    return results
+
+
+def mbps(nbytes, elapsed):
+    if not elapsed:
+        return 0.0
+    return nbytes / elapsed / (1024.0 * 1024.0)
+
+
+def make_pdu(body, router_id=b'\x01\x01\x01\x01', label_space_id=0):
+    """Wraps body (chained messages) with a PDU header."""
+    return struct.pack(LDP_PDU_HEADER_PACK_STR, 1,
+                       len(body) + 6, router_id,
+                       label_space_id) + body
+
+
+def make_stream(pdu_count, body_len):
+    """Returns a byte stream of pdu_count PDUs with dummy bodies."""
+    pdu = make_pdu(b'\x00' * body_len)
+    assert len(pdu) - LDP_PDU_LEN_OFFSET == \
+        struct.unpack_from('!H', pdu, 2)[0]
+    return pdu * pdu_count
+
+
+class StreamSocket(object):
+    """Socket stand-in that replays a byte stream in chunks."""
+
+    def __init__(self, data, chunk_size):
+        self._data = memoryview(data)
+        self._offset = 0
+        self._chunk_size = chunk_size
+
+    def recv(self, size):
+        size = min(size, self._chunk_size)
+        chunk = self._data[self._offset:self._offset + size].tobytes()
+        self._offset += len(chunk)
+        return chunk
+
+    def recv_into(self, view):
+        size = min(len(view), self._chunk_size,
+                   len(self._data) - self._offset)
+        view[:size] = self._data[self._offset:self._offset + size]
+        self._offset += size
+        return size
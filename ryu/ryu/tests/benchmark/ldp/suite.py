@@ -0,0 +1,149 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Runs the LDP benchmarks and writes all results as one JSON document,
+optionally compared with the document of an earlier run, e.g. of the
+last release.
+
+Results are matched by bench, case and the order in which a case was
+reported. Metrics ending with per_sec are better higher, those ending
+with seconds better lower; a change for the worse of more than the
+threshold is a regression and the exit status is 1.
+
+Usage:
+PYTHONPATH=. python ryu/tests/benchmark/ldp/suite.py -o release.json
+PYTHONPATH=. python ryu/tests/benchmark/ldp/suite.py -o new.json \\
+    --baseline release.json messages peer_receive backend
+"""
+
+import argparse
+import importlib
+import json
+import platform
+import sys
+import time
+
+import ryu
+from ryu.tests.benchmark.ldp import common
+
+BENCHMARKS = ('messages', 'codec', 'framing', 'peer_receive', 'bulk',
+              'info_base', 'fec_index', 'timers', 'backend', 'shard')
+DEFAULT_THRESHOLD = 0.1
+
+
+def run_benchmarks(names):
+    """Returns the results of the benchmarks and, by name, why the ones
+    that could not be imported were skipped.
+    """
+    results = []
+    skipped = {}
+    for name in names:
+        try:
+            module = importlib.import_module(
+                'ryu.tests.benchmark.ldp.bench_%s' % name)
+        except ImportError as e:
+            skipped[name] = str(e)
+            continue
+        module.main()
+        results.extend(common.take_results())
+    return results, skipped
+
+
+def environment():
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    return {'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'ryu': getattr(ryu, 'version', None),
+            'numpy': numpy.__version__ if numpy is not None else None,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+
+
+def _keyed(results):
+    keyed = {}
+    seen = {}
+    for result in results:
+        case = (result['bench'], result['case'])
+        index = seen.get(case, 0)
+        seen[case] = index + 1
+        keyed[case + (index, )] = result
+    return keyed
+
+
+def compare(baseline, results, threshold=DEFAULT_THRESHOLD):
+    """Returns the regressions of results against baseline."""
+    regressions = []
+    old_results = _keyed(baseline)
+    for key, result in sorted(_keyed(results).items()):
+        old = old_results.get(key)
+        if old is None:
+            continue
+        for metric, value in sorted(result.items()):
+            old_value = old.get(metric)
+            if not isinstance(value, (int, float)) or not old_value or \
+                    isinstance(value, bool):
+                continue
+            if metric.endswith('per_sec'):
+                change = (old_value - value) / float(old_value)
+            elif metric.endswith('seconds'):
+                change = (value - old_value) / float(old_value)
+            else:
+                continue
+            if change > threshold:
+                regressions.append({'bench': key[0], 'case': key[1],
+                                    'metric': metric,
+                                    'baseline': old_value, 'value': value,
+                                    'change': change})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='LDP benchmark suite')
+    parser.add_argument('benchmarks', nargs='*', metavar='BENCHMARK',
+                        help='of %s, default all' % ', '.join(BENCHMARKS))
+    parser.add_argument('-o', '--output', help='JSON document to write')
+    parser.add_argument('--baseline', help='JSON document to compare with')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='relative change reported as regression')
+    args = parser.parse_args(argv)
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error('unknown benchmark %s' % name)
+
+    results, skipped = run_benchmarks(args.benchmarks or BENCHMARKS)
+    document = {'environment': environment(),
+                'results': results,
+                'skipped': skipped}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        document['baseline'] = baseline['environment']
+        document['regressions'] = compare(baseline['results'], results,
+                                          args.threshold)
+        for regression in document['regressions']:
+            sys.stderr.write('regression %(bench)s %(case)s %(metric)s: '
+                             '%(baseline)s -> %(value)s\n' % regression)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+    return 1 if document.get('regressions') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
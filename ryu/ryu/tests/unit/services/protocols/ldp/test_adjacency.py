@@ -0,0 +1,68 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from nose.tools import eq_
+from nose.tools import ok_
+
+from ryu.services.protocols.ldp import adjacency
+
+
+class Test_adjacency(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.adjacency
+    """
+
+    def setUp(self):
+        self.now = 0
+        self.expired = []
+        self.table = adjacency.AdjacencyTable(self.expired.append,
+                                              clock=lambda: self.now)
+
+    def tearDown(self):
+        pass
+
+    def test_negotiate_hold_time(self):
+        eq_(adjacency.negotiate_hold_time(0, 0), 15)
+        eq_(adjacency.negotiate_hold_time(0, 0, targeted=True), 45)
+        eq_(adjacency.negotiate_hold_time(30, 10), 10)
+
+    def test_expire(self):
+        self.table.add('eth0', '2.2.2.2', 0, None, 15)
+        self.table.add('eth0', '3.3.3.3', 0, None, 5)
+        eq_(self.table.sweep(4), [])
+        expired = self.table.sweep(5)
+        eq_([adj.lsr_id for adj in expired], ['3.3.3.3'])
+        eq_(self.expired, expired)
+        ok_(not self.table.has_lsr('3.3.3.3'))
+        ok_(self.table.has_lsr('2.2.2.2'))
+
+    def test_refresh(self):
+        self.table.add('eth0', '2.2.2.2', 0, None, 15)
+        key = ('eth0', '2.2.2.2', 0)
+        self.now = 10
+        ok_(self.table.refresh(key) is not None)
+        eq_(self.table.sweep(15), [])
+        eq_(len(self.table), 1)
+        eq_(len(self.table.sweep(25)), 1)
+        eq_(self.table.refresh(key), None)
+
+    def test_lsr_over_interfaces(self):
+        self.table.add('eth0', '2.2.2.2', 0, None, 15)
+        self.table.add('eth1', '2.2.2.2', 0, None, 30)
+        self.table.sweep(15)
+        ok_(self.table.has_lsr('2.2.2.2'))
+        self.table.remove(('eth1', '2.2.2.2', 0))
+        ok_(not self.table.has_lsr('2.2.2.2'))
+        eq_(self.table.sweep(100), [])
@@ -0,0 +1,102 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import socket
+import unittest
+from nose.tools import eq_, ok_
+
+try:
+    from ryu.services.protocols.ldp import aio
+except ImportError:
+    # neither asyncio nor trollius
+    aio = None
+
+
+class _Session(object):
+    def __init__(self, backend):
+        self._backend = backend
+        self.writer = None
+        self.is_active = None
+        self.received = []
+        self.lost = None
+
+    def connection_made(self, conn, is_active):
+        self.is_active = is_active
+        self.writer = self._backend.create_writer(conn, 1024, 256)
+        self.writer.write(b'ping')
+
+    def data_received(self, data):
+        self.received.append(data)
+
+    def connection_lost(self, reason):
+        self.lost = reason
+
+
+@unittest.skipIf(aio is None, 'asyncio is not available')
+class Test_aio(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.aio
+    """
+
+    def setUp(self):
+        self.loop = aio.new_event_loop(use_uvloop=False)
+        self.backend = aio.AsyncioBackend(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def _run(self, seconds):
+        self.loop.call_later(seconds, self.loop.stop)
+        self.loop.run_forever()
+
+    def test_looping_call(self):
+        calls = []
+        looping_call = self.backend.create_looping_call(calls.append, 1)
+        looping_call.start(0.01)
+        self._run(0.055)
+        looping_call.stop()
+        ok_(4 <= len(calls) <= 7, len(calls))
+        self._run(0.03)
+        ok_(len(calls) <= 7)
+
+    def test_session(self):
+        local, remote = socket.socketpair()
+        remote.settimeout(1)
+        session = _Session(self.backend)
+        self.backend.start_session(local, session, True)
+        self._run(0.02)
+        eq_(session.is_active, True)
+        eq_(remote.recv(4), b'ping')
+        remote.sendall(b'pong')
+        remote.close()
+        self._run(0.02)
+        eq_(b''.join(session.received), b'pong')
+        eq_(session.lost, 'Peer closed connection')
+
+    def test_acceptor_hold(self):
+        acceptor = self.backend.create_acceptor(('127.0.0.1', 0))
+        acceptor.start()
+        self._run(0.01)
+        client = socket.create_connection(acceptor.address, 1)
+        self._run(0.02)
+        # held until the session of the address is registered
+        eq_(acceptor.stats.accepts, 0)
+        session = _Session(self.backend)
+        acceptor.register('127.0.0.1', session)
+        self._run(0.02)
+        eq_(acceptor.stats.accepts, 1)
+        eq_(session.is_active, False)
+        eq_(client.recv(4), b'ping')
+        client.close()
+        acceptor.stop()
+        self._run(0.01)
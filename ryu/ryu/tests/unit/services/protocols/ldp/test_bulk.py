@@ -0,0 +1,158 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import socket
+import struct
+import unittest
+from array import array
+from nose.tools import eq_, ok_
+
+from ryu.services.protocols.ldp import bulk
+from ryu.services.protocols.ldp.framing import LDP_PDU_HEADER_LEN
+from ryu.services.protocols.ldp.framing import PDUCoalescer
+from ryu.services.protocols.ldp.framing import PDUFramer
+from ryu.services.protocols.ldp.message_view import TLV_ADDRESS_LIST
+from ryu.services.protocols.ldp.message_view import TLV_FEC
+from ryu.services.protocols.ldp.message_view import TLV_GENERIC_LABEL
+from ryu.services.protocols.ldp.message_view import BadTlvLength
+from ryu.services.protocols.ldp.message_view import parse_pdu
+
+# FEC element values of one prefix each
+IPV6_FEC = b'\x02\x00\x02\x40' + b'\x20\x01' * 4
+OVERSIZED_FEC = b'\x02\x00\x01\x28' + b'\x0a' * 5
+TRUNCATED_FEC = b'\x02\x00\x01\x18\x0a\x01'
+IPV4_FEC = b'\x02\x00\x01\x18\x0a\x01\x02'
+
+
+def _addr(addr):
+    return struct.unpack('!I', socket.inet_aton(addr))[0]
+
+
+def _mapping(fec, label=16):
+    """A Label Mapping message of the FEC TLV value fec."""
+    body = struct.pack('!HH', TLV_FEC, len(fec)) + fec + \
+        struct.pack('!HHI', TLV_GENERIC_LABEL, 4, label)
+    return struct.pack('!HHI', bulk.LDP_MSG_LABEL_MAPPING,
+                       len(body) + 4, 1) + body
+
+
+class Test_bulk(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.bulk
+    """
+
+    def setUp(self):
+        self.prefixes = array('I', [_addr('10.0.0.1'), _addr('10.1.0.0'),
+                                    _addr('172.16.0.0'), 0])
+        self.prefix_lens = array('B', [32, 16, 12, 0])
+        self.labels = array('I', [16, 1000, 0xfffff, 3])
+
+    def tearDown(self):
+        pass
+
+    def test_label_mappings(self):
+        buf, ends = bulk.encode_label_mappings(
+            self.prefixes, self.prefix_lens, self.labels, msg_id=5)
+        eq_(list(ends), [28, 54, 80, 104])
+        views = parse_pdu(b'\x00' * LDP_PDU_HEADER_LEN + bytes(buf))
+        eq_([v.msg_id for v in views], [5, 6, 7, 8])
+        eq_(views[1].tlv(TLV_GENERIC_LABEL).label, 1000)
+        element, = views[2].tlv(TLV_FEC).fec_elements
+        eq_((element.prefix, element.element_len), ('172.16.0.0', 12))
+        prefixes, prefix_lens, labels, others = \
+            bulk.decode_label_mappings(buf)
+        eq_(prefixes, self.prefixes)
+        eq_(prefix_lens, self.prefix_lens)
+        eq_(labels, self.labels)
+        eq_(len(others), 0)
+
+    def _pure_python(self, func, *args, **kwargs):
+        numpy = bulk.numpy
+        bulk.numpy = None
+        try:
+            return func(*args, **kwargs)
+        finally:
+            bulk.numpy = numpy
+
+    def test_pure_python_encoder(self):
+        # NumPy, where it is installed, and pure Python give the same
+        # messages
+        args = (self.prefixes * 20, self.prefix_lens * 20, self.labels * 20)
+        expected = self._pure_python(bulk.encode_label_mappings, *args,
+                                     msg_id=7)
+        numpy_min_count = bulk.NUMPY_MIN_COUNT
+        bulk.NUMPY_MIN_COUNT = 0
+        try:
+            encoded = bulk.encode_label_mappings(*args, msg_id=7)
+        finally:
+            bulk.NUMPY_MIN_COUNT = numpy_min_count
+        eq_(bytes(encoded[0]), bytes(expected[0]))
+        eq_(list(encoded[1]), list(expected[1]))
+        prefixes, prefix_lens, labels, others = \
+            bulk.decode_label_mappings(expected[0])
+        eq_(labels, args[2])
+        eq_(prefixes, args[0])
+        addrs = array('I', range(1, 301))
+        expected = self._pure_python(bulk.encode_addresses, addrs,
+                                     max_addresses=100)
+        encoded = bulk.encode_addresses(addrs, max_addresses=100)
+        eq_(bytes(encoded[0]), bytes(expected[0]))
+        eq_(list(encoded[1]), list(expected[1]))
+        eq_(bulk.decode_addresses(expected[0])[0], addrs)
+
+    def test_frame_pdus(self):
+        count = 500
+        buf, ends = bulk.encode_label_mappings(
+            array('I', range(count)), array('B', [32] * count),
+            array('I', range(16, 16 + count)))
+        header = PDUCoalescer('1.1.1.1').header
+        data = bulk.frame_pdus(buf, ends, header, max_pdu_len=512)
+        framer = PDUFramer()
+        framer.feed(data)
+        labels = []
+        for pdu in framer.pdus():
+            ok_(len(pdu) <= 512)
+            eq_(pdu[4:LDP_PDU_HEADER_LEN].tobytes(), bytes(header[4:]))
+            labels.extend(bulk.decode_label_mappings(
+                pdu, LDP_PDU_HEADER_LEN)[2])
+        eq_(labels, list(range(16, 16 + count)))
+
+    def test_addresses(self):
+        addrs = array('I', range(1, 2001))
+        buf, ends = bulk.encode_addresses(addrs, max_addresses=1000)
+        eq_(len(ends), 2)
+        view = parse_pdu(b'\x00' * LDP_PDU_HEADER_LEN + bytes(buf))[1]
+        eq_(view.tlv(TLV_ADDRESS_LIST).addresses[0], '0.0.3.233')
+        added, withdrawn, others = bulk.decode_addresses(buf)
+        eq_(added, addrs)
+        eq_(len(withdrawn), 0)
+        eq_(len(others), 0)
+
+    def test_decode_fallback(self):
+        prefixes, prefix_lens, labels = array('I'), array('B'), array('I')
+        for fec in (IPV6_FEC, OVERSIZED_FEC, TRUNCATED_FEC,
+                    IPV4_FEC + IPV6_FEC):
+            msg = _mapping(fec)
+            ok_(not bulk.decode_mapping_into(msg, 0, len(msg), prefixes,
+                                             prefix_lens, labels))
+            eq_(len(labels), 0)
+        msg = _mapping(IPV4_FEC)
+        ok_(bulk.decode_mapping_into(msg, 0, len(msg), prefixes,
+                                     prefix_lens, labels))
+        eq_((list(prefixes), list(prefix_lens), list(labels)),
+            ([_addr('10.1.2.0')], [24], [16]))
+        # the FEC TLV runs past the end of the message
+        msg = bytearray(msg)
+        msg[11] += 12
+        self.assertRaises(BadTlvLength, bulk.decode_mapping_into, msg, 0,
+                          len(msg), prefixes, prefix_lens, labels)
@@ -0,0 +1,102 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import struct
+import unittest
+from array import array
+from nose.tools import eq_, ok_
+
+from ryu.services.protocols.ldp import bulk
+from ryu.services.protocols.ldp import decode_pool
+from ryu.services.protocols.ldp.framing import PDUCoalescer
+from ryu.services.protocols.ldp.message_view import BadMessageLength
+from ryu.services.protocols.ldp.message_view import BadTlvLength
+from ryu.services.protocols.ldp.message_view import MessageView
+
+# Keepalive message without TLVs
+KEEPALIVE = struct.pack('!HHI', 0x0201, 4, 99)
+# Label Mapping of the IPv6 prefix 2001:2001::/64, label 16
+IPV6_MAPPING = struct.pack('!HHIHHBHB', 0x0400, 28, 5, 0x0100, 12, 2, 2,
+                           64) + b'\x20\x01' * 4 + \
+    struct.pack('!HHI', 0x0200, 4, 16)
+
+
+def _mappings(first, count):
+    buf, ends = bulk.encode_label_mappings(
+        array('I', range(first, first + count)), array('B', [32] * count),
+        array('I', range(first, first + count)))
+    return bytes(buf)
+
+
+class Test_decode_pool(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.decode_pool
+    """
+
+    def setUp(self):
+        coalescer = PDUCoalescer('1.1.1.1', max_pdu_len=512)
+        pdus = []
+        for msgs in (_mappings(100, 30), KEEPALIVE, _mappings(200, 5)):
+            pdus.extend(coalescer.add(msgs))
+        pdus.append(coalescer.flush())
+        self.data = b''.join(bytes(pdu) for pdu in pdus)
+
+    def tearDown(self):
+        pass
+
+    def test_records_in_order(self):
+        records = decode_pool.decode_pdus(self.data)
+        eq_([record[0] for record in records],
+            [decode_pool.RECORD_BINDINGS, decode_pool.RECORD_MESSAGES,
+             decode_pool.RECORD_BINDINGS])
+        kind, msg_count, prefixes, prefix_lens, labels = records[0]
+        eq_(msg_count, 30)
+        eq_(list(labels), list(range(100, 130)))
+        offset, = records[1][1]
+        eq_(MessageView(self.data, offset).msg_id, 99)
+        eq_(list(records[2][4]), list(range(200, 205)))
+
+    def test_pool(self):
+        pool = decode_pool.DecodePool(1, offload_min_bytes=100)
+        ok_(not pool.should_offload(1000))
+        pool.start()
+        try:
+            ok_(pool.should_offload(100))
+            ok_(not pool.should_offload(99))
+            eq_(pool.decode(self.data), decode_pool.decode_pdus(self.data))
+            eq_(pool.stats()['jobs'], 1)
+        finally:
+            pool.stop()
+
+    def test_bad_message_length(self):
+        coalescer = PDUCoalescer('1.1.1.1')
+        coalescer.add(KEEPALIVE)
+        pdu = bytearray(coalescer.flush())
+        # the keepalive claims 4 more bytes than the PDU has
+        pdu[13] += 4
+        self.assertRaises(BadMessageLength, decode_pool.decode_pdus,
+                          bytes(pdu))
+
+    def test_fec_fallback(self):
+        coalescer = PDUCoalescer('1.1.1.1')
+        coalescer.add(_mappings(100, 2) + IPV6_MAPPING)
+        pdu = bytearray(coalescer.flush())
+        records = decode_pool.decode_pdus(bytes(pdu))
+        eq_([record[0] for record in records],
+            [decode_pool.RECORD_BINDINGS, decode_pool.RECORD_MESSAGES])
+        eq_(records[0][1], 2)
+        eq_(len(records[1][1]), 1)
+        # the FEC TLV of the last message runs past its end
+        pdu[-21] += 40
+        self.assertRaises(BadTlvLength, decode_pool.decode_pdus,
+                          bytes(pdu))
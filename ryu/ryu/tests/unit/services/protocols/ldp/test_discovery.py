@@ -0,0 +1,137 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import socket
+import struct
+import unittest
+from nose.tools import eq_, ok_
+
+from ryu.services.protocols.ldp import discovery
+from ryu.services.protocols.ldp.discovery import DiscoveryEngine
+from ryu.services.protocols.ldp.event import LDPInterfaceConf
+
+
+class _Stop(Exception):
+    pass
+
+
+class _Socket(object):
+    def __init__(self, received=()):
+        self.received = list(received)
+        self.options = []
+        self.sent = []
+
+    def setsockopt(self, level, option, value):
+        self.options.append((level, option, value))
+
+    def recvmsg(self, bufsize, ancbufsize):
+        if not self.received:
+            raise _Stop()
+        received = self.received.pop(0)
+        if isinstance(received, Exception):
+            raise received
+        return received
+
+    def sendmsg(self, buffers, ancdata, flags, addr):
+        self.sent.append((buffers, ancdata, flags, addr))
+
+    def close(self):
+        pass
+
+
+def _pktinfo(ifindex):
+    return (socket.IPPROTO_IP, discovery.IP_PKTINFO,
+            struct.pack(discovery.IN_PKTINFO_PACK_STR, ifindex,
+                        socket.inet_aton('10.0.0.1'),
+                        socket.inet_aton(discovery.ALL_ROUTER)))
+
+
+class Test_discovery(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.discovery
+    """
+
+    def setUp(self):
+        if not DiscoveryEngine.is_supported():
+            self.skipTest('recvmsg and if_nametoindex are not supported')
+        self.socket = _Socket()
+        self.engine = DiscoveryEngine(self.socket)
+        self.endpoint = self.engine.add_interface(
+            LDPInterfaceConf('127.0.0.1', 'lo'))
+        self.hellos = []
+        # not started, the receive loop is run by the tests
+        self.endpoint.handler = self._hello_received
+
+    def tearDown(self):
+        pass
+
+    def _hello_received(self, data, addr):
+        if data == b'bad':
+            raise ValueError(data)
+        self.hellos.append((data, addr))
+
+    def test_add_interface(self):
+        ifindex = socket.if_nametoindex('lo')
+        eq_(self.endpoint.ifindex, ifindex)
+        eq_(self.socket.options, [(
+            socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+            struct.pack(discovery.IP_MREQN_PACK_STR,
+                        socket.inet_aton(discovery.ALL_ROUTER),
+                        socket.inet_aton('127.0.0.1'), ifindex))])
+
+    def test_ifindex(self):
+        eq_(DiscoveryEngine._ifindex([_pktinfo(3)]), 3)
+        # other control messages are skipped
+        eq_(DiscoveryEngine._ifindex(
+            [(socket.SOL_SOCKET, socket.SCM_RIGHTS, b'\x00' * 4),
+             _pktinfo(5)]), 5)
+        eq_(DiscoveryEngine._ifindex([]), None)
+
+    def test_datagram_received(self):
+        addr = ('10.0.0.2', discovery.LDP_DISCOVERY_PORT)
+        ifindex = self.endpoint.ifindex
+        self.engine._datagram_received(b'hello', [_pktinfo(ifindex)], addr)
+        # on an interface without endpoint, or without pktinfo
+        self.engine._datagram_received(b'other', [_pktinfo(ifindex + 1)],
+                                       addr)
+        self.engine._datagram_received(b'other', [], addr)
+        # a failing handler does not stop the next hellos
+        self.engine._datagram_received(b'bad', [_pktinfo(ifindex)], addr)
+        eq_(self.hellos, [(b'hello', addr)])
+        # a stopped endpoint receives nothing
+        self.endpoint.stop()
+        self.engine._datagram_received(b'hello', [_pktinfo(ifindex)], addr)
+        eq_(len(self.hellos), 1)
+
+    def test_recv_loop(self):
+        addr = ('10.0.0.2', discovery.LDP_DISCOVERY_PORT)
+        ancdata = [_pktinfo(self.endpoint.ifindex)]
+        self.socket.received = [
+            (b'first', ancdata, 0, addr),
+            socket.error(111, 'Connection refused'),
+            (b'second', ancdata, 0, addr)]
+        self.assertRaises(_Stop, self.engine._recv_loop)
+        eq_(self.hellos, [(b'first', addr), (b'second', addr)])
+
+    def test_sendto(self):
+        addr = (discovery.ALL_ROUTER, discovery.LDP_DISCOVERY_PORT)
+        self.endpoint.sendto(b'hello', addr)
+        buffers, ancdata, flags, dst = self.socket.sent[0]
+        eq_((buffers, flags, dst), ([b'hello'], 0, addr))
+        (level, cmsg_type, pktinfo), = ancdata
+        eq_((level, cmsg_type), (socket.IPPROTO_IP, discovery.IP_PKTINFO))
+        # the outgoing interface and source address of the endpoint
+        eq_(struct.unpack(discovery.IN_PKTINFO_PACK_STR, pktinfo),
+            (self.endpoint.ifindex, socket.inet_aton('127.0.0.1'),
+             b'\x00' * 4))
+        ok_(self.engine.socket is self.socket)
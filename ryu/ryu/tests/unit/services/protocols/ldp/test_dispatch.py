@@ -0,0 +1,141 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+from nose.tools import eq_, ok_
+
+from ryu.services.protocols.ldp.bulk import LDP_MSG_LABEL_MAPPING
+from ryu.services.protocols.ldp.dispatch import MessageDispatcher
+
+# message types (RFC 5036 3.7)
+_NOTIFICATION = 0x0001
+_ADDRESS = 0x0300
+_LABEL_MAPPING = 0x0400
+
+
+class _Msg(object):
+    def __init__(self, msg_type):
+        self.type = msg_type
+
+
+class _Peer(object):
+    name = 'peer'
+
+
+class _App(object):
+    def __init__(self):
+        self.events = []
+
+    def send_event(self, name, ev):
+        self.events.append((name, ev))
+
+
+def _mapping_received(peer, msg):
+    pass
+
+
+def _bindings_received(peer, prefixes, prefix_lens, labels):
+    pass
+
+
+class Test_dispatch(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.dispatch
+    """
+
+    def setUp(self):
+        self.app = _App()
+        self.dispatcher = MessageDispatcher(self.app)
+
+    def tearDown(self):
+        pass
+
+    def _batches(self):
+        batches = dict((name, ev.msgs) for name, ev in self.app.events)
+        del self.app.events[:]
+        return batches
+
+    def test_subscribe(self):
+        dispatcher = self.dispatcher
+        dispatcher.subscribe('a', [_LABEL_MAPPING, _ADDRESS])
+        dispatcher.subscribe('b', [_LABEL_MAPPING])
+        peer = _Peer()
+        msgs = [_Msg(_LABEL_MAPPING), _Msg(_ADDRESS), _Msg(_NOTIFICATION),
+                _Msg(_LABEL_MAPPING)]
+        dispatcher.dispatch(peer, msgs)
+        # one batch per application of the subscribed types in order
+        for name, ev in self.app.events:
+            ok_(ev.peer is peer)
+            eq_(ev.instance_name, 'peer')
+        eq_(self._batches(), {'a': [msgs[0], msgs[1], msgs[3]],
+                              'b': [msgs[0], msgs[3]]})
+        eq_(dispatcher.batch_count, 2)
+        eq_(dispatcher.msg_counts, {_LABEL_MAPPING: 2, _ADDRESS: 1,
+                                    _NOTIFICATION: 1})
+
+        dispatcher.unsubscribe('a', [_ADDRESS])
+        dispatcher.dispatch(peer, [msgs[1]])
+        eq_(self._batches(), {})
+        dispatcher.unsubscribe('b')
+        dispatcher.dispatch(peer, msgs)
+        eq_(self._batches(), {'a': [msgs[0], msgs[3]]})
+
+    def test_callback(self):
+        calls = []
+
+        def failing(peer, msg):
+            raise ValueError('callback')
+
+        def callback(peer, msg):
+            calls.append(msg)
+
+        dispatcher = self.dispatcher
+        dispatcher.register_callback([_LABEL_MAPPING], failing)
+        dispatcher.register_callback([_LABEL_MAPPING, _ADDRESS], callback)
+        msgs = [_Msg(_LABEL_MAPPING), _Msg(_NOTIFICATION), _Msg(_ADDRESS)]
+        # a failing callback does not keep the message from the others
+        dispatcher.dispatch(_Peer(), msgs)
+        eq_(calls, [msgs[0], msgs[2]])
+        # callbacks go without batches
+        eq_(self.app.events, [])
+        eq_(dispatcher.batch_count, 0)
+
+        dispatcher.unregister_callback([_LABEL_MAPPING], callback)
+        dispatcher.dispatch(_Peer(), msgs)
+        eq_(calls, [msgs[0], msgs[2], msgs[2]])
+
+    def test_accepts_bindings(self):
+        dispatcher = self.dispatcher
+        ok_(not dispatcher.accepts_bindings())
+        dispatcher.register_callback([LDP_MSG_LABEL_MAPPING],
+                                     _mapping_received)
+        dispatcher.register_bindings_callback(_bindings_received,
+                                              replaces=_mapping_received)
+        ok_(dispatcher.accepts_bindings())
+        dispatcher.subscribe('app', [LDP_MSG_LABEL_MAPPING])
+        ok_(not dispatcher.accepts_bindings())
+        dispatcher.unsubscribe('app')
+        ok_(dispatcher.accepts_bindings())
+        dispatcher.unregister_bindings_callback(_bindings_received)
+        ok_(not dispatcher.accepts_bindings())
+
+    def test_unrelated_bindings_callback(self):
+        # another application's Label Mapping callback needs messages,
+        # whatever the number of bindings callbacks
+        dispatcher = self.dispatcher
+        dispatcher.register_bindings_callback(_bindings_received,
+                                              replaces=_mapping_received)
+        dispatcher.register_bindings_callback(lambda *args: None)
+        dispatcher.register_callback([LDP_MSG_LABEL_MAPPING],
+                                     lambda peer, msg: None)
+        ok_(not dispatcher.accepts_bindings())
@@ -0,0 +1,173 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import socket
+import struct
+import unittest
+from nose.tools import eq_, ok_
+
+from ryu.lib import hub
+from ryu.lib.packet import ldp
+from ryu.services.protocols.ldp import bulk
+from ryu.services.protocols.ldp.backend import EventletBackend
+from ryu.services.protocols.ldp.distribution import DistributionEngine
+from ryu.services.protocols.ldp.info_base import fec_from_key
+from ryu.services.protocols.ldp.info_base import fec_key
+
+
+class _Conf(object):
+    router_id = '1.1.1.1'
+
+
+class _App(object):
+    config = _Conf()
+    io_backend = EventletBackend()
+
+
+class _Peer(object):
+    def __init__(self, lsr_id):
+        self.peer_router_id = lsr_id
+        self.name = lsr_id
+        self.sent = []
+        self.flushes = 0
+        self.bulks = 0
+        self.msg_id = 0
+        self.writable = True
+        self.broken = False
+        self.stopped = False
+
+    def send_msg(self, msg, flush=False):
+        self.sent.append(msg)
+
+    def next_msg_ids(self, count):
+        self.msg_id += count
+        return self.msg_id - count + 1
+
+    def send_bulk(self, buf, ends):
+        # label mappings are recorded as (prefix, prefix_len, label)
+        if self.broken:
+            raise IOError('broken')
+        addrs, withdrawn, others = bulk.decode_addresses(buf)
+        if len(addrs):
+            eq_(len(others), 0)
+            self.sent.append(('addresses',
+                              [socket.inet_ntoa(struct.pack('!I', addr))
+                               for addr in addrs]))
+            return
+        self.bulks += 1
+        prefixes, prefix_lens, labels, others = \
+            bulk.decode_label_mappings(buf)
+        eq_(len(others), 0)
+        for i in range(len(labels)):
+            prefix, prefix_len = fec_from_key(
+                (prefixes[i] << 6) | prefix_lens[i])
+            self.sent.append((prefix, prefix_len, labels[i]))
+
+    def flush(self):
+        self.flushes += 1
+
+    def stop(self):
+        self.stopped = True
+
+    def wait_writable(self, timeout=None):
+        while not self.writable:
+            hub.sleep(0.001)
+        return True
+
+    def call_when_writable(self, callback, *args):
+        def _wait():
+            self.wait_writable()
+            callback(*args)
+        hub.spawn(_wait)
+
+
+class Test_distribution(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.distribution
+    """
+
+    def setUp(self):
+        # flush is called by the tests
+        self.engine = DistributionEngine(_App(), flush_delay=60,
+                                         sync_chunk_size=4)
+        for i in range(10):
+            self.engine.bind(fec_key('10.0.0.%d' % i, 32), 100 + i)
+        self.engine.add_address('192.168.0.1')
+        self.peer = _Peer('2.2.2.2')
+        self.engine.peer_up(self.peer)
+        hub.sleep(0.01)
+
+    def tearDown(self):
+        self.engine.peer_down(self.peer.peer_router_id)
+
+    def test_full_sync(self):
+        eq_(self.peer.sent[0], ('addresses', ['192.168.0.1']))
+        eq_(len(self.peer.sent), 11)
+        # one bulk send per chunk
+        eq_(self.peer.bulks, 3)
+        eq_(self.peer.msg_id, 11)
+        eq_(len(list(self.engine.advertised('2.2.2.2'))), 10)
+
+    def test_delta(self):
+        self.peer.sent = []
+        self.engine.bind(fec_key('10.0.0.1', 32), 500)
+        self.engine.bind(fec_key('10.0.0.4', 32), 104)
+        self.engine.unbind(fec_key('10.0.0.2', 32))
+        self.engine.unbind(fec_key('10.0.0.3', 32))
+        self.engine.flush()
+        mapping, withdraw = self.peer.sent
+        eq_(mapping, ('10.0.0.1', 32, 500))
+        eq_(type(withdraw), ldp.LDPLabelWithdraw)
+        fec = withdraw.tlvs[0]
+        eq_(sorted(e.prefix for e in fec.fec_elements),
+            ['10.0.0.2', '10.0.0.3'])
+        eq_(sorted(self.engine.advertised('2.2.2.2'))[1],
+            ('10.0.0.1', 32, 500))
+        self.engine.flush()
+        eq_(len(self.peer.sent), 2)
+
+    def test_add_address(self):
+        self.peer.sent = []
+        self.engine.add_address('192.168.0.2')
+        self.engine.add_address('192.168.0.2')
+        eq_(self.peer.sent, [('addresses', ['192.168.0.2'])])
+        eq_(self.engine.addresses, ['192.168.0.1', '192.168.0.2'])
+
+    def test_backpressure(self):
+        self.peer.sent = []
+        self.peer.writable = False
+        self.engine.bind(fec_key('10.0.0.1', 32), 500)
+        self.engine.flush()
+        self.engine.bind(fec_key('10.0.0.2', 32), 501)
+        self.engine.flush()
+        hub.sleep(0.01)
+        eq_(self.peer.sent, [])
+        self.peer.writable = True
+        hub.sleep(0.01)
+        eq_(len(self.peer.sent), 2)
+
+    def test_send_failed(self):
+        other = _Peer('3.3.3.3')
+        self.engine.peer_up(other)
+        hub.sleep(0.01)
+        self.peer.sent = []
+        other.sent = []
+        self.peer.broken = True
+        self.engine.bind(fec_key('10.0.0.1', 32), 500)
+        self.engine.flush()
+        ok_(self.peer.stopped)
+        eq_(list(self.engine.advertised('2.2.2.2')), [])
+        eq_(other.sent, [('10.0.0.1', 32, 500)])
+        ok_(not other.stopped)
+        eq_(self.engine.stats()['peers'], 1)
+        self.engine.peer_down(other.peer_router_id)
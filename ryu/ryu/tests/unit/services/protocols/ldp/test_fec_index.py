@@ -0,0 +1,72 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from nose.tools import eq_
+
+from ryu.services.protocols.ldp.fec_index import FecIndex
+
+
+class Test_fec_index(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.fec_index
+    """
+
+    def setUp(self):
+        self.index = FecIndex()
+        for prefix, prefix_len in (('0.0.0.0', 0), ('10.0.0.0', 8),
+                                   ('10.1.0.0', 16), ('10.1.2.0', 24),
+                                   ('10.1.2.3', 32), ('10.2.0.0', 16)):
+            self.index.insert(prefix, prefix_len, prefix_len)
+
+    def tearDown(self):
+        pass
+
+    def test_lookup(self):
+        eq_(self.index.lookup('10.1.2.3'), ('10.1.2.3', 32, 32))
+        eq_(self.index.lookup('10.1.2.4'), ('10.1.2.0', 24, 24))
+        eq_(self.index.lookup('10.1.3.1'), ('10.1.0.0', 16, 16))
+        eq_(self.index.lookup('10.3.0.1'), ('10.0.0.0', 8, 8))
+        eq_(self.index.lookup('192.168.0.1'), ('0.0.0.0', 0, 0))
+        eq_(self.index.get('10.1.0.0', 16), 16)
+        eq_(self.index.get('10.1.0.0', 17), None)
+
+    def test_delete(self):
+        eq_(self.index.delete('10.1.2.0', 24), 24)
+        eq_(self.index.delete('10.1.2.0', 24), None)
+        eq_(self.index.lookup('10.1.2.4'), ('10.1.0.0', 16, 16))
+        eq_(self.index.lookup('10.1.2.3'), ('10.1.2.3', 32, 32))
+        self.index.delete('0.0.0.0', 0)
+        eq_(self.index.lookup('192.168.0.1'), None)
+        eq_(len(self.index), 4)
+
+    def test_build(self):
+        index = FecIndex()
+        index.build([(0x0a010000, 16, 'a'), (0x0a000000, 8, 'b')])
+        eq_(list(index.items()), [('10.0.0.0', 8, 'b'),
+                                  ('10.1.0.0', 16, 'a')])
+        eq_(index.lookup('10.1.255.255'), ('10.1.0.0', 16, 'a'))
+
+    def test_refs(self):
+        index = FecIndex()
+        eq_(index.add_ref('10.1.0.0', 16), 1)
+        eq_(index.add_ref('10.1.0.0', 16), 2)
+        eq_(index.add_ref_int(0x0a000000, 8), 1)
+        eq_(index.release('10.1.0.0', 16), 1)
+        eq_(index.lookup('10.1.2.3'), ('10.1.0.0', 16, 1))
+        eq_(index.release('10.1.0.0', 16), 0)
+        eq_(index.lookup('10.1.2.3'), ('10.0.0.0', 8, 1))
+        eq_(index.release('10.1.0.0', 16), 0)
+        eq_(index.release_int(0x0a000000, 8), 0)
+        eq_(len(index), 0)
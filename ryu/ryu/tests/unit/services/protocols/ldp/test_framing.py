@@ -0,0 +1,161 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+import struct
+import unittest
+from nose.tools import eq_
+
+from ryu.lib.packet import ldp
+from ryu.services.protocols.ldp import framing
+
+
+class _ChunkSocket(object):
+    def __init__(self, data, chunk_size):
+        self._data = data
+        self._chunk_size = chunk_size
+
+    def recv_into(self, view):
+        size = min(len(view), self._chunk_size, len(self._data))
+        view[:size] = self._data[:size]
+        self._data = self._data[size:]
+        return size
+
+
+def _pdu(payload):
+    """A PDU from 1.1.1.1 holding payload."""
+    return struct.pack(framing.LDP_PDU_HEADER_PACK_STR, 1,
+                       len(payload) + 6, socket.inet_aton('1.1.1.1'),
+                       0) + payload
+
+
+class Test_framing(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.framing
+    """
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def _keepalive(self, msg_id):
+        return ldp.LDPKeepAlive(router_id='1.1.1.1', msg_id=msg_id, tlvs=[])
+
+    def test_framer_chunks(self):
+        pdus = [self._keepalive(i).serialize() for i in range(5)]
+        stream = b''.join(pdus)
+        for chunk_size in (1, 7, len(stream)):
+            framer = framing.PDUFramer(buff_size=16)
+            sock = _ChunkSocket(stream, chunk_size)
+            received = []
+            while framer.recv_into(sock):
+                received.extend(pdu.tobytes() for pdu in framer.pdus())
+            eq_(received, pdus)
+            eq_(len(framer), 0)
+
+    def test_framer_partial_header(self):
+        pdu = _pdu(b'\x00' * 8)
+        framer = framing.PDUFramer(buff_size=64)
+        framer.feed(pdu[:3])
+        eq_(list(framer.pdus()), [])
+        eq_(len(framer), 3)
+        # the header is complete, the rest of the PDU is not
+        framer.feed(pdu[3:12])
+        eq_(list(framer.pdus()), [])
+        framer.feed(pdu[12:] + pdu[:5])
+        eq_([view.tobytes() for view in framer.pdus()], [pdu])
+        eq_(len(framer), 5)
+
+    def test_framer_compact(self):
+        first = _pdu(b'\x01' * 8)
+        second = _pdu(b'\x02' * 8)
+        framer = framing.PDUFramer(buff_size=32)
+        framer.feed(first + second[:6])
+        eq_([view.tobytes() for view in framer.pdus()], [first])
+        # the rest of second does not fit behind the pending bytes, they
+        # are moved to the front instead of growing the buffer
+        sock = _ChunkSocket(second[6:], len(second))
+        eq_(framer.recv_into(sock), len(second) - 6)
+        eq_(framer.capacity, 32)
+        eq_([view.tobytes() for view in framer.pdus()], [second])
+        eq_(len(framer), 0)
+
+    def test_framer_grow(self):
+        pdu = _pdu(b'\x03' * 30)
+        framer = framing.PDUFramer(buff_size=16)
+        sock = _ChunkSocket(pdu, len(pdu))
+        eq_(framer.recv_into(sock), 16)
+        # room for the whole PDU is made as soon as its length is known
+        eq_(list(framer.pdus()), [])
+        eq_(framer.capacity, 64)
+        eq_(framer.recv_into(sock), len(pdu) - 16)
+        eq_([view.tobytes() for view in framer.pdus()], [pdu])
+
+    def test_framer_invalid_length(self):
+        framer = framing.PDUFramer()
+        framer.feed(b'\x00\x01\x00\x02' + b'\x00' * 6)
+        self.assertRaises(framing.FramingError, list, framer.pdus())
+
+    def test_framer_parse_view(self):
+        msg = self._keepalive(1)
+        framer = framing.PDUFramer()
+        framer.feed(msg.serialize())
+        pdu = next(framer.pdus())
+        msg2, rest = ldp.LDPMessage.parser(pdu)
+        eq_(str(msg), str(msg2))
+        eq_(len(rest), 0)
+
+    def test_framer_pop_pdus(self):
+        pdus = [self._keepalive(i).serialize() for i in range(3)]
+        framer = framing.PDUFramer()
+        framer.feed(b''.join(pdus) + pdus[0][:5])
+        eq_(framer.complete_len(), len(b''.join(pdus)))
+        eq_(framer.pop_pdus(), b''.join(pdus))
+        eq_(framer.complete_len(), 0)
+        framer.feed(pdus[0][5:])
+        eq_([pdu.tobytes() for pdu in framer.pdus()], [pdus[0]])
+
+    def test_coalescer(self):
+        msgs = [self._keepalive(i) for i in range(3)]
+        coalescer = framing.PDUCoalescer('1.1.1.1')
+        for msg in msgs:
+            eq_(coalescer.add(msg.serialize(include_header=False)), [])
+        pdu = coalescer.flush()
+        eq_(coalescer.flush(), None)
+        msg, rest = ldp.LDPMessage.parser(pdu)
+        eq_(str(msg), str(msgs[0]))
+        for expected in msgs[1:]:
+            msg, rest = ldp.LDPMessage.parser(rest, include_header=False)
+            eq_(str(msg), str(expected))
+        eq_(rest, '')
+
+    def test_coalescer_max_pdu_len(self):
+        data = self._keepalive(1).serialize(include_header=False)
+        max_pdu_len = framing.LDP_PDU_HEADER_LEN + len(data) * 2
+        coalescer = framing.PDUCoalescer('1.1.1.1', max_pdu_len=max_pdu_len)
+        eq_(coalescer.add(data), [])
+        pdus = coalescer.add(data)
+        eq_(len(pdus), 1)
+        eq_(len(pdus[0]), max_pdu_len)
+        eq_(framing.parse_pdu_header(pdus[0])[1],
+            max_pdu_len - framing.LDP_PDU_LEN_OFFSET)
+
+    def test_negotiate_max_pdu_len(self):
+        eq_(framing.negotiate_max_pdu_len(0, 0),
+            framing.LDP_DEFAULT_MAX_PDU_LEN)
+        eq_(framing.negotiate_max_pdu_len(8192, 0),
+            framing.LDP_DEFAULT_MAX_PDU_LEN)
+        eq_(framing.negotiate_max_pdu_len(8192, 6000), 6000)
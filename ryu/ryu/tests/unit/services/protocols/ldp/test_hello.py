@@ -0,0 +1,127 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from nose.tools import eq_
+
+from ryu.lib.packet import ldp
+from ryu.services.protocols.ldp import event as ldp_event
+from ryu.services.protocols.ldp import hello
+from ryu.services.protocols.ldp.adjacency import AdjacencyTable
+from ryu.services.protocols.ldp.interface import LDPInterface
+from ryu.services.protocols.ldp.ldp_util import LoopingCall
+
+
+class _Backend(object):
+    def create_looping_call(self, funct, *args, **kwargs):
+        return LoopingCall(funct, *args, **kwargs)
+
+
+class _Server(object):
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, addr):
+        self.sent.append(data)
+
+
+class _App(object):
+    name = 'ldp'
+
+    def __init__(self):
+        self.io_backend = _Backend()
+        self.adjacencies = AdjacencyTable(lambda adj: None)
+        self.hello_cache = hello.HelloCache()
+        self.events = []
+
+    def send_event(self, name, ev):
+        self.events.append(ev)
+
+
+class Test_hello(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.hello
+    """
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def _hello(self, router_id, hold_time=15, msg_id=0):
+        tlvs = [ldp.CommonHelloParameter(hold_time=hold_time, t_bit=0,
+                r_bit=0), ldp.IPv4TransportAddress(addr=router_id)]
+        msg = ldp.LDPHello(router_id=router_id, msg_id=msg_id, tlvs=tlvs)
+        return msg.serialize()
+
+    def test_decode_hello(self):
+        info = hello.decode_hello(self._hello('2.2.2.2', 30))
+        eq_(info.lsr_id, '2.2.2.2')
+        eq_(info.label_space_id, 0)
+        eq_(info.hold_time, 30)
+        eq_(info.trans_addr, '2.2.2.2')
+
+    def test_adjacency_id(self):
+        eq_(hello.hello_adjacency_id(self._hello('2.2.2.2')),
+            ('2.2.2.2', 0))
+
+    def test_known_adjacency(self):
+        app = _App()
+        interface = LDPInterface(app, None,
+                                 ldp_event.LDPConfig(router_id='1.1.1.1'))
+        app.adjacencies.add(interface, '2.2.2.2', 0, '2.2.2.2', 15,
+                            hello.hello_params(self._hello('2.2.2.2')))
+        # refreshed from the PDU header, not decoded, also when the
+        # neighbour numbers its hellos
+        interface._recv_handler(self._hello('2.2.2.2', msg_id=7),
+                                ('2.2.2.2', 646))
+        eq_(app.hello_cache.stats()['misses'], 0)
+        eq_(app.events, [])
+        interface._recv_handler(self._hello('3.3.3.3'), ('3.3.3.3', 646))
+        eq_(app.hello_cache.stats()['misses'], 1)
+        eq_(app.events[0].hello.lsr_id, '3.3.3.3')
+
+    def test_changed_hello(self):
+        app = _App()
+        interface = LDPInterface(app, None,
+                                 ldp_event.LDPConfig(router_id='1.1.1.1'))
+        app.adjacencies.add(interface, '2.2.2.2', 0, '2.2.2.2', 15,
+                            hello.hello_params(self._hello('2.2.2.2')))
+        # a new hold time goes to hello_received() to be negotiated
+        interface._recv_handler(self._hello('2.2.2.2', hold_time=30),
+                                ('2.2.2.2', 646))
+        eq_(app.hello_cache.stats()['misses'], 1)
+        eq_(app.events[0].hello.hold_time, 30)
+
+    def test_send_hello(self):
+        server = _Server()
+        interface = LDPInterface(_App(), server,
+                                 ldp_event.LDPConfig(router_id='1.1.1.1'))
+        interface.send_hello()
+        interface.send_hello()
+        # the same bytes every time, the hello cache of the neighbour hits
+        eq_(server.sent[0], server.sent[1])
+        eq_(hello.decode_hello(server.sent[0]).lsr_id, '1.1.1.1')
+
+    def test_cache(self):
+        cache = hello.HelloCache(size=2)
+        packets = [self._hello(r) for r in ('2.2.2.2', '3.3.3.3', '4.4.4.4')]
+        first = cache.get(packets[0])
+        eq_(cache.get(packets[0]) is first, True)
+        cache.get(packets[1])
+        cache.get(packets[2])
+        eq_(len(cache), 2)
+        cache.get(packets[0])
+        eq_(cache.stats(), {'size': 2, 'hits': 1, 'misses': 4})
@@ -0,0 +1,69 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from nose.tools import eq_, ok_
+
+from ryu.services.protocols.ldp import info_base
+
+
+class Test_info_base(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.info_base
+    """
+
+    def setUp(self):
+        self.lib = info_base.LabelInformationBase()
+
+    def tearDown(self):
+        pass
+
+    def test_fec_key(self):
+        key = info_base.fec_key('10.1.2.0', 24)
+        eq_(info_base.fec_from_key(key), ('10.1.2.0', 24))
+
+    def test_add_lookup_withdraw(self):
+        self.lib.add('2.2.2.2', '10.0.0.0', 24, 100)
+        self.lib.add('3.3.3.3', '10.0.0.0', 24, 200)
+        self.lib.add('2.2.2.2', '10.0.0.0', 24, 101)
+        eq_(len(self.lib), 2)
+        eq_(self.lib.lookup('2.2.2.2', '10.0.0.0', 24), 101)
+        eq_(self.lib.lookup('2.2.2.2', '10.0.0.0', 32), None)
+        eq_(sorted(self.lib.lookup_fec('10.0.0.0', 24)),
+            [('2.2.2.2', 101), ('3.3.3.3', 200)])
+        eq_(self.lib.withdraw('2.2.2.2', '10.0.0.0', 24), 101)
+        eq_(self.lib.withdraw('2.2.2.2', '10.0.0.0', 24), None)
+        eq_(len(self.lib), 1)
+
+    def test_grow_and_purge(self):
+        for i in range(5000):
+            prefix = '10.%d.%d.0' % (i >> 8, i & 0xff)
+            self.lib.add('2.2.2.2', prefix, 24, i)
+            self.lib.add('3.3.3.3', prefix, 24, i + 16)
+        eq_(len(self.lib), 10000)
+        eq_(self.lib.lookup('3.3.3.3', '10.19.135.0', 24), 5015)
+        eq_(self.lib.purge_peer('2.2.2.2'), 5000)
+        eq_(len(self.lib), 5000)
+        eq_(self.lib.lookup('2.2.2.2', '10.0.1.0', 24), None)
+        eq_(self.lib.peer_count('3.3.3.3'), 5000)
+        eq_(len(list(self.lib.bindings('3.3.3.3'))), 5000)
+        eq_(self.lib.peers(), ['3.3.3.3'])
+
+    def test_grow_keeps_order(self):
+        for i in range(2000):
+            self.lib.add_key('2.2.2.2', i << 6 | 32, i)
+        # the first binding added is linked last
+        eq_([fec >> 6 for fec, label in self.lib.binding_keys('2.2.2.2')],
+            list(range(1999, -1, -1)))
+        ok_(self.lib.peak_memory_usage() > self.lib.memory_usage())
@@ -0,0 +1,74 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+from nose.tools import eq_, ok_, raises
+
+from ryu.services.protocols.ldp.label_allocator import LabelAllocator
+from ryu.services.protocols.ldp.label_allocator import LabelSpaceExhausted
+
+
+class Test_label_allocator(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.label_allocator
+    """
+
+    def setUp(self):
+        self.alloc = LabelAllocator(reserved=((0, 15), (100, 199)),
+                                    max_label=1023)
+
+    def tearDown(self):
+        pass
+
+    def test_allocate_free(self):
+        eq_(self.alloc.allocate(), 16)
+        eq_(self.alloc.allocate(), 17)
+        self.alloc.free(16)
+        ok_(16 not in self.alloc)
+        eq_(self.alloc.allocate(), 16)
+        eq_(len(self.alloc), 2)
+
+    def test_skip_reserved(self):
+        labels = [self.alloc.allocate() for i in range(100)]
+        ok_(all(not 100 <= label < 200 for label in labels))
+        eq_(labels[-1], 215)
+
+    def test_exhausted(self):
+        for i in range(1024 - 116):
+            self.alloc.allocate()
+        self.assertRaises(LabelSpaceExhausted, self.alloc.allocate)
+        eq_(self.alloc.stats()['free'], 0)
+
+    @raises(ValueError)
+    def test_double_free(self):
+        label = self.alloc.allocate()
+        self.alloc.free(label)
+        self.alloc.free(label)
+
+    def test_allocate_block(self):
+        first = self.alloc.allocate_block(50)
+        eq_(first, 16)
+        # does not fit below the reserved range any more
+        first = self.alloc.allocate_block(50)
+        eq_(first, 200)
+        eq_(self.alloc.allocate(), 66)
+        self.alloc.free_block(16, 50)
+        eq_(self.alloc.allocate_block(40), 16)
+        eq_(self.alloc.allocate(), 65)
+        eq_(self.alloc.stats(), {'allocated': 92, 'free': 816,
+                                 'reserved': 116, 'high_watermark': 67})
+
+    def test_allocate_empty_block(self):
+        self.assertRaises(ValueError, self.alloc.allocate_block, 0)
+        self.assertRaises(ValueError, self.alloc.allocate_block, -1)
+        eq_(len(self.alloc), 0)
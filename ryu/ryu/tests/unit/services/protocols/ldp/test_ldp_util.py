@@ -0,0 +1,131 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from nose.tools import eq_
+from nose.tools import ok_
+
+from ryu.services.protocols.ldp import ldp_util
+
+
+class Test_timer_wheel(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.ldp_util.TimerWheel
+    """
+
+    def setUp(self):
+        # small levels so that the test crosses every cascade
+        self.wheel = ldp_util.TimerWheel(tick=1, bits=(4, 3, 3))
+        self.base = self.wheel._base
+        self.fired = []
+
+    def tearDown(self):
+        pass
+
+    def _callback(self, name):
+        def _fire():
+            self.fired.append((name, self.wheel._current))
+        return _fire
+
+    def test_expiry(self):
+        delays = [1, 15, 16, 17, 127, 128, 500, 1023, 3000]
+        for delay in delays:
+            self.wheel.schedule(delay, self._callback(delay))
+        self.wheel.process(self.base + 4000)
+        eq_(sorted(self.fired), [(d, d) for d in delays])
+        eq_(len(self.wheel), 0)
+
+    def test_cancel(self):
+        entry = self.wheel.schedule(100, self._callback('cancel'))
+        self.wheel.schedule(100, self._callback('keep'))
+        self.wheel.cancel(entry)
+        self.wheel.cancel(entry)
+        eq_(len(self.wheel), 1)
+        self.wheel.process(self.base + 200)
+        eq_(self.fired, [('keep', 100)])
+
+    def test_looping_call(self):
+        call = ldp_util.WheelLoopingCall(self._callback('loop'),
+                                         timer_wheel=self.wheel)
+        call.start(10)
+        self.wheel.process(self.base + 25)
+        eq_(self.fired, [('loop', 1), ('loop', 11), ('loop', 21)])
+        call.reset()
+        self.wheel.process(self.base + 40)
+        eq_(self.fired[-1], ('loop', 35))
+        call.stop()
+        self.wheel.process(self.base + 100)
+        eq_(len(self.fired), 4)
+        ok_(not call.running)
+
+
+class Test_virtual_clock(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.ldp_util.VirtualClock
+    """
+
+    def setUp(self):
+        self.clock = ldp_util.VirtualClock()
+        self.fired = []
+
+    def tearDown(self):
+        ldp_util.set_clock()
+
+    def _callback(self, name):
+        def _fire():
+            self.fired.append((name, self.clock.time()))
+        return _fire
+
+    def test_advance(self):
+        self.clock.call_later(5, self._callback('b'))
+        self.clock.call_later(1, self._callback('a'))
+        self.clock.call_later(5, self._callback('c'))
+        call = self.clock.call_later(3, self._callback('cancel'))
+        call.cancel()
+        call.cancel()
+        eq_(len(self.clock), 3)
+        eq_(self.clock.advance(4), 1)
+        eq_(self.clock.time(), 4)
+        eq_(self.clock.step(), 2)
+        eq_(self.fired, [('a', 1), ('b', 5), ('c', 5)])
+        eq_(self.clock.step(), 0)
+
+    def test_timer(self):
+        timer = ldp_util.Timer(self._callback('timer'), clock=self.clock)
+        timer.start(10)
+        timer.start(20)
+        self.clock.advance(15)
+        eq_(self.fired, [])
+        self.clock.advance(15)
+        eq_(self.fired, [('timer', 20)])
+
+    def test_looping_call(self):
+        ldp_util.set_clock(self.clock)
+        call = ldp_util.LoopingCall(self._callback('loop'))
+        call.start(60, now=False)
+        self.clock.advance(180)
+        eq_(self.fired, [('loop', 60), ('loop', 120), ('loop', 180)])
+        call.stop()
+        eq_(len(self.clock), 0)
+
+    def test_timer_wheel(self):
+        ldp_util.set_clock(self.clock)
+        call = ldp_util.WheelLoopingCall(self._callback('wheel'))
+        call.start(60, now=False)
+        # an hour of keepalives in virtual time
+        self.clock.advance(3600 + 1)
+        eq_(len(self.fired), 60)
+        call.stop()
+        # the idle wheel does not tick
+        self.clock.advance(1)
+        eq_(len(self.clock), 0)
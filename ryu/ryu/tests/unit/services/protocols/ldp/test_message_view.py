@@ -0,0 +1,133 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import struct
+import unittest
+from nose.tools import eq_, ok_
+
+from ryu.lib.packet import ldp
+from ryu.services.protocols.ldp import message_view
+from ryu.services.protocols.ldp.message_view import BadMessageLength
+from ryu.services.protocols.ldp.message_view import BadTlvLength
+from ryu.services.protocols.ldp.message_view import parse_pdu
+
+
+def _fec_pdu(fec):
+    """A PDU of one Label Withdraw with the FEC TLV value fec."""
+    body = struct.pack('!HH', message_view.TLV_FEC, len(fec)) + fec
+    msg = struct.pack('!HHI', 0x0402, len(body) + 4, 9) + body
+    return struct.pack('!HH4sH', 1, len(msg) + 6, b'\x01\x01\x01\x01',
+                       0) + msg
+
+
+class Test_message_view(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.message_view
+    """
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_label_mapping(self):
+        fec_elements = [ldp.PrefixFecElement(address_type=1, element_len=24,
+                                             prefix='10.1.2.0')]
+        tlvs = [ldp.Fec(fec_elements=fec_elements),
+                ldp.GenericLabel(label=1000)]
+        msg = ldp.LDPLabelMapping(router_id='1.1.1.1', msg_id=7, tlvs=tlvs)
+        view, = parse_pdu(msg.serialize())
+        eq_(view.type, ldp.LDP_MSG_LABEL_MAPPING)
+        eq_(view.msg_id, 7)
+        eq_(sorted(view.tlv_types()), [message_view.TLV_FEC,
+                                       message_view.TLV_GENERIC_LABEL])
+        eq_(view.tlv(message_view.TLV_GENERIC_LABEL).label, 1000)
+        element, = view.tlv(message_view.TLV_FEC).fec_elements
+        eq_((element.prefix, element.element_len), ('10.1.2.0', 24))
+        ok_(view.tlv(message_view.TLV_STATUS) is None)
+        eq_(str(view.message()), str(msg))
+
+    def test_chained_messages(self):
+        address_list = ldp.AddressList(address_family=1,
+                                       addresses=['1.1.1.1', '2.2.2.2'])
+        msg = ldp.LDPAddress(router_id='1.1.1.1', msg_id=2,
+                             tlvs=[address_list])
+        tlvs = [ldp.CommonSessionParameters(
+            proto_ver=1, keepalive_time=30, pvlim=0, max_pdu_len=4096,
+            receiver_lsr_id='2.2.2.2', receiver_label_space_id=0, a_bit=0,
+            d_bit=0)]
+        init = ldp.LDPInit(router_id='1.1.1.1', msg_id=3, tlvs=tlvs)
+        pdu = bytearray(msg.serialize())
+        pdu += init.serialize(include_header=False)
+        # PDU length covers both messages
+        pdu[2:4] = bytearray([(len(pdu) - 4) >> 8, (len(pdu) - 4) & 0xff])
+        address, session = parse_pdu(memoryview(pdu))
+        eq_(address.tlv(message_view.TLV_ADDRESS_LIST).addresses,
+            ['1.1.1.1', '2.2.2.2'])
+        params = session.tlv(message_view.TLV_COMMON_SESSION_PARAMETERS)
+        eq_((params.keepalive_time, params.max_pdu_len,
+             params.receiver_lsr_id), (30, 4096, '2.2.2.2'))
+
+    def _mapping_pdu(self):
+        fec_elements = [ldp.PrefixFecElement(address_type=1, element_len=32,
+                                             prefix='10.1.2.3')]
+        tlvs = [ldp.Fec(fec_elements=fec_elements),
+                ldp.GenericLabel(label=1000)]
+        msg = ldp.LDPLabelMapping(router_id='1.1.1.1', msg_id=7, tlvs=tlvs)
+        return bytearray(msg.serialize())
+
+    def test_bad_message_length(self):
+        pdu = self._mapping_pdu()
+        # message length past the end of the PDU
+        pdu[13] += 8
+        self.assertRaises(BadMessageLength, parse_pdu, pdu)
+        pdu = self._mapping_pdu()
+        # a truncated message header after the message
+        pdu += b'\x00\x01\x00'
+        pdu[3] += 3
+        self.assertRaises(BadMessageLength, parse_pdu, pdu)
+
+    def test_bad_tlv_length(self):
+        pdu = self._mapping_pdu()
+        # FEC TLV length past the end of the message
+        pdu[21] += 20
+        self.assertRaises(BadTlvLength, parse_pdu, pdu)
+        pdu = self._mapping_pdu()
+        # Generic Label TLV too short for a label, the message and PDU
+        # lengths shrink with it
+        pdu[-5] -= 2
+        del pdu[-2:]
+        pdu[13] -= 2
+        pdu[3] -= 2
+        self.assertRaises(BadTlvLength, parse_pdu, pdu)
+
+    def test_fec_elements(self):
+        view, = parse_pdu(_fec_pdu(b'\x01' + b'\x02\x00\x01\x18\x0a\x01\x02'))
+        wildcard, prefix = view.tlv(message_view.TLV_FEC).fec_elements
+        ok_(isinstance(wildcard, message_view.WildcardFecElement))
+        eq_((prefix.prefix, prefix.element_len), ('10.1.2.0', 24))
+        # an empty FEC TLV
+        self.assertRaises(BadTlvLength, parse_pdu, _fec_pdu(b''))
+        # an element type which is neither wildcard nor prefix
+        self.assertRaises(BadTlvLength, parse_pdu,
+                          _fec_pdu(b'\x03\x00\x01\x00'))
+        # a /24 prefix of two bytes, the element header cut short
+        self.assertRaises(BadTlvLength, parse_pdu,
+                          _fec_pdu(b'\x02\x00\x01\x18\x0a\x01'))
+        self.assertRaises(BadTlvLength, parse_pdu, _fec_pdu(b'\x02\x00'))
+        # an IPv6 /64 and an IPv4 /40
+        self.assertRaises(BadTlvLength, parse_pdu,
+                          _fec_pdu(b'\x02\x00\x02\x40' + b'\x20' * 8))
+        self.assertRaises(BadTlvLength, parse_pdu,
+                          _fec_pdu(b'\x02\x00\x01\x28' + b'\x0a' * 5))
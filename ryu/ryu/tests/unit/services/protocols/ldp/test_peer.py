@@ -0,0 +1,160 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import socket
+import struct
+import unittest
+from nose.tools import eq_, ok_
+
+from ryu.services.protocols.ldp import event as ldp_event
+from ryu.services.protocols.ldp.framing import FramingError
+from ryu.services.protocols.ldp.framing import parse_pdu_header
+from ryu.services.protocols.ldp.message_view import BadTlvLength
+from ryu.services.protocols.ldp.peer import Peer
+from ryu.services.protocols.ldp.stats import LDPStatistics
+
+# Label Mapping header without TLVs, message id 1
+_MAPPING = b'\x04\x00\x00\x04\x00\x00\x00\x01'
+
+
+def _pdu(body):
+    return struct.pack('!HH4sH', 1, len(body) + 6,
+                       socket.inet_aton('1.1.1.1'), 0) + body
+
+
+class _Timer(object):
+    def __init__(self, *args):
+        self.running = False
+
+    def start(self, interval, now=True):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    cancel = stop
+
+
+class _Writer(object):
+    def __init__(self):
+        self.written = []
+        self.writable = True
+        self.stopped = False
+
+    def start(self):
+        pass
+
+    def stop(self):
+        self.stopped = True
+
+    def write(self, data, priority=False):
+        self.written.append(bytes(data))
+
+
+class _Backend(object):
+    def __init__(self):
+        self.writers = []
+
+    def create_timer(self, handler):
+        return _Timer()
+
+    def create_looping_call(self, funct, *args, **kwargs):
+        return _Timer()
+
+    def create_writer(self, conn, high_watermark, low_watermark,
+                      error_handler=None, wait_histogram=None):
+        writer = _Writer()
+        self.writers.append(writer)
+        return writer
+
+    def spawn(self, func, *args, **kwargs):
+        pass
+
+
+class _App(object):
+    def __init__(self):
+        self.io_backend = _Backend()
+        self.statistics = LDPStatistics()
+        self.decode_pool = None
+        self.states = []
+
+    def send_event_to_observers(self, ev):
+        self.states.append(ev.new_state)
+
+
+class Test_peer(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.peer
+    """
+
+    def setUp(self):
+        self.app = _App()
+        conf = ldp_event.LDPConfig(router_id='2.2.2.2',
+                                   pdu_coalesce_delay=10)
+        self.peer = Peer(self.app, '1.1.1.1', '1.1.1.1', conf)
+
+    def tearDown(self):
+        pass
+
+    def test_new_connection_resets(self):
+        self.peer.connection_made(object(), True)
+        # a partial PDU and a queued message of the old connection
+        self.peer.data_received(b'\x00\x01\x00')
+        self.peer.send_msg(_MAPPING)
+        ok_(len(self.peer._coalescer))
+        self.peer.connection_lost('test')
+        self.peer.connection_made(object(), True)
+        eq_(len(self.peer._framer), 0)
+        eq_(len(self.peer._coalescer), 0)
+        # the new connection starts with the Init
+        written = self.app.io_backend.writers[-1].written
+        eq_(len(written), 1)
+        # one PDU holding one message of type Initialization
+        eq_(parse_pdu_header(written[0])[1] + 4, len(written[0]))
+        eq_(written[0][10:12], b'\x02\x00')
+        eq_(self.app.states, [ldp_event.LDP_STATE_INITIAL,
+                              ldp_event.LDP_STATE_NON_EXISTENT,
+                              ldp_event.LDP_STATE_INITIAL])
+
+    def test_msg_ids(self):
+        self.peer.connection_made(object(), True)
+        self.peer._send_keepalive()
+        self.peer.send_notification(0x0a)
+        self.peer._send_keepalive()
+        self.peer.send_init()
+        # Init, KeepAlive, Notification, KeepAlive and Init, each
+        # message in a PDU of its own
+        written = self.app.io_backend.writers[-1].written
+        eq_([struct.unpack_from('!I', pdu, 14)[0] for pdu in written],
+            [1, 2, 3, 4, 5])
+
+    def test_malformed_pdu(self):
+        self.peer.connection_made(object(), True)
+        stats = self.app.statistics.peer('1.1.1.1')
+        # a FEC TLV of 8 bytes in a Label Mapping of 4 bytes
+        mapping = b'\x04\x00\x00\x08\x00\x00\x00\x02' + \
+            b'\x01\x00\x00\x08'
+        self.assertRaises(BadTlvLength, self.peer.data_received,
+                          _pdu(mapping))
+        eq_(stats.parse_errors, 1)
+        eq_(sum(stats.rx_msgs), 0)
+        # the Bad TLV Length notification ahead of anything queued
+        written = self.app.io_backend.writers[-1].written
+        eq_(written[-1][10:12], b'\x00\x01')
+
+        self.peer.connection_lost('test')
+        self.peer.connection_made(object(), True)
+        # a PDU length shorter than the PDU header
+        self.assertRaises(FramingError, self.peer.data_received,
+                          b'\x00\x01\x00\x02' + b'\x00' * 6)
+        eq_(stats.parse_errors, 2)
@@ -0,0 +1,122 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import time
+import unittest
+from nose.tools import eq_, ok_
+
+from eventlet.green import socket
+from ryu.lib import hub
+from ryu.lib.packet import ldp
+from ryu.services.protocols.ldp import event as ldp_event
+from ryu.services.protocols.ldp.backend import EventletBackend
+from ryu.services.protocols.ldp.framing import PDUCoalescer
+from ryu.services.protocols.ldp.peer import Peer
+from ryu.services.protocols.ldp.stats import LDPStatistics
+
+KEEPALIVE_TIME = 1
+FLOOD_MSGS = 20000
+
+
+class _Dispatcher(object):
+    def __init__(self):
+        self.counts = {}
+
+    def dispatch(self, peer, msgs):
+        lsr_id = peer.peer_router_id
+        self.counts[lsr_id] = self.counts.get(lsr_id, 0) + len(msgs)
+        # the work of the applications, without yielding
+        time.sleep(len(msgs) * 0.00005)
+
+
+class _App(object):
+    def __init__(self):
+        self.dispatcher = _Dispatcher()
+        self.decode_pool = None
+        self.io_backend = EventletBackend()
+        self.statistics = LDPStatistics()
+
+    def send_event_to_observers(self, ev):
+        pass
+
+
+def _label_mappings(router_id, count):
+    coalescer = PDUCoalescer(router_id)
+    pdus = []
+    for i in range(count):
+        fec = ldp.Fec(fec_elements=[ldp.PrefixFecElement(
+            address_type=1, element_len=32,
+            prefix='10.%d.%d.%d' % (i >> 16, (i >> 8) & 0xff, i & 0xff))])
+        msg = ldp.LDPLabelMapping(router_id=router_id, msg_id=i,
+                                  tlvs=[fec, ldp.GenericLabel(label=16 + i)])
+        pdus.extend(coalescer.add(msg.serialize(include_header=False)))
+    pdus.append(coalescer.flush())
+    return b''.join(bytes(pdu) for pdu in pdus)
+
+
+class Test_peer_scheduling(unittest.TestCase):
+    """ Test case for the receive budget and keepalive handling of
+    ryu.services.protocols.ldp.peer under a label flood
+    """
+
+    def setUp(self):
+        self.app = _App()
+        self.conf = ldp_event.LDPConfig(router_id='1.1.1.1',
+                                        keep_alive=KEEPALIVE_TIME,
+                                        pdu_coalesce_delay=0,
+                                        msg_budget=100)
+        self.remotes = []
+        self.threads = []
+
+    def tearDown(self):
+        for thread in self.threads:
+            hub.kill(thread)
+        for sock in self.remotes:
+            sock.close()
+
+    def _operational_peer(self, lsr_id):
+        local, remote = socket.socketpair()
+        self.remotes.append(remote)
+        peer = Peer(self.app, lsr_id, lsr_id, self.conf)
+        peer.conn_handle(local, False)
+        peer.state_change(ldp_event.LDP_STATE_OPERATIONAL)
+        peer._keepalive_time = KEEPALIVE_TIME
+        peer.start_keepalive_timeout()
+        return peer, remote
+
+    def _send_keepalives(self, remote, router_id, until):
+        pdu = ldp.LDPKeepAlive(router_id=router_id, msg_id=1,
+                               tlvs=[]).serialize()
+        while time.time() < until:
+            remote.sendall(pdu)
+            hub.sleep(KEEPALIVE_TIME / 5.0)
+
+    def test_keepalive_under_flood(self):
+        flooded, flood_remote = self._operational_peer('2.2.2.2')
+        quiet, quiet_remote = self._operational_peer('3.3.3.3')
+        flood = _label_mappings('2.2.2.2', FLOOD_MSGS)
+        start = time.time()
+        self.threads.append(hub.spawn(self._send_keepalives, quiet_remote,
+                                      '3.3.3.3', start + 60))
+        self.threads.append(hub.spawn(flood_remote.sendall, flood))
+        counts = self.app.dispatcher.counts
+        while counts.get('2.2.2.2', 0) < FLOOD_MSGS:
+            ok_(time.time() - start < 60, 'flood not processed')
+            hub.sleep(0.1)
+        # one more keepalive time for a late expiry to show up
+        hub.sleep(KEEPALIVE_TIME)
+        eq_(quiet.state, ldp_event.LDP_STATE_OPERATIONAL)
+        eq_(flooded.state, ldp_event.LDP_STATE_OPERATIONAL)
+        quiet.stop()
+        flooded.stop()
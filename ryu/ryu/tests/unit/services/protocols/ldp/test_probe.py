@@ -0,0 +1,76 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+from nose.tools import eq_, ok_
+
+from ryu.services.protocols.ldp.probe import SamplingProfiler
+
+
+class _Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+_clock = _Clock()
+
+
+class _Session(object):
+    def receive(self):
+        _clock.now += 0.001
+        self.handle()
+        self.handle()
+        return 'received'
+
+    def handle(self):
+        _clock.now += 0.002
+
+
+class Test_probe(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.probe
+    """
+
+    def setUp(self):
+        self.handle = _Session.__dict__['handle']
+        self.profiler = SamplingProfiler(
+            [('receive', _Session, 'receive'), ('handle', _Session, 'handle')],
+            clock=_clock)
+
+    def tearDown(self):
+        self.profiler.stop()
+
+    def test_sampling(self):
+        session = _Session()
+        self.profiler.start(sample_every=2)
+        ok_(self.profiler.active)
+        for i in range(4):
+            eq_(session.receive(), 'received')
+        stats = self.profiler.stats()['stages']
+        # 2 of 4 receives with their handles
+        eq_(stats['receive']['samples'], 2)
+        eq_(stats['handle']['samples'], 4)
+        self.assertAlmostEqual(stats['receive']['total'], 0.01)
+        self.assertAlmostEqual(stats['receive']['self'], 0.002)
+        eq_(self.profiler.folded(), 'receive 2000\nreceive;handle 8000')
+
+    def test_stop(self):
+        self.profiler.start(sample_every=1)
+        ok_(_Session.__dict__['handle'] is not self.handle)
+        self.profiler.stop()
+        ok_(_Session.__dict__['handle'] is self.handle)
+        _Session().handle()
+        eq_(self.profiler.stats()['stages'], {})
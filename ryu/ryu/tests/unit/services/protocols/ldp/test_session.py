@@ -0,0 +1,55 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+from nose.tools import eq_, ok_
+
+from ryu.services.protocols.ldp.session import ConnectBackoff
+from ryu.services.protocols.ldp.session import SessionSetupStats
+
+
+class Test_session(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.session
+    """
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_backoff(self):
+        backoff = ConnectBackoff(initial=1, maximum=10, jitter=0.5,
+                                 rand=lambda: 0.5)
+        eq_([backoff.next_delay() for i in range(6)], [1, 2, 4, 8, 10, 10])
+        backoff.reset()
+        eq_(backoff.next_delay(), 1)
+
+    def test_backoff_jitter(self):
+        low = ConnectBackoff(initial=4, jitter=0.25, rand=lambda: 0.0)
+        high = ConnectBackoff(initial=4, jitter=0.25, rand=lambda: 1.0)
+        eq_(low.next_delay(), 3)
+        eq_(high.next_delay(), 5)
+
+    def test_setup_stats(self):
+        stats = SessionSetupStats()
+        eq_(stats.stats()['setup_time_avg'], None)
+        for seconds in (0.5, 1.5, 1.0):
+            stats.record_setup(seconds)
+        result = stats.stats()
+        eq_(result['setups'], 3)
+        eq_(result['setup_time_avg'], 1.0)
+        eq_(result['setup_time_min'], 0.5)
+        eq_(result['setup_time_max'], 1.5)
+        ok_(result['setup_time_last'] == 1.0)
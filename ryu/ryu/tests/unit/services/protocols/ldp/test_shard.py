@@ -0,0 +1,230 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import socket
+import struct
+import unittest
+from array import array
+from nose.tools import eq_, ok_
+
+from ryu.lib import hub
+from ryu.services.protocols.ldp import event as ldp_event
+from ryu.services.protocols.ldp import shard
+from ryu.services.protocols.ldp.event import LDPConfig
+from ryu.services.protocols.ldp.message_view import TLV_FEC
+from ryu.services.protocols.ldp.message_view import TLV_GENERIC_LABEL
+from ryu.services.protocols.ldp.message_view import parse_message
+
+
+class _Connector(object):
+    def __init__(self):
+        self.connects = []
+
+    def connect(self, peer_addr, conn_handle, is_wanted, delay=0):
+        self.connects.append((peer_addr, is_wanted(), delay))
+
+
+def _message(msg_type, fec, label=None):
+    """A Label Mapping or Withdraw with the FEC TLV value fec."""
+    body = struct.pack('!HH', TLV_FEC, len(fec)) + fec
+    if label is not None:
+        body += struct.pack('!HHI', TLV_GENERIC_LABEL, 4, label)
+    return parse_message(struct.pack('!HHI', msg_type, len(body) + 4, 9) +
+                         body)
+
+
+class _Handler(object):
+    def __init__(self):
+        self.states = []
+        self.withdrawn = []
+
+    def shard_state_changed(self, lsr_id, old_state, new_state, seconds):
+        self.states.append((lsr_id, old_state, new_state))
+
+    def shard_purge(self, lsr_id):
+        self.withdrawn.append(lsr_id)
+
+
+class Test_shard(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.shard
+    """
+
+    def setUp(self):
+        sock_a, sock_b = socket.socketpair()
+        fd_a, fd_b = socket.socketpair()
+        self.sender = shard.ShardChannel(sock_a, fd_a)
+        self.receiver = shard.ShardChannel(sock_b, fd_b)
+        self.received = []
+
+    def tearDown(self):
+        self.sender.close()
+        self.receiver.close()
+
+    def _worker(self):
+        worker = shard.ShardWorker(0, self.receiver)
+        worker.config = LDPConfig(router_id='1.1.1.1')
+        worker._connector = _Connector()
+        return worker
+
+    def _record_received(self, kind, payload):
+        if kind == shard.REC_PEER_CONN:
+            payload = self.receiver.recv_socket()
+        elif kind in (shard.REC_BINDINGS, shard.REC_WITHDRAWS):
+            payload = shard._unpack_bindings(kind, payload)
+        self.received.append((kind, payload))
+
+    def test_shard_of(self):
+        counts = [0] * 4
+        for i in range(4000):
+            lsr_id = '10.%d.%d.1' % (i >> 8, i & 0xff)
+            index = shard.shard_of(lsr_id, 4)
+            eq_(index, shard.shard_of(lsr_id, 4))
+            counts[index] += 1
+        ok_(min(counts) > 800, counts)
+
+    def test_channel(self):
+        thread = hub.spawn(self.receiver.recv_loop, self._record_received)
+        self.sender.queue(shard.REC_BINDINGS, '2.2.2.2',
+                          array('I', [0x0a000000]), array('B', [8]),
+                          array('I', [100]))
+        self.sender.queue(shard.REC_BINDINGS, '2.2.2.2', [0x0a010000],
+                          [16], [101])
+        self.sender.queue(shard.REC_WITHDRAWS, '2.2.2.2', [0x0a020000],
+                          [16])
+        conn_a, conn_b = socket.socketpair()
+        self.sender.send_socket(shard.REC_PEER_CONN, b'', conn_a)
+        conn_a.close()
+        self.sender.close()
+        hub.joinall([thread])
+        kinds = [kind for kind, payload in self.received]
+        eq_(kinds, [shard.REC_BINDINGS, shard.REC_WITHDRAWS,
+                    shard.REC_PEER_CONN])
+        lsr_id, prefixes, prefix_lens, labels = self.received[0][1]
+        eq_(lsr_id, '2.2.2.2')
+        eq_(list(prefixes), [0x0a000000, 0x0a010000])
+        eq_(list(prefix_lens), [8, 16])
+        eq_(list(labels), [100, 101])
+        eq_(self.received[1][1][3], None)
+        passed = self.received[2][1]
+        passed.sendall(b'x')
+        eq_(conn_b.recv(1), b'x')
+        passed.close()
+        conn_b.close()
+
+    def test_messages(self):
+        keepalive = struct.pack('!HHI', 0x0201, 4, 7)
+        notification = struct.pack('!HHIHHIIH', 0x0001, 18, 8,
+                                   0x0300, 10, 0x0a, 0x0, 0x0)
+        msgs = [parse_message(keepalive), parse_message(notification)]
+        name, lsr_id, views = shard._unpack_messages(
+            shard._pack_messages('app', '2.2.2.2', msgs))
+        eq_(name, 'app')
+        eq_(lsr_id, '2.2.2.2')
+        eq_([view.raw for view in views], [keepalive, notification])
+        eq_(views[0].msg_id, 7)
+
+    def test_send_message(self):
+        handler = _Handler()
+        shards = shard.ShardManager(LDPConfig(router_id='1.1.1.1'), 1,
+                                    handler)
+        shards._channels = [self.sender]
+        shards.add_peer('2.2.2.2', '2.2.2.2', True)
+        shards.send_message('2.2.2.2', b'message')
+        self.assertRaises(KeyError, shards.send_message, '3.3.3.3', b'x')
+        self.sender.close()
+        self.receiver.recv_loop(self._record_received)
+        eq_([kind for kind, payload in self.received],
+            [shard.REC_PEER_ADD, shard.REC_SEND])
+        payload = self.received[1][1]
+        eq_(socket.inet_ntoa(payload[:4]), '2.2.2.2')
+        eq_(shard.pickle.loads(payload[4:]), b'message')
+
+        shards._record_received(shard.REC_STATE, shard._STATE.pack(
+            socket.inet_aton('2.2.2.2'),
+            shard._STATES.index(ldp_event.LDP_STATE_OPERATIONAL), 0.5))
+        eq_(handler.states, [('2.2.2.2', ldp_event.LDP_STATE_NON_EXISTENT,
+                              ldp_event.LDP_STATE_OPERATIONAL)])
+        eq_(shards.peers['2.2.2.2'].state, ldp_event.LDP_STATE_OPERATIONAL)
+
+    def test_statistics(self):
+        worker = self._worker()
+        worker.statistics.peer('2.2.2.2').parse_errors = 2
+        shards = shard.ShardManager(worker.config, 1, _Handler())
+        sock_a, sock_b = socket.socketpair()
+        fd_a, fd_b = socket.socketpair()
+        shards._channels = [shard.ShardChannel(sock_a, fd_a)]
+        worker.channel = shard.ShardChannel(sock_b, fd_b)
+        threads = [hub.spawn(worker.channel.recv_loop,
+                             worker._record_received),
+                   hub.spawn(shards._channels[0].recv_loop,
+                             shards._record_received)]
+        try:
+            statistics = shards.statistics()
+        finally:
+            # ends both receive loops
+            sock_b.shutdown(socket.SHUT_RDWR)
+            hub.joinall(threads)
+            shards._channels[0].close()
+            worker.channel.close()
+        eq_(statistics.snapshot('2.2.2.2')['2.2.2.2']['parse_errors'], 2)
+
+    def test_worker_reconnect(self):
+        worker = self._worker()
+        worker._add_peer('2.2.2.2', '10.0.0.2', True)
+        worker._add_peer('3.3.3.3', '10.0.0.3', False)
+        peer = worker.peers['2.2.2.2']
+        eq_(worker._connector.connects,
+            [(('10.0.0.2', shard.LDP_SESSION_PORT), True, 0)])
+
+        for lsr_id in ('2.2.2.2', '3.3.3.3'):
+            worker.send_event_to_observers(ldp_event.EventLDPStateChanged(
+                None, worker.peers[lsr_id],
+                ldp_event.LDP_STATE_OPERATIONAL,
+                ldp_event.LDP_STATE_NON_EXISTENT))
+        eq_(len(worker._connector.connects), 2)
+        peer_addr, wanted, delay = worker._connector.connects[1]
+        eq_(peer_addr, ('10.0.0.2', shard.LDP_SESSION_PORT))
+        ok_(wanted)
+        ok_(delay > 0)
+
+        worker._record_received(shard.REC_PEER_REMOVE,
+                                socket.inet_aton('2.2.2.2'))
+        worker.send_event_to_observers(ldp_event.EventLDPStateChanged(
+            None, peer, ldp_event.LDP_STATE_INITIAL,
+            ldp_event.LDP_STATE_NON_EXISTENT))
+        eq_(len(worker._connector.connects), 2)
+
+    def test_worker_withdraw(self):
+        worker = self._worker()
+        worker._add_peer('2.2.2.2', '10.0.0.2', False)
+        peer = worker.peers['2.2.2.2']
+        # a wildcard among the prefixes of a mapping is skipped
+        worker._label_mapping_received(peer, _message(
+            0x0400, b'\x02\x00\x01\x18\x0a\x01\x02\x01', 16))
+        worker._label_withdraw_received(peer, _message(
+            0x0402, b'\x02\x00\x01\x18\x0a\x01\x02'))
+        worker._label_withdraw_received(peer, _message(0x0402, b'\x01'))
+        self.receiver.close()
+        self.sender.recv_loop(self._record_received)
+        eq_([kind for kind, payload in self.received],
+            [shard.REC_BINDINGS, shard.REC_WITHDRAWS,
+             shard.REC_PURGE])
+        lsr_id, prefixes, prefix_lens, labels = self.received[0][1]
+        eq_((lsr_id, list(prefixes), list(prefix_lens), list(labels)),
+            ('2.2.2.2', [0x0a010200], [24], [16]))
+
+        handler = _Handler()
+        shards = shard.ShardManager(worker.config, 1, handler)
+        shards._record_received(*self.received[2])
+        eq_(handler.withdrawn, ['2.2.2.2'])
@@ -0,0 +1,121 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import socket
+import unittest
+from nose.tools import eq_, ok_
+
+from ryu.services.protocols.ldp import event as ldp_event
+from ryu.services.protocols.ldp.session import LDP_SESSION_PORT
+from ryu.services.protocols.ldp.simulator import HelloSender
+from ryu.services.protocols.ldp.simulator import SimulatedLSR
+from ryu.services.protocols.ldp.simulator import Simulator
+from ryu.services.protocols.ldp.simulator import _labels
+from ryu.services.protocols.ldp.speaker import LDPSpeaker
+
+BASE_ADDRESS = '127.0.1.1'
+LSR_IDS = ['127.0.1.1', '127.0.1.2', '127.0.1.3']
+
+
+def _can_bind_session_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        sock.bind((BASE_ADDRESS, LDP_SESSION_PORT))
+        return True
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+
+
+class Test_simulator(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.simulator
+    """
+
+    def setUp(self):
+        self.hellos = HelloSender('127.0.0.1')
+
+    def tearDown(self):
+        self.hellos.stop()
+
+    def test_hello_loss(self):
+        addr = ('127.0.0.1', self.hellos.socket.getsockname()[1])
+        self.hellos.sendto(b'hello', addr)
+        self.hellos.mute(60)
+        self.hellos.sendto(b'hello', addr)
+        eq_(self.hellos.sent, 1)
+        eq_(self.hellos.dropped, 1)
+
+    def test_active_role(self):
+        config = ldp_event.LDPConfig(router_id='127.0.0.2')
+        lsr = SimulatedLSR(config, '127.0.0.1', '127.0.0.1')
+        ok_(lsr.is_active)
+        lsr.hellos.stop()
+        lsr = SimulatedLSR(config, '127.0.0.3', '127.0.0.3')
+        ok_(not lsr.is_active)
+        lsr.hellos.stop()
+
+    def test_labels(self):
+        first = list(_labels(0, 300))
+        second = list(_labels(1, 300))
+        eq_(first[1], ('20.0.1.0', 24))
+        eq_(len(set(first) | set(second)), 600)
+
+    def _manager(self, router_id):
+        # an LDPSpeaker with the adjacencies it had after the hellos of
+        # the simulated LSRs
+        manager = LDPSpeaker(ldp_event.LDPConfig(router_id=router_id))
+        manager._acceptor = manager.io_backend.create_acceptor(
+            (router_id, LDP_SESSION_PORT), manager.session_setup)
+        manager._connector = manager.io_backend.create_connector(
+            router_id, manager.session_setup)
+        manager._acceptor.start()
+        for lsr_id in LSR_IDS:
+            manager.adjacencies.add(None, lsr_id, 0, lsr_id, 15)
+            manager._add_peer(lsr_id, lsr_id, manager._is_active(lsr_id))
+        return manager
+
+    def _loopback_flap(self, manager_id):
+        if not _can_bind_session_port():
+            raise unittest.SkipTest('cannot bind the LDP session port')
+        simulator = Simulator(manager_id, BASE_ADDRESS, len(LSR_IDS),
+                              labels=2, duration=0.1, churn_interval=0.5,
+                              flap_fraction=1.0, settle=0.5, timeout=20,
+                              seed=1)
+        manager = self._manager(manager_id)
+        try:
+            setup = simulator.run_setup()
+            ok_(setup['converged'], setup)
+            eq_(setup['sessions'], 3)
+            eq_(setup['not_operational'], [])
+            eq_(len(manager.info_base), 6)
+
+            churn = simulator.run_churn()
+            ok_(churn['converged'], churn)
+            eq_(churn['flaps'], 3)
+            eq_(churn['session_downs'], 3)
+            eq_(churn['recoveries'], 3)
+            eq_(churn['not_operational'], [])
+            # the hellos went on
+            eq_(sum(lsr.hellos.dropped for lsr in simulator.lsrs), 0)
+        finally:
+            simulator.stop()
+            manager.stop()
+
+    def test_loopback_flap_lsr_active(self):
+        self._loopback_flap('127.0.0.1')
+
+    def test_loopback_flap_manager_active(self):
+        self._loopback_flap('127.0.2.1')
@@ -0,0 +1,179 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import socket
+import struct
+import unittest
+from nose.tools import eq_, ok_
+
+from ryu.services.protocols.ldp import event as ldp_event
+from ryu.services.protocols.ldp import ldp_util
+from ryu.services.protocols.ldp import message_view
+from ryu.services.protocols.ldp.event import EventHelloReceived
+from ryu.services.protocols.ldp.event import LDPConfig
+from ryu.services.protocols.ldp.hello import decode_hello
+from ryu.services.protocols.ldp.message_view import parse_pdu
+from ryu.services.protocols.ldp.speaker import LDPSpeaker
+
+
+def _message(msg_type, fec, label=None):
+    """A Label Mapping or Withdraw with the FEC TLV value fec."""
+    body = struct.pack('!HH', message_view.TLV_FEC, len(fec)) + fec
+    if label is not None:
+        body += struct.pack('!HHI', message_view.TLV_GENERIC_LABEL, 4,
+                            label)
+    msg = struct.pack('!HHI', msg_type, len(body) + 4, 9) + body
+    view, = parse_pdu(struct.pack('!HH4sH', 1, len(msg) + 6,
+                                  b'\x01\x01\x01\x01', 0) + msg)
+    return view
+
+
+def _hello(lsr_id, hold_time, trans_addr):
+    """A hello PDU with a Transport Address TLV."""
+    body = struct.pack('!HHHH', message_view.TLV_COMMON_HELLO_PARAMETERS,
+                       4, hold_time, 0) + \
+        struct.pack('!HH4s', message_view.TLV_IPV4_TRANSPORT_ADDRESS, 4,
+                    socket.inet_aton(trans_addr))
+    msg = struct.pack('!HHI', 0x0100, len(body) + 4, 0) + body
+    return struct.pack('!HH4sH', 1, len(msg) + 6,
+                       socket.inet_aton(lsr_id), 0) + msg
+
+
+class _Connector(object):
+    def __init__(self):
+        self.connects = []
+
+    def connect(self, peer_addr, conn_handle, is_wanted, delay=0):
+        self.connects.append((peer_addr, is_wanted(), delay))
+
+
+class _Acceptor(object):
+    def __init__(self):
+        self.handlers = []
+
+    def register(self, addr, conn_handle):
+        self.handlers.append(addr)
+
+    def unregister(self, addr):
+        self.handlers.remove(addr)
+
+
+class Test_speaker(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.speaker
+    """
+
+    def setUp(self):
+        self.clock = ldp_util.VirtualClock(100.0)
+        ldp_util.set_clock(self.clock)
+        self.speaker = LDPSpeaker(LDPConfig(router_id='2.2.2.2'))
+        self.connector = _Connector()
+        self.speaker._connector = self.connector
+        self.acceptor = _Acceptor()
+        self.speaker._acceptor = self.acceptor
+
+    def tearDown(self):
+        ldp_util.set_clock()
+
+    def _session_lost(self, lsr_id):
+        peer = self.speaker.peers[lsr_id]
+        self.speaker.ldp_state_change(ldp_event.EventLDPStateChanged(
+            peer.name, peer, ldp_event.LDP_STATE_OPERATIONAL,
+            ldp_event.LDP_STATE_NON_EXISTENT))
+        return peer
+
+    def test_reconnect(self):
+        self.speaker.adjacencies.add('eth0', '1.1.1.1', 0, '10.0.0.1', 15)
+        self.speaker._add_peer('1.1.1.1', '10.0.0.1', True)
+        eq_(self.connector.connects, [(('10.0.0.1', 646), True, 0)])
+        self.clock.advance(30)
+        peer = self._session_lost('1.1.1.1')
+        eq_(peer.created_at, 130.0)
+        self._session_lost('1.1.1.1')
+        eq_(len(self.connector.connects), 3)
+        # 1 and 2 seconds with jitter
+        first, second = [c[2] for c in self.connector.connects[1:]]
+        ok_(0.5 <= first <= 1.5)
+        ok_(1 <= second <= 3)
+        # an operational session resets the backoff
+        self.speaker.ldp_state_change(ldp_event.EventLDPStateChanged(
+            peer.name, peer, ldp_event.LDP_STATE_OPEN_REC,
+            ldp_event.LDP_STATE_OPERATIONAL))
+        self._session_lost('1.1.1.1')
+        ok_(0.5 <= self.connector.connects[-1][2] <= 1.5)
+
+    def test_no_reconnect_without_adjacency(self):
+        self.speaker._add_peer('1.1.1.1', '10.0.0.1', True)
+        self._session_lost('1.1.1.1')
+        eq_(len(self.connector.connects), 1)
+
+    def test_passive_waits(self):
+        # the LSR with the higher LSR-ID opens the session
+        self.speaker.adjacencies.add('eth0', '3.3.3.3', 0, '10.0.0.3', 15)
+        self.speaker._add_peer('3.3.3.3', '10.0.0.3', False)
+        eq_(self.acceptor.handlers, ['10.0.0.3'])
+        self.clock.advance(5)
+        peer = self._session_lost('3.3.3.3')
+        eq_(peer.created_at, 105.0)
+        eq_(self.connector.connects, [])
+
+    def test_bulk_bindings(self):
+        # the speaker's own Label Mapping callback has a bulk counterpart
+        ok_(self.speaker.dispatcher.accepts_bindings())
+
+    def test_wildcard_withdraw(self):
+        self.speaker._add_peer('1.1.1.1', '10.0.0.1', True)
+        self.speaker._add_peer('3.3.3.3', '10.0.0.3', False)
+        peer = self.speaker.peers['1.1.1.1']
+        other = self.speaker.peers['3.3.3.3']
+        # a wildcard among the prefixes of a mapping is skipped
+        fec = b'\x02\x00\x01\x18\x0a\x01\x02' + b'\x01' + \
+            b'\x02\x00\x01\x10\x0a\x02'
+        self.speaker._label_mapping_received(peer, _message(0x0400, fec, 16))
+        self.speaker._label_mapping_received(other, _message(0x0400, fec, 17))
+        eq_(self.speaker.info_base.peer_count('1.1.1.1'), 2)
+        # withdraws one FEC of the peer
+        self.speaker._label_withdraw_received(
+            peer, _message(0x0402, b'\x02\x00\x01\x10\x0a\x02'))
+        eq_(self.speaker.info_base.peer_count('1.1.1.1'), 1)
+        # withdraws every FEC of the peer, the other peer keeps its own
+        self.speaker._label_withdraw_received(peer,
+                                              _message(0x0402, b'\x01'))
+        eq_(self.speaker.info_base.peer_count('1.1.1.1'), 0)
+        eq_(self.speaker.info_base.peer_count('3.3.3.3'), 2)
+        # the FEC is left bound to one peer
+        eq_(self.speaker.fec_index.lookup('10.1.2.3'), ('10.1.2.0', 24, 1))
+        self.speaker._label_withdraw_received(other,
+                                              _message(0x0402, b'\x01'))
+        eq_(self.speaker.fec_index.lookup('10.1.2.3'), None)
+        eq_(list(self.speaker.fec_index.items()), [])
+
+    def test_hello_params(self):
+        def hello_received(hold_time, trans_addr):
+            packet = _hello('1.1.1.1', hold_time, trans_addr)
+            self.speaker.hello_received(EventHelloReceived(
+                'eth0', packet, decode_hello(packet)))
+            return self.speaker.adjacencies.get(('eth0', '1.1.1.1', 0))
+
+        adj = hello_received(30, '10.0.0.1')
+        eq_((adj.hold_time, adj.trans_addr), (15, '10.0.0.1'))
+        self.clock.advance(5)
+        # a hold time above the local one negotiates the same
+        eq_(hello_received(20, '10.0.0.1'), adj)
+        eq_(adj.last_seen, 105.0)
+        # a lower hold time or a new transport address renegotiate
+        adj = hello_received(10, '10.0.0.1')
+        eq_(adj.hold_time, 10)
+        adj = hello_received(10, '10.0.0.5')
+        eq_((adj.hold_time, adj.trans_addr), (10, '10.0.0.5'))
+        eq_(len(self.speaker.adjacencies), 1)
@@ -0,0 +1,75 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+from nose.tools import eq_, ok_
+
+from ryu.services.protocols.ldp.stats import HISTOGRAM_BUCKETS
+from ryu.services.protocols.ldp.stats import Histogram
+from ryu.services.protocols.ldp.stats import LDPStatistics
+from ryu.services.protocols.ldp.stats import MSG_TYPE_INDEX
+from ryu.services.protocols.ldp.stats import MSG_TYPE_OTHER
+
+
+class Test_stats(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.stats
+    """
+
+    def setUp(self):
+        self.stats = LDPStatistics()
+
+    def tearDown(self):
+        pass
+
+    def test_histogram(self):
+        histogram = Histogram()
+        histogram.record(0.0000005)
+        histogram.record(0.000003)
+        histogram.record(0.000003)
+        histogram.record(3600)
+        eq_(histogram.counts[0], 1)
+        # 3us is in the bucket from 2us to 4us
+        eq_(histogram.counts[2], 2)
+        eq_(histogram.counts[HISTOGRAM_BUCKETS - 1], 1)
+        snapshot = histogram.snapshot()
+        eq_(snapshot['count'], 4)
+        eq_(snapshot['max'], 3600)
+        eq_(snapshot['buckets'], [[0.000001, 1], [0.000004, 2], [None, 1]])
+
+    def test_snapshot(self):
+        peer = self.stats.peer('2.2.2.2')
+        ok_(self.stats.peer('2.2.2.2') is peer)
+        peer.rx_msgs[MSG_TYPE_INDEX[0x0400]] += 3
+        peer.rx_bytes[MSG_TYPE_INDEX[0x0400]] += 84
+        peer.tx_msgs[MSG_TYPE_OTHER] += 1
+        peer.tx_bytes[MSG_TYPE_OTHER] += 8
+        peer.flaps += 1
+        snapshot = self.stats.snapshot('2.2.2.2')['2.2.2.2']
+        eq_(snapshot['received'],
+            {'label_mapping': {'messages': 3, 'bytes': 84}})
+        eq_(snapshot['sent'], {'other': {'messages': 1, 'bytes': 8}})
+        eq_(snapshot['received_bytes'], 84)
+        eq_(snapshot['flaps'], 1)
+        eq_(self.stats.snapshot('3.3.3.3'), {})
+
+    def test_remove_peer(self):
+        self.stats.peer('2.2.2.2').parse_errors += 1
+        self.stats.peer('3.3.3.3').parse_errors += 2
+        self.stats.peer('3.3.3.3').dispatch_latency.record(0.001)
+        self.stats.remove_peer('3.3.3.3')
+        snapshot = self.stats.snapshot()
+        eq_(list(snapshot['peers'].keys()), ['2.2.2.2'])
+        # the removed peer is kept in the totals
+        eq_(snapshot['total']['parse_errors'], 3)
+        eq_(snapshot['total']['dispatch_latency']['count'], 1)
@@ -0,0 +1,55 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from nose.tools import eq_
+
+from ryu.lib.packet import ldp
+from ryu.services.protocols.ldp import template
+
+
+class Test_template(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.template
+    """
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def _keepalive(self, msg_id):
+        return ldp.LDPKeepAlive(router_id='1.1.1.1', msg_id=msg_id, tlvs=[])
+
+    def test_render(self):
+        for include_header in (True, False):
+            tmpl = template.MessageTemplate(self._keepalive(0),
+                                            include_header)
+            for msg_id in (1, 0x12345678):
+                eq_(tmpl.render(msg_id), self._keepalive(msg_id).serialize(
+                    include_header=include_header))
+
+    def test_cache(self):
+        cache = template.MessageTemplateCache()
+        built = []
+
+        def _factory():
+            built.append(1)
+            return self._keepalive(0)
+        first = cache.get('keepalive', _factory)
+        eq_(cache.get('keepalive', _factory) is first, True)
+        cache.get('keepalive', _factory, include_header=True)
+        eq_(len(built), 2)
+        eq_(len(cache), 2)
@@ -0,0 +1,63 @@
+# Copyright (C) 2014 Kiyonari Harigae <lakshmi at cloudysunny14 org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+from nose.tools import eq_, ok_
+
+from ryu.lib import hub
+from ryu.services.protocols.ldp.writer import PeerWriter
+from ryu.services.protocols.ldp.writer import WriterOverflow
+
+
+class _SlowSocket(object):
+    def __init__(self):
+        self.data = []
+        self.readable = hub.Event()
+
+    def sendall(self, data):
+        self.readable.wait()
+        self.data.append(data)
+
+
+class Test_writer(unittest.TestCase):
+    """ Test case for ryu.services.protocols.ldp.writer
+    """
+
+    def setUp(self):
+        self.sock = _SlowSocket()
+        self.writer = PeerWriter(self.sock, high_watermark=300,
+                                 low_watermark=100, max_pending=1000)
+        self.writer.start()
+
+    def tearDown(self):
+        self.writer.stop()
+
+    def test_watermarks(self):
+        ok_(self.writer.write(b'x' * 200))
+        ok_(not self.writer.write(b'x' * 200))
+        eq_(self.writer.stats()['bytes_pending'], 400)
+        eq_(self.writer.wait_writable(0.01), False)
+        self.sock.readable.set()
+        ok_(self.writer.wait_writable(1))
+        hub.sleep(0.01)
+        stats = self.writer.stats()
+        eq_(stats['bytes_pending'], 0)
+        eq_(stats['bytes_sent'], 400)
+        eq_(stats['pause_count'], 1)
+        eq_(len(self.sock.data), 2)
+
+    def test_overflow(self):
+        for i in range(5):
+            self.writer.write(b'x' * 200)
+        self.assertRaises(WriterOverflow, self.writer.write, b'x')